@@ -153,14 +153,17 @@ class Store {
               }
             }
             const new_socket = io(url(i, ""));
-            new_socket.on("info", (body: any) => {
+            // The node sends its whole info on connect and only the changed fields after
+            const info: any = {};
+            const onInfo = (body: any) => {
+              Object.assign(info, body);
               const newNode = {
                 port: i,
-                nodes: body.nodes,
-                blockchain_count: body.blockchain_count,
+                nodes: info.nodes,
+                blockchain_count: info.blockchain_count,
                 status: true,
-                is_miner: body.is_miner,
-                mining: body.mining
+                is_miner: info.is_miner,
+                mining: info.mining
               };
               const exists = this.nodes.map(n => n.port).includes(i);
               if (exists) {
@@ -173,7 +176,9 @@ class Store {
               this.onNodesChange(
                 this.nodes.slice().sort((n1, n2) => n1.port - n2.port)
               );
-            });
+            };
+            new_socket.on("info", onInfo);
+            new_socket.on("info_diff", onInfo);
             this.sockets = this.sockets.concat({
               port: i,
               socket: new_socket
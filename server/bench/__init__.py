@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# __init__.py - benchmark package, shared setup and the JSON result files of its suites
+#
+# The suites run from the server directory as modules:
+#     python3 -m bench.micro      microbenchmarks of the blockchain functions
+#     python3 -m bench.harness    local network of nodes under a ballot casting load
+# The bench_*.py scripts beside them compare the approaches of single changes.
+
+import os
+import sys
+import time
+import json
+import platform
+import subprocess
+
+""" Directory of the benchmark package. """
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+""" Directory of the node's modules, which the suites import by name the way app.py does. """
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+
+""" Directory that result files are written to unless another path is given. """
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+def gitCommit():
+    """
+    Returns:
+        {str} -- Hash of the checked out commit, None if it can not be read.
+    """
+
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """
+    Arguments:
+        values {list} -- Measurements.
+        points {tuple} -- Percentiles to report. (default: {(50, 90, 99)})
+
+    Returns:
+        {dict} -- Maps "p50" and so on to the nearest rank percentile of values, and "max" to the
+        largest value. Every value is None if there are no measurements.
+    """
+
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        rank = max(0, -(-point * len(ordered) // 100) - 1)
+        result["p%d" % point] = ordered[rank] if ordered else None
+    result["max"] = ordered[-1] if ordered else None
+    return result
+
+
+def writeResults(suite, config, results, path=None):
+    """Writes the results of a suite with what is needed to compare them with later runs, the
+    commit, machine and configuration they were measured with.
+
+    Arguments:
+        suite {str} -- Name of the suite.
+        config {dict} -- The suite's arguments.
+        results {obj} -- A JSON serializable object of measurements.
+        path {str} -- File to write, defaults to a timestamped file in RESULTS_DIR.
+
+    Returns:
+        {str} -- The path that was written.
+    """
+
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(
+            RESULTS_DIR, "%s-%s.json" % (suite, time.strftime("%Y%m%d-%H%M%S"))
+        )
+    document = {
+        "suite": suite,
+        "timestamp": time.time(),
+        "commit": gitCommit(),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return path
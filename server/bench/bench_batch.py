@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_batch.py - compare casting ballots one request at a time and in /cast_ballots batches
+
+import os
+import sys
+import time
+import random
+import json
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import app
+import util
+import signer
+import blockchain
+
+""" Candidates of the benchmark elections. """
+CANDIDATES = ["a", "b", "c"]
+
+
+def createElection(ballot_count):
+    """Add an election to the node. Broadcasts are disabled.
+
+    Arguments:
+        ballot_count {int} -- Number of eligible keys.
+
+    Returns:
+        {list} -- A /cast_ballot body for every key.
+    """
+
+    app.broadcast_ballots = app.broadcast_batch = lambda ballots: None
+    signing_keys, verifying_keys = blockchain.generateKeys(ballot_count)
+    genesis = blockchain.createGenesisBlock("bench", CANDIDATES, verifying_keys)
+    with util.lock:
+        app.add_election(blockchain.createBlockchain(genesis))
+    return [
+        {
+            "election": genesis["header"]["id"],
+            "candidates": random.sample(CANDIDATES, len(CANDIDATES)),
+            "signing_key": signing_key,
+        }
+        for signing_key in signing_keys
+    ]
+
+
+def castSingly(bodies):
+    """
+    Arguments:
+        bodies {list} -- /cast_ballot bodies.
+
+    Returns:
+        {float} -- Ballots cast per second.
+    """
+
+    client = app.app.test_client()
+    start = time.perf_counter()
+    for body in bodies:
+        assert client.post("/cast_ballot", json=body).status_code == 200
+    return len(bodies) / (time.perf_counter() - start)
+
+
+def castBatches(bodies, batch_size):
+    """
+    Arguments:
+        bodies {list} -- /cast_ballot bodies.
+        batch_size {int} -- Number of ballots in each /cast_ballots request.
+
+    Returns:
+        {float} -- Ballots cast per second.
+    """
+
+    client = app.app.test_client()
+    start = time.perf_counter()
+    for i in range(0, len(bodies), batch_size):
+        response = client.post("/cast_ballots", json=bodies[i : i + batch_size])
+        assert all(status["status"] == "cast" for status in json.loads(response.data))
+    return len(bodies) / (time.perf_counter() - start)
+
+
+def main():
+    """Parse args and print the casting rate of single requests and of each batch size and
+    number of signing workers.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark batch ballot casting.")
+    parser.add_argument("-n", "--ballots", dest="ballots", default=200, type=int)
+    parser.add_argument(
+        "-b", "--batches", dest="batches", default=[10, 100], type=int, nargs="*"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        default=sorted({0, os.cpu_count()}),
+        type=int,
+        nargs="*",
+    )
+    args = parser.parse_args()
+
+    print("%12s %10s %14s" % ("batch", "workers", "ballots/s"))
+    print(
+        "%12s %10s %14.1f" % ("single", "-", castSingly(createElection(args.ballots)))
+    )
+    for worker_count in args.workers:
+        app.ballot_signer = signer.BallotSigner(worker_count)
+        try:
+            if app.ballot_signer.pool:
+                # Start the workers before the clock does
+                list(app.ballot_signer.pool.map(len, [[]] * worker_count))
+            for batch_size in args.batches:
+                rate = castBatches(createElection(args.ballots), batch_size)
+                print("%12d %10d %14.1f" % (batch_size, worker_count, rate))
+        finally:
+            app.ballot_signer.shutdown()
+
+
+if __name__ == "__main__":
+    main()
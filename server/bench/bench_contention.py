@@ -0,0 +1,244 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_contention.py - measure ballot throughput and read latency with many concurrent elections
+
+import os
+import sys
+import time
+import random
+import threading
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import app
+import util
+import compact
+import blockchain
+
+
+class SharedLock:
+    """Stands in for an ElectionLock by handing out one reentrant lock for everything, which is
+    how the node locked its state with a single global lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.chain = self
+        self.pool = self.lock
+
+    def read(self):
+        return self.lock
+
+    def write(self):
+        return self.lock
+
+
+def createElections(election_count, ballot_count):
+    """Add elections to the node and sign a ballot for every key. Broadcasts are disabled.
+
+    Arguments:
+        election_count {int} -- Number of elections.
+        ballot_count {int} -- Number of ballots in each election.
+
+    Returns:
+        {dict} -- A dictionary that maps election id's to /cast_ballot bodies.
+    """
+
+    bodies = {}
+    for i in range(election_count):
+        signing_keys, verifying_keys = blockchain.generateKeys(ballot_count)
+        genesis = blockchain.createGenesisBlock(
+            "bench %d" % i, ["a", "b", "c"], verifying_keys
+        )
+        election = genesis["header"]["id"]
+        with util.lock:
+            app.add_election(blockchain.createBlockchain(genesis))
+        bodies[election] = [
+            {
+                "election": election,
+                "candidates": random.sample(["a", "b", "c"], 3),
+                "signing_key": signing_key,
+            }
+            for signing_key in signing_keys
+        ]
+    return bodies
+
+
+def castBallots(bodies):
+    """Casts an election's ballots one request at a time.
+
+    Arguments:
+        bodies {list} -- /cast_ballot bodies.
+    """
+
+    client = app.app.test_client()
+    for body in bodies:
+        assert client.post("/cast_ballot", json=body).status_code == 200
+
+
+def confirmBallots(election, done):
+    """Adds blocks of unconfirmed ballots to an election's chain the way the miner does once it
+    finds a nonce, until done is set and the pool is empty.
+
+    Arguments:
+        election {str} -- Election id.
+        done {Event} -- Event that is set once every ballot has been cast.
+    """
+
+    election_lock = util.election_locks[election]
+    while True:
+        with election_lock.pool:
+            ballots = [
+                ballot.toDict()
+                for ballot in util.mempool.take(election, blockchain.BLOCK_BALLOT_COUNT)
+            ]
+        if not ballots:
+            if done.is_set():
+                return
+            time.sleep(0.001)
+            continue
+        with election_lock.chain.write(), election_lock.pool:
+            tip = util.blockchains[election].chain[-1]
+            block = blockchain.createBlock(
+                election,
+                ballots,
+                util.block_records[tip.id].hash,
+                compact.formatId(tip.id),
+            )
+            app.add_block(election, blockchain.createBlockRecord(block))
+
+
+def readResults(elections, done, latencies, interval):
+    """Polls the results and chains of random elections until done is set.
+
+    Arguments:
+        elections {list} -- Election id's.
+        done {Event} -- Event that is set once every ballot has been confirmed.
+        latencies {list} -- List that the latency of every request is appended to.
+        interval {float} -- Seconds between polls.
+    """
+
+    client = app.app.test_client()
+    while not done.is_set():
+        election = random.choice(elections)
+        for path in ("/election/%s/results", "/election/%s"):
+            start = time.perf_counter()
+            assert client.get(path % election).status_code == 200
+            latencies.append(time.perf_counter() - start)
+        done.wait(interval)
+
+
+def run(election_count, ballot_count, reader_count, interval, shared):
+    """Casts and confirms every ballot of a set of elections while readers poll them.
+
+    Arguments:
+        election_count {int} -- Number of elections.
+        ballot_count {int} -- Number of ballots in each election.
+        reader_count {int} -- Number of reader threads.
+        interval {float} -- Seconds between the polls of each reader.
+        shared {bool} -- Whether every election shares a single lock.
+
+    Returns:
+        {(float, list)} -- Ballots confirmed per second and the read latencies in seconds.
+    """
+
+    for state in (
+        util.blockchains,
+        util.election_locks,
+        util.block_records,
+        util.block_trees,
+    ):
+        state.clear()
+    bodies = createElections(election_count, ballot_count)
+    if shared:
+        shared_lock = SharedLock()
+        for election in bodies:
+            util.election_locks[election] = shared_lock
+
+    cast = threading.Event()
+    confirmed = threading.Event()
+    latencies = []
+    casters = [
+        threading.Thread(target=castBallots, args=(bodies[election],))
+        for election in bodies
+    ]
+    confirmers = [
+        threading.Thread(target=confirmBallots, args=(election, cast))
+        for election in bodies
+    ]
+    readers = [
+        threading.Thread(
+            target=readResults, args=(list(bodies), confirmed, latencies, interval)
+        )
+        for _ in range(reader_count)
+    ]
+
+    start = time.perf_counter()
+    for thread in casters + confirmers + readers:
+        thread.start()
+    for thread in casters:
+        thread.join()
+    cast.set()
+    for thread in confirmers:
+        thread.join()
+    seconds = time.perf_counter() - start
+    confirmed.set()
+    for thread in readers:
+        thread.join()
+
+    for election in bodies:
+        assert util.mempool.size(election) == 0
+        assert len(util.blockchains[election].chain) > 1
+    return election_count * ballot_count / seconds, sorted(latencies)
+
+
+def main():
+    """Parse args and print throughput and read latency with shared and per-election locks.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark lock contention.")
+    parser.add_argument(
+        "-e", "--elections", dest="elections", default=[1, 4, 16], type=int, nargs="*"
+    )
+    parser.add_argument("-b", "--ballots", dest="ballots", default=16, type=int)
+    parser.add_argument("-r", "--readers", dest="readers", default=4, type=int)
+    parser.add_argument("-i", "--interval", dest="interval", default=0.01, type=float)
+    args = parser.parse_args()
+
+    # Measure the node on its own, without gossip to other nodes
+    app.broadcast_ballots = lambda ballots: None
+    app.broadcast_block = lambda record: None
+    app.broadcast_election = lambda election: None
+    app.log.disabled = True
+    random.seed(0)
+
+    print(
+        "%10s %8s %14s %14s %14s"
+        % ("elections", "locks", "ballots/s", "read p50 (ms)", "read p99 (ms)")
+    )
+    for election_count in args.elections:
+        for shared in (True, False):
+            rate, latencies = run(
+                election_count, args.ballots, args.readers, args.interval, shared
+            )
+            print(
+                "%10d %8s %14.0f %14.2f %14.2f"
+                % (
+                    election_count,
+                    "shared" if shared else "split",
+                    rate,
+                    latencies[len(latencies) // 2] * 1000,
+                    latencies[len(latencies) * 99 // 100] * 1000,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
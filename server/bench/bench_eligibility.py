@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_eligibility.py - measure verifying key eligibility lookups as the electorate grows
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import compact
+import blockchain
+from ecdsa import SigningKey
+
+""" Size in bytes of a verifying key produced by SigningKey.generate(). """
+KEY_SIZE = len(SigningKey.generate().get_verifying_key().to_string())
+
+
+def linearLookup(verifying_key, blockchain):
+    """The original eligibility check, a linear scan over the genesis header key list.
+
+    Arguments:
+        verifying_key {VerifyingKey} -- The key to be checked.
+        blockchain {dict} -- A blockchain dictionary.
+
+    Returns:
+        {bool} -- True if the verifying key is included in the blockchain genesis block header.
+    """
+
+    return (
+        verifying_key.to_string().hex()
+        in blockchain["chain"][0]["header"]["verifying_keys"]
+    )
+
+
+def createElection(voter_count, probe_keys):
+    """Create a blockchain whose genesis block lists random verifying keys and the probe keys.
+
+    Arguments:
+        voter_count {int} -- The number of verifying keys in the genesis block.
+        probe_keys {list} -- VerifyingKey objects that are placed at the end of the key list.
+
+    Returns:
+        {dict} -- A blockchain dictionary.
+    """
+
+    # Random bytes are as good as real keys for lookups and are much faster to generate
+    verifying_keys = [
+        os.urandom(KEY_SIZE).hex() for _ in range(voter_count - len(probe_keys))
+    ]
+    verifying_keys += [vk.to_string().hex() for vk in probe_keys]
+    genesis = blockchain.createGenesisBlock("bench", ["a", "b"], verifying_keys)
+    return blockchain.createBlockchain(genesis)
+
+
+def timeLookups(lookup, probe_keys, target, repeat):
+    """Time a lookup function over the probe keys.
+
+    Arguments:
+        lookup {function} -- Either linearLookup or blockchain.verifyingKeyInBlockchain.
+        probe_keys {list} -- Eligible keys in the form lookup takes, VerifyingKey objects for
+        linearLookup and raw bytes for verifyingKeyInBlockchain.
+        target {obj} -- The blockchain or the election's verifying_keys passed to lookup.
+        repeat {int} -- Number of passes over the probe keys.
+
+    Returns:
+        {float} -- Average seconds per lookup.
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for vk in probe_keys:
+            assert lookup(vk, target)
+    return (time.perf_counter() - start) / (repeat * len(probe_keys))
+
+
+def main():
+    """Parse args and print lookup cost for each electorate size.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark eligibility lookups.")
+    parser.add_argument(
+        "-n",
+        "--sizes",
+        dest="sizes",
+        default=[1000, 10000, 100000, 500000],
+        type=int,
+        nargs="*",
+    )
+    parser.add_argument("-r", "--repeat", dest="repeat", default=20, type=int)
+    args = parser.parse_args()
+
+    probe_keys = [SigningKey.generate().get_verifying_key() for _ in range(10)]
+
+    print("%10s %14s %14s %14s" % ("voters", "build (s)", "list (us)", "set (us)"))
+    for size in args.sizes:
+        election = createElection(size, probe_keys)
+
+        start = time.perf_counter()
+        eligible_keys = compact.Election(election["chain"][0]).verifying_keys
+        build = time.perf_counter() - start
+
+        linear = timeLookups(linearLookup, probe_keys, election, args.repeat)
+        hashed = timeLookups(
+            blockchain.verifyingKeyInBlockchain,
+            [vk.to_string() for vk in probe_keys],
+            eligible_keys,
+            args.repeat,
+        )
+        print(
+            "%10d %14.4f %14.2f %14.2f"
+            % (size, build, linear * 1000000, hashed * 1000000)
+        )
+
+
+if __name__ == "__main__":
+    main()
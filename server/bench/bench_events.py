@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_events.py - compare web socket traffic of per-change info messages and the event bus
+
+import os
+import sys
+import time
+import argparse
+from json import dumps
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import events
+
+""" Number of peer ports in the simulated node info. """
+NODE_COUNT = 50
+
+
+class CountingSocket:
+    """Stands in for the SocketIO server, counting the messages and bytes that every connected
+    client would receive.
+    """
+
+    def __init__(self, client_count):
+        """
+        Arguments:
+            client_count {int} -- Number of connected clients.
+        """
+
+        self.client_count = client_count
+        self.messages = 0
+        self.bytes = 0
+
+    def emit(self, event, data, room=None):
+        self.messages += self.client_count
+        self.bytes += self.client_count * len(dumps(data))
+
+
+class SimulatedNode:
+    """Node info that changes the way a busy miner's does, the pool and mining state change with
+    every ballot and block while the peers stay the same.
+    """
+
+    def __init__(self):
+        self.nodes = list(range(5000, 5000 + NODE_COUNT))
+        self.ballots = 0
+        self.mining = None
+
+    def info(self):
+        return {
+            "nodes": self.nodes,
+            "blockchain_count": 1,
+            "is_miner": True,
+            "mining": self.mining,
+            "hashrate": 100000,
+            "gossip": {"queued": 0, "sent": self.ballots, "dropped": 0},
+            "mempool": {"ballots": self.ballots, "bytes": self.ballots * 600},
+        }
+
+
+def simulate(client_count, change_count, changes_per_tick):
+    """Sends the same stream of changes with a message per change and through the event bus.
+
+    Arguments:
+        client_count {int} -- Number of connected clients.
+        change_count {int} -- Number of changes to the node info.
+        changes_per_tick {int} -- Changes that happen between two ticks of the bus.
+
+    Returns:
+        {(CountingSocket, CountingSocket)} -- The traffic of each approach.
+    """
+
+    node = SimulatedNode()
+    per_change = CountingSocket(client_count)
+    for i in range(change_count):
+        node.ballots += 1
+        node.mining = i // 10
+        per_change.emit("info", node.info())
+
+    node = SimulatedNode()
+    coalesced = CountingSocket(client_count)
+    bus = events.EventBus(coalesced, node.info)
+    bus.connect("client")
+    for i in range(change_count):
+        node.ballots += 1
+        node.mining = i // 10
+        if i % changes_per_tick == 0:
+            bus.flush()
+    bus.flush()
+    return per_change, coalesced
+
+
+def timeHook(repeat, watched):
+    """
+    Arguments:
+        repeat {int} -- Number of calls.
+        watched {bool} -- Whether the election has a subscriber.
+
+    Returns:
+        {float} -- Seconds per call of ballotsAdded.
+    """
+
+    bus = events.EventBus(CountingSocket(0), dict)
+    if watched:
+        bus.subscribe("client", "bench")
+    ballot_id = [os.urandom(16)]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        bus.ballotsAdded("bench", ballot_id)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    """Parse args and print the traffic of each approach and the cost of the ballot hook.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark web socket updates.")
+    parser.add_argument(
+        "-c", "--clients", dest="clients", default=[1, 10, 100], type=int, nargs="*"
+    )
+    parser.add_argument("-n", "--changes", dest="changes", default=10000, type=int)
+    parser.add_argument("-t", "--per-tick", dest="per_tick", default=50, type=int)
+    args = parser.parse_args()
+
+    print(
+        "%10s %14s %14s %14s %14s"
+        % ("clients", "change msgs", "change (MB)", "tick msgs", "tick (MB)")
+    )
+    for client_count in args.clients:
+        per_change, coalesced = simulate(client_count, args.changes, args.per_tick)
+        print(
+            "%10d %14d %14.2f %14d %14.2f"
+            % (
+                client_count,
+                per_change.messages,
+                per_change.bytes / 1000000,
+                coalesced.messages,
+                coalesced.bytes / 1000000,
+            )
+        )
+
+    print()
+    print("%20s %14s" % ("ballot hook", "ns per call"))
+    for watched in (False, True):
+        seconds = timeHook(100000, watched)
+        print(
+            "%20s %14.0f"
+            % ("watched" if watched else "unwatched", seconds * 1000000000)
+        )
+
+
+if __name__ == "__main__":
+    main()
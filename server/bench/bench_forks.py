@@ -0,0 +1,333 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_forks.py - simulate miners racing on one election and check that a node follows them
+
+import os
+import sys
+import time
+import json
+import heapq
+import random
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import app
+import util
+import tally
+import forks
+import compact
+import blockchain
+
+""" Election parameters of the simulation, the difficulty stays fixed so every block is worth the
+same work and the heaviest branch is the longest. """
+RACE_PARAMS = {"difficulty": 8, "retarget_blocks": 0}
+
+
+class Miner:
+    """A miner that follows its own view of the block tree and mines on the tip of its heaviest
+    branch.
+    """
+
+    def __init__(self, election, genesis):
+        """
+        Arguments:
+            election {Election} -- The election.
+            genesis {BlockRecord} -- Record of the election's genesis block from compactRecord.
+        """
+
+        self.election = election
+        self.tree = forks.BlockTree(genesis)
+        self.tip = genesis.hash
+
+        """ A dictionary that maps block hashes to the received blocks, which are mined on. """
+        self.blocks = {genesis.hash: json.loads(genesis.data)}
+
+    def receive(self, record):
+        """Adds a block to the miner's tree and switches to its branch if it has more work.
+
+        Arguments:
+            record {BlockRecord} -- Record of a mined block.
+        """
+
+        queue = [record]
+        while queue:
+            record = queue.pop()
+            if self.tree.contains(record.hash):
+                continue
+            if record.block["header"]["previous_hash"] not in self.tree.nodes:
+                self.tree.addOrphan(record)
+                continue
+            self.blocks[record.hash] = record.block
+            node = self.tree.insert(blockchain.compactRecord(record, self.election))
+            if node.work > self.tree.nodes[self.tip].work:
+                self.tip = record.hash
+            queue.extend(self.tree.popOrphans(record.hash))
+
+    def confirmed(self):
+        """
+        Returns:
+            {set} -- Id's of the ballots in the miner's branch.
+        """
+
+        confirmed = set()
+        node = self.tree.nodes[self.tip]
+        while node.parent is not None:
+            confirmed.update(ballot.id for ballot in node.record.block.ballots)
+            node = self.tree.nodes[node.parent]
+        return confirmed
+
+    def mine(self, election, ballots, size):
+        """Mines a block of randomly chosen ballots that are not yet in the miner's branch.
+
+        Arguments:
+            election {str} -- Election id.
+            ballots {list} -- Every Ballot of the election.
+            size {int} -- The largest number of ballots in the block.
+
+        Returns:
+            {BlockRecord} -- Record of the mined block, None if the branch holds every ballot.
+        """
+
+        confirmed = self.confirmed()
+        pending = [ballot for ballot in ballots if ballot.id not in confirmed]
+        if not pending:
+            return None
+
+        block = blockchain.mineBlock(
+            election,
+            [b.toDict() for b in random.sample(pending, min(size, len(pending)))],
+            self.blocks[self.tip],
+            RACE_PARAMS["difficulty"],
+        )
+        record = blockchain.createBlockRecord(block)
+        self.receive(record)
+        return record
+
+
+def createElection(ballot_count):
+    """Add an election to the node and sign a ballot for every key. Broadcasts are disabled.
+
+    Arguments:
+        ballot_count {int} -- Number of ballots in the election.
+
+    Returns:
+        {(str, list)} -- The election id and its signed Ballots, which are all in the node's
+        unconfirmed pool.
+    """
+
+    signing_keys, verifying_keys = blockchain.generateKeys(ballot_count)
+    genesis = blockchain.createGenesisBlock(
+        "race", ["a", "b", "c"], verifying_keys, RACE_PARAMS
+    )
+    with util.lock:
+        app.add_election(blockchain.createBlockchain(genesis))
+    election = util.blockchains[genesis["header"]["id"]]
+
+    ballots = []
+    for signing_key, verifying_key in zip(signing_keys, verifying_keys):
+        ballot = blockchain.createBallot(
+            election.id, random.sample(["a", "b", "c"], 3), verifying_key
+        )
+        signed = {
+            "ballot": ballot,
+            "signature": blockchain.signBallot(ballot, signing_key),
+        }
+        ballots.append(compact.Ballot(signed, election))
+    with util.election_locks[election.id].pool:
+        for ballot in ballots:
+            app.add_unconfirmed_ballot(election.id, ballot)
+    return election.id, ballots
+
+
+def checkNode(election, ballots, mined):
+    """Compares the node's state of an election with the blocks the miners produced.
+
+    Arguments:
+        election {str} -- Election id.
+        ballots {list} -- Every Ballot of the election.
+        mined {list} -- Records of every mined block.
+
+    Returns:
+        {list} -- Human readable descriptions of every inconsistency, empty if the node is valid.
+    """
+
+    chain = util.blockchains[election].chain
+    tree = util.block_trees[election]
+    problems = blockchain.checkSpentKeyIndex(
+        util.spent_keys[election],
+        util.blockchains[election],
+        util.mempool.ballots(election),
+    )
+
+    best = max(
+        tree.nodes[record.hash].work for record in mined if record.hash in tree.nodes
+    )
+    if tree.nodes[app.tip_hash(election)].work != best:
+        problems.append("chain does not end in the branch with the most work")
+    for height, block in enumerate(chain):
+        if util.block_heights[election].get(block.id) != height:
+            problems.append(
+                "block %s has the wrong height" % compact.formatId(block.id)
+            )
+
+    confirmed = [ballot.id for block in chain for ballot in block.ballots]
+    pooled = util.mempool.ballots(election)
+    if len(confirmed) != len(set(confirmed)):
+        problems.append("a ballot is confirmed twice")
+    if set(confirmed) & set(pooled):
+        problems.append("a confirmed ballot is still in the pool")
+    if set(confirmed) | set(pooled) != {ballot.id for ballot in ballots}:
+        problems.append("a ballot was lost")
+
+    rebuilt = tally.createTally(util.blockchains[election], util.tally_backend)
+    if util.tallies[election].results() != rebuilt.results():
+        problems.append("tally does not match the chain")
+    return problems
+
+
+def race(miner_count, ballot_count, latency, block_size):
+    """Lets miners race to confirm an election's ballots. Each step one random miner finds a block,
+    which reaches every other miner and the node after a random delay of up to latency steps, so
+    blocks can arrive after their children.
+
+    Arguments:
+        miner_count {int} -- Number of miners.
+        ballot_count {int} -- Number of ballots in the election.
+        latency {int} -- The longest delay of a block in steps.
+        block_size {int} -- The largest number of ballots in a mined block.
+
+    Returns:
+        {dict} -- Counts of the race and the node's inconsistencies.
+    """
+
+    election, ballots = createElection(ballot_count)
+    tree = util.block_trees[election]
+    genesis = tree.nodes[app.tip_hash(election)].record
+    miners = [Miner(util.blockchains[election], genesis) for _ in range(miner_count)]
+
+    stats = {"reorgs": 0, "deepest": 0, "orphans": 0, "seconds": 0}
+    disconnect_block = app.disconnect_block
+    switch_chain = app.switch_chain
+    depth = [0]
+
+    def countingDisconnect(election):
+        depth[0] += 1
+        return disconnect_block(election)
+
+    def countingSwitch(election, block_hash):
+        start = depth[0]
+        switch_chain(election, block_hash)
+        if depth[0] > start:
+            stats["reorgs"] += 1
+            stats["deepest"] = max(stats["deepest"], depth[0] - start)
+
+    app.disconnect_block = countingDisconnect
+    app.switch_chain = countingSwitch
+
+    def deliver(record):
+        if record.block["header"]["previous_hash"] not in tree.nodes:
+            stats["orphans"] += 1
+        start = time.perf_counter()
+        app.accept_blocks(election, [record])
+        stats["seconds"] += time.perf_counter() - start
+
+    mined = []
+    deliveries = []
+    step = 0
+    try:
+        while True:
+            step += 1
+            miner = random.randrange(miner_count)
+            record = miners[miner].mine(election, ballots, block_size)
+            if record:
+                mined.append(record)
+                for target in range(miner_count + 1):
+                    if target != miner:
+                        delay = random.randint(0, latency)
+                        heapq.heappush(
+                            deliveries, (step + delay, len(mined), target, record)
+                        )
+            elif not deliveries and all(
+                len(m.confirmed()) == ballot_count for m in miners
+            ):
+                break
+
+            while deliveries and (deliveries[0][0] <= step or not record):
+                _, _, target, delivered = heapq.heappop(deliveries)
+                if target == miner_count:
+                    deliver(delivered)
+                else:
+                    miners[target].receive(delivered)
+    finally:
+        app.disconnect_block = disconnect_block
+        app.switch_chain = switch_chain
+
+    stats["mined"] = len(mined)
+    stats["height"] = len(util.blockchains[election].chain) - 1
+    stats["problems"] = checkNode(election, ballots, mined)
+    return stats
+
+
+def main():
+    """Parse args and print the forks, reorganizations and consistency of each race.
+    """
+
+    parser = argparse.ArgumentParser(description="Simulate a multi-miner race.")
+    parser.add_argument("-m", "--miners", dest="miners", default=4, type=int)
+    parser.add_argument("-b", "--ballots", dest="ballots", default=48, type=int)
+    parser.add_argument(
+        "-l", "--latency", dest="latency", default=[0, 2, 8], type=int, nargs="*"
+    )
+    parser.add_argument("-s", "--block-size", dest="block_size", default=4, type=int)
+    args = parser.parse_args()
+
+    # Simulate the node on its own, without gossip to other nodes
+    app.broadcast_ballots = lambda ballots: None
+    app.broadcast_block = lambda record: None
+    app.broadcast_election = lambda election: None
+    app.log.disabled = True
+    random.seed(0)
+
+    print(
+        "%8s %8s %8s %8s %8s %8s %8s %14s %8s"
+        % (
+            "latency",
+            "mined",
+            "height",
+            "stale",
+            "orphans",
+            "reorgs",
+            "deepest",
+            "ms per block",
+            "valid",
+        )
+    )
+    for latency in args.latency:
+        stats = race(args.miners, args.ballots, latency, args.block_size)
+        for problem in stats["problems"]:
+            print(problem)
+        print(
+            "%8d %8d %8d %8d %8d %8d %8d %14.2f %8s"
+            % (
+                latency,
+                stats["mined"],
+                stats["height"],
+                stats["mined"] - stats["height"],
+                stats["orphans"],
+                stats["reorgs"],
+                stats["deepest"],
+                stats["seconds"] / stats["mined"] * 1000,
+                not stats["problems"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_hashing.py - compare mining hash rates of version 1 and version 2 blocks
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import blockchain
+
+
+def createBallots(count):
+    """Create signed ballots for a throwaway election.
+
+    Arguments:
+        count {int} -- Number of ballots.
+
+    Returns:
+        {list} -- List of ballot dictionaries containing a ballot and digital signature.
+    """
+
+    signing_keys, verifying_keys = blockchain.generateKeys(count)
+    ballots = []
+    for signing_key, verifying_key in zip(signing_keys, verifying_keys):
+        ballot = blockchain.createBallot("bench", ["a", "b", "c"], verifying_key)
+        ballots.append(
+            {"ballot": ballot, "signature": blockchain.signBallot(ballot, signing_key)}
+        )
+    return ballots
+
+
+def hashRate(block, nonces):
+    """Measure how many nonces per second searchNonceRange tries for a block.
+
+    Arguments:
+        block {dict} -- The block to be mined.
+        nonces {int} -- Number of nonces to try.
+
+    Returns:
+        {float} -- Hashes per second.
+    """
+
+    start = time.perf_counter()
+    assert blockchain.searchNonceRange(block, 0, nonces) is None
+    return nonces / (time.perf_counter() - start)
+
+
+def main():
+    """Parse args and print the hash rate of both block versions for each block size.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark mining hash rates.")
+    parser.add_argument(
+        "-b", "--ballots", dest="ballots", default=[4, 64, 512], type=int, nargs="*"
+    )
+    parser.add_argument("-n", "--nonces", dest="nonces", default=100000, type=int)
+    args = parser.parse_args()
+
+    # No hash has this many leading zeroes, so every nonce in the range is tried
+    blockchain.MINING_DIFFICULTY = 32
+
+    ballots = createBallots(max(args.ballots))
+    genesis = blockchain.createGenesisBlock("bench", ["a", "b", "c"], [])
+
+    print("%8s %14s %14s %8s" % ("ballots", "v1 (H/s)", "v2 (H/s)", "speedup"))
+    for count in args.ballots:
+        block = blockchain.createBlock(
+            "bench",
+            ballots[:count],
+            blockchain.hashBlock(genesis),
+            genesis["header"]["id"],
+        )
+        v2 = hashRate(block, args.nonces)
+
+        # Strip the version 2 fields to get the equivalent version 1 block
+        del block["header"]["version"]
+        del block["header"]["ballots_root"]
+        v1 = hashRate(block, args.nonces)
+
+        print("%8d %14.0f %14.0f %7.1fx" % (count, v1, v2, v2 / v1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_keygen.py - measure election key generation against the number of worker processes
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import keygen
+import blockchain
+
+
+def timeGenerator(worker_count, key_count):
+    """Generate keys the way /new_election does, keeping the verifying keys and dropping the
+    signing keys.
+
+    Arguments:
+        worker_count {int} -- Number of worker processes, 0 generates on the calling thread.
+        key_count {int} -- Number of key pairs.
+
+    Returns:
+        {float} -- Seconds taken.
+    """
+
+    generator = keygen.KeyGenerator(worker_count)
+    try:
+        if generator.pool:
+            # Start the workers before the clock does
+            list(generator.pool.map(blockchain.generateKeys, [1] * worker_count))
+
+        start = time.perf_counter()
+        verifying_keys = []
+        for _, verifying_chunk in generator.generate(key_count):
+            verifying_keys.extend(verifying_chunk)
+        return time.perf_counter() - start
+    finally:
+        generator.shutdown()
+
+
+def main():
+    """Parse args and print the key rate for each number of workers.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark key generation.")
+    parser.add_argument("-n", "--keys", dest="keys", default=2000, type=int)
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        default=sorted({0, 1, 2, os.cpu_count()}),
+        type=int,
+        nargs="*",
+    )
+    args = parser.parse_args()
+
+    print("%10s %10s %12s" % ("keys", "workers", "keys/s"))
+    for worker_count in args.workers:
+        seconds = timeGenerator(worker_count, args.keys)
+        print("%10d %10d %12.1f" % (args.keys, worker_count, args.keys / seconds))
+
+
+if __name__ == "__main__":
+    main()
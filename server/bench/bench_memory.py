@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_memory.py - compare the memory a node keeps for chains of dictionaries and compact Blocks
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from json import loads
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import compact
+import blockchain
+
+""" Size in bytes of a NIST192p verifying key and of a signature. """
+KEY_SIZE = 48
+
+
+def encodeChain(candidate_count, block_count, ballots_per_block):
+    """Encode a synthetic election. Ballots carry random keys and signatures since holding them
+    does not verify them.
+
+    Arguments:
+        candidate_count {int} -- Number of candidates.
+        block_count {int} -- Number of blocks after the genesis block.
+        ballots_per_block {int} -- Number of ballots in each block.
+
+    Returns:
+        {list} -- The encodeBlock serialization of every block, starting with the genesis block.
+    """
+
+    candidates = ["candidate %d" % i for i in range(candidate_count)]
+    genesis = blockchain.createGenesisBlock("bench", candidates, [])
+    election = genesis["header"]["id"]
+
+    encoded = [blockchain.encodeBlock(genesis)]
+    previous = genesis
+    for _ in range(block_count):
+        ballots = [
+            {
+                "ballot": blockchain.createBallot(
+                    election, candidates, os.urandom(KEY_SIZE).hex()
+                ),
+                "signature": os.urandom(KEY_SIZE).hex(),
+            }
+            for _ in range(ballots_per_block)
+        ]
+        block = blockchain.createBlock(
+            election, ballots, blockchain.hashBlock(previous), previous["header"]["id"]
+        )
+        encoded.append(blockchain.encodeBlock(block))
+        previous = block
+    return encoded
+
+
+def decodeChain(encoded, compacted):
+    """Decode a chain into the records a node keeps for it, each with the block's serialization
+    and hash.
+
+    Arguments:
+        encoded {list} -- Serialized blocks from encodeChain.
+        compacted {bool} -- Whether the blocks are held as Blocks or as dictionaries.
+
+    Returns:
+        {list} -- The BlockRecord of every block.
+    """
+
+    records = [blockchain.createBlockRecord(loads(data)) for data in encoded]
+    if not compacted:
+        return records
+    election = compact.Election(records[0].block)
+    return [blockchain.compactRecord(record, election) for record in records]
+
+
+def measureChain(encoded, compacted):
+    """Decode a chain once to time it and once more while tracing the memory its records keep.
+
+    Arguments:
+        encoded {list} -- Serialized blocks from encodeChain.
+        compacted {bool} -- Whether the blocks are held as Blocks or as dictionaries.
+
+    Returns:
+        {(int, int, float)} -- Bytes held, the part of them that is the records' serialized
+        blocks, and seconds taken to decode the chain.
+    """
+
+    start = time.perf_counter()
+    decodeChain(encoded, compacted)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    records = decodeChain(encoded, compacted)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return held, sum(sys.getsizeof(record.data) for record in records), seconds
+
+
+def main():
+    """Parse args and print the memory and decode time of each representation for each chain
+    size.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark chain memory use.")
+    parser.add_argument(
+        "-n", "--blocks", dest="blocks", default=[100, 1000], type=int, nargs="*"
+    )
+    parser.add_argument("-b", "--ballots", dest="ballots", default=64, type=int)
+    parser.add_argument("-c", "--candidates", dest="candidates", default=8, type=int)
+    args = parser.parse_args()
+
+    print(
+        "%10s %12s %14s %12s %14s %12s %12s"
+        % (
+            "ballots",
+            "dict (MB)",
+            "compact (MB)",
+            "json (MB)",
+            "compact/ballot",
+            "dict (s)",
+            "compact (s)",
+        )
+    )
+    for block_count in args.blocks:
+        encoded = encodeChain(args.candidates, block_count, args.ballots)
+        ballots = block_count * args.ballots
+        dict_bytes, _, dict_seconds = measureChain(encoded, False)
+        compact_bytes, json_bytes, compact_seconds = measureChain(encoded, True)
+        print(
+            "%10d %12.2f %14.2f %12.2f %14.0f %12.3f %12.3f"
+            % (
+                ballots,
+                dict_bytes / 1000000,
+                compact_bytes / 1000000,
+                json_bytes / 1000000,
+                compact_bytes / ballots,
+                dict_seconds,
+                compact_seconds,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_mempool.py - measure mempool operations and compare its byte count with real memory use
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from json import dumps, loads
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import mempool
+import compact
+import blockchain
+
+""" Size in bytes of a NIST192p verifying key and of a signature. """
+KEY_SIZE = 48
+
+
+def createBallots(election, ballot_count):
+    """Create ballots with random keys and signatures, the pool does not verify them.
+
+    Arguments:
+        election {str} -- Election id.
+        ballot_count {int} -- Number of ballots.
+
+    Returns:
+        {list} -- Ballot dictionaries containing a ballot and digital signature.
+    """
+
+    return [
+        {
+            "ballot": blockchain.createBallot(
+                election, ["b", "a", "c"], os.urandom(KEY_SIZE).hex()
+            ),
+            "signature": os.urandom(KEY_SIZE).hex(),
+        }
+        for _ in range(ballot_count)
+    ]
+
+
+def createPool(election, ballot_count, ttl=mempool.BALLOT_TTL):
+    """
+    Arguments:
+        election {str} -- Election id.
+        ballot_count {int} -- The most ballots in the pool.
+        ttl {float} -- Seconds before a ballot is evicted.
+
+    Returns:
+        {Mempool} -- A pool for ballot_count ballots of the election without byte limits.
+    """
+
+    pool = mempool.Mempool(
+        max_ballots=ballot_count,
+        max_bytes=sys.maxsize,
+        max_election_ballots=ballot_count,
+        max_election_bytes=sys.maxsize,
+        ttl=ttl,
+    )
+    pool.create(election)
+    return pool
+
+
+def main():
+    """Parse args and print the rate of each pool operation and the memory it accounts for.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the mempool.")
+    parser.add_argument(
+        "-n", "--ballots", dest="ballots", default=[10000, 100000], type=int, nargs="*"
+    )
+    parser.add_argument("-s", "--block-size", dest="block_size", default=256, type=int)
+    args = parser.parse_args()
+
+    print(
+        "%10s %12s %12s %12s %14s %14s"
+        % (
+            "ballots",
+            "add/s",
+            "take+remove/s",
+            "expire/s",
+            "counted (MB)",
+            "traced (MB)",
+        )
+    )
+    genesis = blockchain.createGenesisBlock("bench", ["a", "b", "c"], [])
+    election = compact.Election(genesis)
+    for ballot_count in args.ballots:
+        ballots = [
+            compact.Ballot(ballot, election)
+            for ballot in createBallots(election.id, ballot_count)
+        ]
+        pool = createPool(election.id, ballot_count)
+
+        start = time.perf_counter()
+        for ballot in ballots:
+            pool.add(election.id, ballot)
+        add_seconds = time.perf_counter() - start
+        counted = pool.stats()["bytes"]
+
+        # Fill a second pool with decoded copies, as ballots arrive from the network, while
+        # tracing to find the memory the ballots and entries really take
+        encoded = [dumps(ballot.toDict()) for ballot in ballots]
+        traced_pool = createPool(election.id, ballot_count)
+        tracemalloc.start()
+        for data in encoded:
+            traced_pool.add(election.id, compact.Ballot(loads(data), election))
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # Confirm half of the ballots a block at a time, the way the miner does
+        start = time.perf_counter()
+        for _ in range(ballot_count // 2 // args.block_size):
+            block = pool.take(election.id, args.block_size)
+            pool.remove(election.id, [ballot.id for ballot in block])
+        removed = ballot_count // 2 // args.block_size * args.block_size
+        remove_seconds = time.perf_counter() - start
+
+        # Expire the ballots that are left from a pool whose ttl has passed
+        remaining = pool.ballots(election.id).values()
+        expiring = createPool(election.id, ballot_count, 0)
+        for ballot in remaining:
+            expiring.add(election.id, ballot)
+        start = time.perf_counter()
+        expiring.expire(election.id)
+        expire_seconds = time.perf_counter() - start
+        assert expiring.size(election.id) == 0 and expiring.stats()["bytes"] == 0
+
+        print(
+            "%10d %12.0f %12.0f %12.0f %14.2f %14.2f"
+            % (
+                ballot_count,
+                ballot_count / add_seconds,
+                removed / remove_seconds,
+                len(remaining) / expire_seconds,
+                counted / 1000000,
+                traced / 1000000,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
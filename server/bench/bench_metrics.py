@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_metrics.py - measure the overhead of metrics on calls, locks and scrapes
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import metrics
+
+
+def work():
+    """Stands in for a cheap function on the ballot path.
+    """
+
+    return None
+
+
+def timeCalls(function, repeat):
+    """
+    Arguments:
+        function {function} -- Function to call.
+        repeat {int} -- Number of calls.
+
+    Returns:
+        {float} -- Seconds per call.
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def timeLock(lock, repeat):
+    """
+    Arguments:
+        lock {Lock} -- Lock to acquire and release.
+        repeat {int} -- Number of times.
+
+    Returns:
+        {float} -- Seconds per acquire and release.
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with lock:
+            pass
+    return (time.perf_counter() - start) / repeat
+
+
+def timeGuardedCounter(counter, repeat):
+    """Increments a counter the way the node does, only after checking that metrics are enabled.
+
+    Arguments:
+        counter {Counter} -- The counter.
+        repeat {int} -- Number of increments.
+
+    Returns:
+        {float} -- Seconds per increment.
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if metrics.enabled:
+            counter.inc()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    """Parse args and print the cost of each instrumented operation with metrics off and on.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark metrics overhead.")
+    parser.add_argument("-n", "--repeat", dest="repeat", default=200000, type=int)
+    parser.add_argument("-l", "--labels", dest="labels", default=20, type=int)
+    args = parser.parse_args()
+
+    histogram = metrics.Histogram("bench_seconds", "Bench timings.", ("function",))
+    wait = metrics.Histogram("bench_wait_seconds", "Bench lock waits.", ("lock",))
+    hold = metrics.Histogram("bench_hold_seconds", "Bench lock holds.", ("lock",))
+    counter = metrics.Counter("bench_total", "Bench count.")
+    plain_lock = threading.Lock()
+    timed_lock = metrics.TimedLock(threading.Lock(), wait, hold, ("bench",))
+
+    print("%20s %14s %14s" % ("operation", "off (ns)", "on (ns)"))
+    rows = [
+        (
+            "call",
+            timeCalls(work, args.repeat),
+            timeCalls(metrics.timed(work, histogram, ("work",)), args.repeat),
+        ),
+        ("lock", timeLock(plain_lock, args.repeat), timeLock(timed_lock, args.repeat)),
+    ]
+    off = timeGuardedCounter(counter, args.repeat)
+    metrics.enabled = True
+    rows.append(("counter", off, timeGuardedCounter(counter, args.repeat)))
+    for operation, seconds_off, seconds_on in rows:
+        print(
+            "%20s %14.0f %14.0f"
+            % (operation, seconds_off * 1000000000, seconds_on * 1000000000)
+        )
+
+    # A scrape renders every label set of every histogram
+    for i in range(args.labels):
+        histogram.observe(0.001, ("function%d" % i,))
+    start = time.perf_counter()
+    text = metrics.render()
+    print()
+    print(
+        "scrape of %d lines took %.3f ms"
+        % (text.count("\n"), (time.perf_counter() - start) * 1000)
+    )
+
+
+if __name__ == "__main__":
+    main()
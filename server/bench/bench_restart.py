@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_restart.py - measure cold start time of the chain store against chain size
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import compact
+import blockchain
+import forks
+import store
+
+""" Size in bytes of a NIST192p verifying key. """
+KEY_SIZE = 48
+
+
+def writeElection(chain_store, block_count, ballots_per_block):
+    """Store a synthetic election. Ballots carry random keys and signatures since loading does
+    not verify them.
+
+    Arguments:
+        chain_store {ChainStore} -- The store to write to.
+        block_count {int} -- Number of blocks after the genesis block.
+        ballots_per_block {int} -- Number of ballots in each block.
+    """
+
+    verifying_keys = [
+        os.urandom(KEY_SIZE).hex() for _ in range(block_count * ballots_per_block)
+    ]
+    genesis = blockchain.createGenesisBlock("bench", ["a", "b", "c"], verifying_keys)
+    election = genesis["header"]["id"]
+    chain_store.append(election, [blockchain.createBlockRecord(genesis)])
+
+    previous = genesis
+    keys = iter(verifying_keys)
+    for _ in range(block_count):
+        ballots = [
+            {
+                "ballot": blockchain.createBallot(
+                    election, ["b", "a", "c"], next(keys)
+                ),
+                "signature": os.urandom(KEY_SIZE).hex(),
+            }
+            for _ in range(ballots_per_block)
+        ]
+        block = blockchain.createBlock(
+            election, ballots, blockchain.hashBlock(previous), previous["header"]["id"]
+        )
+        chain_store.append(election, [blockchain.createBlockRecord(block)])
+        previous = block
+
+
+def coldStart(directory):
+    """Load every election from a store and rebuild its indexes the way app.load_store does.
+
+    Arguments:
+        directory {str} -- The store directory.
+
+    Returns:
+        {(float, int)} -- Seconds taken and the number of ballots loaded.
+    """
+
+    start = time.perf_counter()
+    ballots = 0
+    for blocks in store.ChainStore(directory).load():
+        election = compact.Election(blocks[0])
+        records = [
+            blockchain.compactRecord(blockchain.createBlockRecord(block), election)
+            for block in blocks
+        ]
+        tree = forks.BlockTree(records[0])
+        blockchain.addBlock(election, records[0].block)
+        for record in records[1:]:
+            tree.insert(record)
+            blockchain.addBlock(election, record.block)
+        blockchain.buildSpentKeyIndex(election, {})
+        blockchain.buildBallotHeights(election)
+        blockchain.buildBlockHeights(election)
+        ballots += sum(len(block.ballots) for block in election.chain)
+    return time.perf_counter() - start, ballots
+
+
+def main():
+    """Parse args and print the cold start time for each chain size.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark chain store cold starts.")
+    parser.add_argument(
+        "-n", "--blocks", dest="blocks", default=[100, 1000, 10000], type=int, nargs="*"
+    )
+    parser.add_argument("-b", "--ballots", dest="ballots", default=4, type=int)
+    args = parser.parse_args()
+
+    print("%10s %10s %12s %12s" % ("blocks", "ballots", "size (MB)", "load (s)"))
+    for block_count in args.blocks:
+        directory = tempfile.mkdtemp()
+        try:
+            chain_store = store.ChainStore(directory)
+            writeElection(chain_store, block_count, args.ballots)
+            chain_store.close()
+
+            size = sum(
+                os.path.getsize(os.path.join(directory, name))
+                for name in os.listdir(directory)
+            )
+            seconds, ballots = coldStart(directory)
+            print(
+                "%10d %10d %12.2f %12.3f"
+                % (block_count, ballots, size / 1000000, seconds)
+            )
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_sync.py - measure how long a new node takes to catch up with running peers
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+import requests
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+import app
+import util
+import sync
+import store
+import verifier
+import blockchain
+
+""" Port of the first peer node, the others use the ports after it. """
+BASE_PORT = 5700
+
+""" Election parameters of the synthetic chain, the difficulty stays fixed. """
+SYNC_PARAMS = {"difficulty": 8, "retarget_blocks": 0}
+
+
+def writeElection(directory, block_count, ballots_per_block):
+    """Store an election with mined blocks of signed ballots.
+
+    Arguments:
+        directory {str} -- The store directory.
+        block_count {int} -- Number of blocks after the genesis block.
+        ballots_per_block {int} -- Number of ballots in each block.
+    """
+
+    signing_keys, verifying_keys = blockchain.generateKeys(
+        block_count * ballots_per_block
+    )
+    genesis = blockchain.createGenesisBlock(
+        "bench", ["a", "b", "c"], verifying_keys, SYNC_PARAMS
+    )
+    election = genesis["header"]["id"]
+    chain_store = store.ChainStore(directory)
+    chain_store.append(election, [blockchain.createBlockRecord(genesis)])
+
+    previous = genesis
+    keys = iter(zip(signing_keys, verifying_keys))
+    for _ in range(block_count):
+        ballots = []
+        for _ in range(ballots_per_block):
+            signing_key, verifying_key = next(keys)
+            ballot = blockchain.createBallot(election, ["b", "a", "c"], verifying_key)
+            ballots.append(
+                {
+                    "ballot": ballot,
+                    "signature": blockchain.signBallot(ballot, signing_key),
+                }
+            )
+        block = blockchain.mineBlock(
+            election, ballots, previous, SYNC_PARAMS["difficulty"]
+        )
+        chain_store.append(election, [blockchain.createBlockRecord(block)])
+        previous = block
+    chain_store.close()
+
+
+def startPeers(directory, peer_count):
+    """Start peer nodes that each load a copy of a store.
+
+    Arguments:
+        directory {str} -- The store directory.
+        peer_count {int} -- Number of peers.
+
+    Returns:
+        {list} -- The peer processes.
+    """
+
+    processes = []
+    for i in range(peer_count):
+        peer_directory = "%s-%d" % (directory, i)
+        shutil.copytree(directory, peer_directory)
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    os.path.join(SRC, "app.py"),
+                    "-p",
+                    str(BASE_PORT + i),
+                    "-d",
+                    peer_directory,
+                    "--verify-workers",
+                    "0",
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        )
+    for i in range(peer_count):
+        while True:
+            try:
+                requests.get(util.build_url(BASE_PORT + i, "/alive"), timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.2)
+    return processes
+
+
+def catchUp(peer_count, worker_count, verify_workers):
+    """Sync an empty node with the peers. The node gets a new verifier so that no signature is
+    already cached.
+
+    Arguments:
+        peer_count {int} -- Number of peers to download from.
+        worker_count {int} -- Number of downloading threads.
+        verify_workers {int} -- Number of signature verifying processes.
+
+    Returns:
+        {(float, int)} -- Seconds taken and the number of blocks added.
+    """
+
+    for state in (
+        util.blockchains,
+        util.election_locks,
+        util.block_records,
+        util.block_trees,
+    ):
+        state.clear()
+    app.ballot_verifier = verifier.BallotVerifier(verify_workers)
+    chain_sync = sync.ChainSync(
+        app.dispatcher,
+        [BASE_PORT + i for i in range(peer_count)],
+        app.local_tip,
+        app.has_block,
+        app.add_synced_election,
+        app.accept_blocks,
+        worker_count,
+    )
+    start = time.perf_counter()
+    added = chain_sync.run()
+    seconds = time.perf_counter() - start
+    app.ballot_verifier.shutdown()
+    return seconds, added
+
+
+def main():
+    """Parse args and print the catch-up time from one peer and from several peers.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark catch-up sync.")
+    parser.add_argument(
+        "-n", "--blocks", dest="blocks", default=[100, 1000], type=int, nargs="*"
+    )
+    parser.add_argument("-b", "--ballots", dest="ballots", default=1, type=int)
+    parser.add_argument("-p", "--peers", dest="peers", default=3, type=int)
+    parser.add_argument("--verify-workers", dest="verify_workers", default=2, type=int)
+    args = parser.parse_args()
+
+    app.log.disabled = True
+
+    print(
+        "%10s %8s %8s %12s %12s" % ("blocks", "peers", "workers", "added", "sync (s)")
+    )
+    for block_count in args.blocks:
+        directory = tempfile.mkdtemp()
+        processes = []
+        try:
+            writeElection(directory, block_count, args.ballots)
+            processes = startPeers(directory, args.peers)
+            for peer_count, worker_count in ((1, 1), (args.peers, sync.SYNC_WORKERS)):
+                seconds, added = catchUp(peer_count, worker_count, args.verify_workers)
+                print(
+                    "%10d %8d %8d %12d %12.2f"
+                    % (block_count, peer_count, worker_count, added, seconds)
+                )
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+            for i in range(args.peers):
+                shutil.rmtree("%s-%d" % (directory, i), ignore_errors=True)
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# bench_tally.py - compare the instant-runoff tally backends on synthetic elections
+
+import os
+import sys
+import time
+import random
+import argparse
+from array import array
+from collections import namedtuple
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import tally
+import compact
+import blockchain
+
+""" Stand-ins for the Blocks and Ballots of a chain with only the fields read by the tally. """
+SyntheticBlock = namedtuple("SyntheticBlock", ["ballots"])
+SyntheticBallot = namedtuple("SyntheticBallot", ["ranking"])
+
+
+def createElection(ballot_count, candidate_count, block_size):
+    """Create an election whose chain holds synthetic blocks of random partial rankings.
+
+    Arguments:
+        ballot_count {int} -- Number of ballots.
+        candidate_count {int} -- Number of candidates.
+        block_size {int} -- Number of ballots in each block.
+
+    Returns:
+        {Election} -- The election.
+    """
+
+    candidates = ["candidate %d" % i for i in range(candidate_count)]
+
+    # Skew the preferences so that elections take several rounds
+    weights = [1 / (i + 1) for i in range(candidate_count)]
+    election = compact.Election(blockchain.createGenesisBlock("bench", candidates, []))
+    election.chain.append(SyntheticBlock(()))
+    for start in range(0, ballot_count, block_size):
+        ballots = []
+        for _ in range(min(block_size, ballot_count - start)):
+            depth = random.randint(1, candidate_count)
+            ranking = []
+            while len(ranking) < depth:
+                candidate = random.choices(candidates, weights)[0]
+                if candidate not in ranking:
+                    ranking.append(candidate)
+            ranking = [election.indexes[candidate] for candidate in ranking]
+            ballots.append(SyntheticBallot(array(election.typecode, ranking)))
+        election.chain.append(SyntheticBlock(ballots))
+    return election
+
+
+def referenceRunoff(election):
+    """Pure Python instant-runoff that recounts every ballot in every round.
+
+    Arguments:
+        election {Election} -- An election.
+
+    Returns:
+        {str} -- The winner, or None if there is none.
+    """
+
+    candidates = election.candidates
+    order = election.indexes
+    ballots = [
+        tally.normalizeRanking(order, [candidates[i] for i in ballot.ranking])
+        for block in election.chain
+        for ballot in block.ballots
+    ]
+    eliminated = set()
+    while len(eliminated) < len(candidates):
+        counts = {c: 0 for c in candidates if c not in eliminated}
+        for ranking in ballots:
+            for candidate in ranking:
+                if candidate not in eliminated:
+                    counts[candidate] += 1
+                    break
+        total = sum(counts.values())
+        leader = max(counts, key=lambda c: (counts[c], -order[c]))
+        if total == 0:
+            return None
+        if counts[leader] * 2 > total or len(counts) == 1:
+            return leader
+        eliminated.add(min(counts, key=lambda c: (counts[c], -order[c])))
+    return None
+
+
+def timeBackend(backend, election):
+    """Time building a tally of the election and computing its result.
+
+    Arguments:
+        backend {str} -- "numpy" or "python".
+        election {Election} -- An election.
+
+    Returns:
+        {(float, float, str)} -- Seconds to build, seconds to compute the result and the winner.
+    """
+
+    start = time.perf_counter()
+    election_tally = tally.createTally(election, backend)
+    built = time.perf_counter()
+    results = election_tally.results()
+    return built - start, time.perf_counter() - built, results["winner"]
+
+
+def main():
+    """Parse args and print the tally time of each backend for each election size.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark tally backends.")
+    parser.add_argument(
+        "-n",
+        "--ballots",
+        dest="ballots",
+        default=[10000, 100000, 1000000],
+        type=int,
+        nargs="*",
+    )
+    parser.add_argument("-c", "--candidates", dest="candidates", default=8, type=int)
+    parser.add_argument("-b", "--block-size", dest="block_size", default=256, type=int)
+    args = parser.parse_args()
+
+    if tally.np is None:
+        print("numpy is not installed, the numpy backend falls back to python")
+
+    random.seed(0)
+    print(
+        "%10s %12s %14s %14s %14s %14s"
+        % (
+            "ballots",
+            "reference",
+            "python build",
+            "python tally",
+            "numpy build",
+            "numpy tally",
+        )
+    )
+    for ballot_count in args.ballots:
+        election = createElection(ballot_count, args.candidates, args.block_size)
+
+        start = time.perf_counter()
+        winner = referenceRunoff(election)
+        reference = time.perf_counter() - start
+
+        python_build, python_tally, python_winner = timeBackend("python", election)
+        numpy_build, numpy_tally, numpy_winner = timeBackend("numpy", election)
+        assert winner == python_winner == numpy_winner
+
+        print(
+            "%10d %12.3f %14.3f %14.3f %14.3f %14.3f"
+            % (
+                ballot_count,
+                reference,
+                python_build,
+                python_tally,
+                numpy_build,
+                numpy_tally,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# harness.py - run a local network of nodes under a ballot casting load
+
+import os
+import sys
+import time
+import random
+import shlex
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+from bench import SRC_DIR, percentiles, writeResults
+
+""" Seconds between polls of the nodes' chains. """
+POLL_INTERVAL = 0.25
+
+""" Seconds to wait for a request to a node. """
+REQUEST_TIMEOUT = 30
+
+
+class Network:
+    """A network of nodes on localhost ports, each running app.py in its own process and logging
+    to a file in a temporary directory.
+    """
+
+    def __init__(self, node_count, miner_count, base_port, node_args):
+        """
+        Arguments:
+            node_count {int} -- Number of nodes.
+            miner_count {int} -- Number of nodes that mine, the first nodes are the miners.
+            base_port {int} -- Port of the first node, the others follow it.
+            node_args {list} -- Extra arguments passed to every node.
+        """
+
+        self.ports = [base_port + i for i in range(node_count)]
+        self.log_dir = tempfile.mkdtemp(prefix="blockvote-harness-")
+        self.processes = []
+        for i, port in enumerate(self.ports):
+            # Each node knows the next one, so the nodes start out as a ring
+            args = [sys.executable, "app.py", "-p", str(port)]
+            if node_count > 1:
+                args += ["-s", str(self.ports[(i + 1) % node_count])]
+            if i < miner_count:
+                args.append("-m")
+            log = open(os.path.join(self.log_dir, "%d.log" % port), "w")
+            self.processes.append(
+                subprocess.Popen(
+                    args + node_args, cwd=SRC_DIR, stdout=log, stderr=subprocess.STDOUT
+                )
+            )
+            log.close()
+
+    def url(self, port, path):
+        return "http://localhost:%d%s" % (port, path)
+
+    def waitAlive(self, timeout):
+        """
+        Arguments:
+            timeout {float} -- Seconds to wait.
+
+        Raises:
+            RuntimeError -- If a node exits or does not answer in time.
+        """
+
+        deadline = time.time() + timeout
+        for port, process in zip(self.ports, self.processes):
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError("node %d exited, see %s" % (port, self.log_dir))
+                try:
+                    requests.get(self.url(port, "/alive"), timeout=1)
+                    break
+                except requests.exceptions.RequestException:
+                    if time.time() > deadline:
+                        raise RuntimeError("node %d did not start" % port)
+                    time.sleep(POLL_INTERVAL)
+
+    def summaries(self, port):
+        """
+        Arguments:
+            port {int} -- Port of a node.
+
+        Returns:
+            {dict} -- Maps the id's of the node's elections to their summaries.
+        """
+
+        response = requests.get(
+            self.url(port, "/elections/summary"), timeout=REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        return {summary["id"]: summary for summary in response.json()}
+
+    def stop(self):
+        """Stops every node.
+        """
+
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class ChainWatcher:
+    """Follows the chains of every election on every node and notes when each ballot was first
+    seen in a node's chain. Pages are requested since the last block seen, and the whole chain
+    again if that block left the chain.
+    """
+
+    def __init__(self, network, elections):
+        """
+        Arguments:
+            network {Network} -- The network.
+            elections {list} -- Id's of the elections to follow.
+        """
+
+        self.network = network
+        self.elections = elections
+
+        """ A dictionary that maps (port, election) to the id of the last block seen. """
+        self.tips = {}
+
+        """ A dictionary that maps each port to a dictionary of ballot id's to the time they
+        were first seen in the node's chain. """
+        self.confirmed = {port: {} for port in network.ports}
+
+    def poll(self, port, election):
+        """Reads the blocks added to an election's chain on a node since the last poll.
+
+        Arguments:
+            port {int} -- Port of the node.
+            election {str} -- Election id.
+        """
+
+        tip = self.tips.get((port, election))
+        params = {"since": tip} if tip else {"start": 0}
+        while True:
+            response = requests.get(
+                self.network.url(port, "/election/%s/blocks" % election),
+                params=params,
+                timeout=REQUEST_TIMEOUT,
+            )
+            if response.status_code != 200:
+                if "since" not in params:
+                    return
+                # The block is no longer in the chain, read it again from the start
+                params = {"start": 0}
+                continue
+            page = response.json()
+            now = time.time()
+            for block in page["blocks"]:
+                for ballot in block["ballots"]:
+                    self.confirmed[port].setdefault(ballot["ballot"]["id"], now)
+            if page["blocks"]:
+                self.tips[(port, election)] = page["blocks"][-1]["header"]["id"]
+            end = page["start"] + len(page["blocks"])
+            if not page["blocks"] or end > page["height"]:
+                return
+            params = {"start": end}
+
+    def pollAll(self):
+        for port in self.network.ports:
+            for election in self.elections:
+                self.poll(port, election)
+
+
+def createElections(network, count, ballot_count, candidates):
+    """Creates elections on the nodes in turn and waits for every node to have all of them.
+
+    Arguments:
+        network {Network} -- The network.
+        count {int} -- Number of elections.
+        ballot_count {int} -- Number of key pairs of each election.
+        candidates {list} -- Candidate names.
+
+    Returns:
+        {(list, float)} -- The JSON of each election with its key pairs, and the seconds between
+        the last election being created and every node having every election.
+    """
+
+    elections = []
+    for i in range(count):
+        port = network.ports[i % len(network.ports)]
+        response = requests.post(
+            network.url(port, "/new_election"),
+            json={
+                "label": "harness %d" % i,
+                "candidates": candidates,
+                "ballot_count": ballot_count,
+            },
+            timeout=REQUEST_TIMEOUT + ballot_count,
+        )
+        response.raise_for_status()
+        elections.append(response.json())
+
+    created = time.time()
+    ids = {election["id"] for election in elections}
+    while not all(ids <= network.summaries(port).keys() for port in network.ports):
+        time.sleep(POLL_INTERVAL)
+    return elections, time.time() - created
+
+
+def castBallots(network, elections, candidates, concurrency, rate):
+    """Casts a ballot with every signing key of the elections, spreading them across the nodes.
+
+    Arguments:
+        network {Network} -- The network.
+        elections {list} -- The JSON of each election with its key pairs.
+        candidates {list} -- Candidate names.
+        concurrency {int} -- Number of ballots cast at once.
+        rate {float} -- Ballots sent per second, 0 sends them as fast as the nodes answer.
+
+    Returns:
+        {list} -- (port, ballot id or None if it was rejected, seconds the request was sent at,
+        seconds the request took) of each ballot.
+    """
+
+    jobs = [
+        (election["id"], signing_key)
+        for election in elections
+        for signing_key in election["signing_keys"]
+    ]
+    random.shuffle(jobs)
+    start = time.time()
+
+    def cast(i):
+        election, signing_key = jobs[i]
+        port = network.ports[i % len(network.ports)]
+        if rate:
+            time.sleep(max(0, start + i / rate - time.time()))
+        ranking = random.sample(candidates, len(candidates))
+        sent = time.time()
+        try:
+            response = requests.post(
+                network.url(port, "/cast_ballot"),
+                json={
+                    "signing_key": signing_key,
+                    "candidates": ranking,
+                    "election": election,
+                },
+                timeout=REQUEST_TIMEOUT,
+            )
+            ballot_id = None
+            if response.status_code == 200:
+                ballot_id = response.json()["ballot"]["id"]
+        except requests.exceptions.RequestException:
+            ballot_id = None
+        return port, ballot_id, sent, time.time() - sent
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(cast, range(len(jobs))))
+
+
+def run(args):
+    """Starts the network, drives the load and measures it.
+
+    Arguments:
+        args {obj} -- The parsed arguments.
+
+    Returns:
+        {dict} -- The measurements.
+    """
+
+    network = Network(
+        args.nodes, args.miners, args.base_port, shlex.split(args.node_args)
+    )
+    try:
+        network.waitAlive(args.startup)
+        elections, propagation = createElections(
+            network, args.elections, args.ballots, args.candidates
+        )
+        watcher = ChainWatcher(network, [election["id"] for election in elections])
+
+        # Follow the chains while ballots are cast, so confirmation times are not held back
+        casting = True
+
+        def follow():
+            while casting:
+                watcher.pollAll()
+                time.sleep(POLL_INTERVAL)
+
+        follower = threading.Thread(target=follow)
+        follower.start()
+        start = time.time()
+        try:
+            casts = castBallots(
+                network, elections, args.candidates, args.concurrency, args.rate
+            )
+        finally:
+            casting = False
+            follower.join()
+        cast_end = time.time()
+        accepted = [cast for cast in casts if cast[1] is not None]
+        ballot_ids = {ballot_id for _, ballot_id, _, _ in accepted}
+
+        # The network has converged once every node holds every accepted ballot in its chain and
+        # all of them have the same tip for every election. Ballots can be lost in gossip, so the
+        # time the tips last came to agree is kept as well
+        converged = None
+        agreed = None
+        while time.time() - cast_end < args.timeout:
+            watcher.pollAll()
+            tips = [
+                {id: summary["tip"] for id, summary in network.summaries(port).items()}
+                for port in network.ports
+            ]
+            if not all(tip == tips[0] for tip in tips):
+                agreed = None
+            elif agreed is None:
+                agreed = time.time() - cast_end
+            if agreed is not None and all(
+                ballot_ids <= confirmed.keys()
+                for confirmed in watcher.confirmed.values()
+            ):
+                converged = time.time() - cast_end
+                break
+            time.sleep(POLL_INTERVAL)
+
+        # A ballot is confirmed once it is in the chain of the node it was cast on
+        confirmations = [
+            watcher.confirmed[port][ballot_id] - sent
+            for port, ballot_id, sent, _ in accepted
+            if ballot_id in watcher.confirmed[port]
+        ]
+        confirmed_all = [
+            max(confirmed[ballot_id] for confirmed in watcher.confirmed.values())
+            for ballot_id in ballot_ids
+            if all(ballot_id in confirmed for confirmed in watcher.confirmed.values())
+        ]
+        return {
+            "election_propagation_seconds": propagation,
+            "cast": {
+                "sent": len(casts),
+                "accepted": len(accepted),
+                "rejected": len(casts) - len(accepted),
+                "seconds": cast_end - start,
+                "ballots_per_second": len(accepted) / (cast_end - start),
+                "latency_seconds": percentiles([cast[3] for cast in casts]),
+            },
+            "confirmation": {
+                "confirmed": len(confirmations),
+                "seconds": percentiles(confirmations),
+                "confirmed_per_second": len(confirmed_all)
+                / (max(confirmed_all) - start)
+                if confirmed_all
+                else 0,
+            },
+            "convergence_seconds": converged,
+            "tips_agreed_seconds": agreed,
+            "unconfirmed": len(ballot_ids) - len(confirmed_all),
+        }
+    finally:
+        network.stop()
+        if args.keep_logs:
+            print("node logs are in %s" % network.log_dir)
+        else:
+            shutil.rmtree(network.log_dir, True)
+
+
+def seconds(value):
+    """
+    Arguments:
+        value {float} -- A measurement in seconds, None if it was not made.
+
+    Returns:
+        {str} -- The measurement to print.
+    """
+
+    return "%.2fs" % value if value is not None else "-"
+
+
+def main():
+    """Parse args, run the harness, print a summary and write the results file.
+    """
+
+    parser = argparse.ArgumentParser(description="Load a local network of nodes.")
+    parser.add_argument("-n", "--nodes", dest="nodes", default=3, type=int)
+    parser.add_argument("-m", "--miners", dest="miners", default=1, type=int)
+    parser.add_argument("-p", "--base-port", dest="base_port", default=5500, type=int)
+    parser.add_argument("-e", "--elections", dest="elections", default=1, type=int)
+    parser.add_argument("-b", "--ballots", dest="ballots", default=100, type=int)
+    parser.add_argument(
+        "-c", "--candidates", dest="candidates", default=["a", "b", "c"], nargs="*"
+    )
+    parser.add_argument("--concurrency", dest="concurrency", default=8, type=int)
+    parser.add_argument("-r", "--rate", dest="rate", default=0, type=float)
+    parser.add_argument("-t", "--timeout", dest="timeout", default=120, type=float)
+    parser.add_argument("--startup", dest="startup", default=60, type=float)
+    parser.add_argument(
+        "--node-args", dest="node_args", default="-w 1 --verify-workers 0"
+    )
+    parser.add_argument(
+        "--keep-logs", dest="keep_logs", default=False, action="store_true"
+    )
+    parser.add_argument("-o", "--output", dest="output", default=None)
+    args = parser.parse_args()
+
+    results = run(args)
+    cast = results["cast"]
+    confirmation = results["confirmation"]
+    print(
+        "cast %d of %d ballots in %.2fs, %.1f ballots/s"
+        % (cast["accepted"], cast["sent"], cast["seconds"], cast["ballots_per_second"])
+    )
+    print(
+        "latency p50 %s p99 %s, confirmation p50 %s p90 %s p99 %s"
+        % tuple(
+            seconds(value)
+            for value in (
+                cast["latency_seconds"]["p50"],
+                cast["latency_seconds"]["p99"],
+                confirmation["seconds"]["p50"],
+                confirmation["seconds"]["p90"],
+                confirmation["seconds"]["p99"],
+            )
+        )
+    )
+    print(
+        "converged %s after casting, tips agreed %s, %d ballots not in every chain"
+        % (
+            seconds(results["convergence_seconds"]),
+            seconds(results["tips_agreed_seconds"]),
+            results["unconfirmed"],
+        )
+    )
+    print("wrote %s" % writeResults("harness", vars(args), results, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# micro.py - microbenchmarks of hashing, mining, signing, key generation and key lookups
+
+import os
+import time
+import argparse
+
+from bench import writeResults
+import compact
+import blockchain
+
+""" Size in bytes of a NIST192p verifying key or signature. """
+KEY_SIZE = 48
+
+""" Candidates of the synthetic elections. """
+CANDIDATES = ["a", "b", "c"]
+
+
+def timeCalls(function, repeat, rounds=3):
+    """
+    Arguments:
+        function {function} -- Function that takes no arguments.
+        repeat {int} -- Number of calls in a round.
+        rounds {int} -- Number of rounds, the fastest is kept. (default: {3})
+
+    Returns:
+        {float} -- Seconds per call in the fastest round.
+    """
+
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        seconds = (time.perf_counter() - start) / repeat
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def result(name, seconds, **params):
+    """
+    Arguments:
+        name {str} -- Name of the benchmark.
+        seconds {float} -- Seconds per operation.
+        params -- What the benchmark was run with.
+
+    Returns:
+        {dict} -- A result in the form written to the results file.
+    """
+
+    print("%-28s %-28s %14.1f" % (name, formatParams(params), seconds * 1000000))
+    return {
+        "name": name,
+        "params": params,
+        "seconds": seconds,
+        "per_second": 1 / seconds if seconds else None,
+    }
+
+
+def formatParams(params):
+    """
+    Arguments:
+        params {dict} -- What a benchmark was run with.
+
+    Returns:
+        {str} -- The params as name=value pairs.
+    """
+
+    return " ".join("%s=%s" % item for item in sorted(params.items()))
+
+
+def createBallots(election, verifying_keys):
+    """Create ballots that carry random signatures, which hashing and indexing do not check.
+
+    Arguments:
+        election {str} -- Election id.
+        verifying_keys {list} -- Verifying key hex strings, one ballot is created for each.
+
+    Returns:
+        {list} -- List of ballot dictionaries containing a ballot and digital signature.
+    """
+
+    return [
+        {
+            "ballot": blockchain.createBallot(election, CANDIDATES, verifying_key),
+            "signature": os.urandom(KEY_SIZE).hex(),
+        }
+        for verifying_key in verifying_keys
+    ]
+
+
+def createElection(block_count, ballots_per_block):
+    """Create a compact election with a chain of blocks full of ballots.
+
+    Arguments:
+        block_count {int} -- Number of blocks after the genesis block.
+        ballots_per_block {int} -- Number of ballots in each block.
+
+    Returns:
+        {(Election, list)} -- The election and the raw bytes of its verifying keys.
+    """
+
+    verifying_keys = [
+        os.urandom(KEY_SIZE).hex() for _ in range(block_count * ballots_per_block)
+    ]
+    genesis = blockchain.createGenesisBlock("bench", CANDIDATES, verifying_keys)
+    election = compact.Election(genesis)
+    blockchain.addBlock(election, compact.Block(genesis, election))
+    previous = genesis
+    for start in range(0, len(verifying_keys), ballots_per_block):
+        block = blockchain.createBlock(
+            election.id,
+            createBallots(
+                election.id, verifying_keys[start : start + ballots_per_block]
+            ),
+            blockchain.hashBlock(previous),
+            previous["header"]["id"],
+        )
+        blockchain.addBlock(election, compact.Block(block, election))
+        previous = block
+    return election, [bytes.fromhex(key) for key in verifying_keys]
+
+
+def benchHashing(ballot_counts, repeat):
+    """
+    Arguments:
+        ballot_counts {list} -- Numbers of ballots in the hashed blocks.
+        repeat {int} -- Number of calls per round.
+
+    Returns:
+        {list} -- Results of hashBlock for each block size.
+    """
+
+    results = []
+    genesis = blockchain.createGenesisBlock("bench", CANDIDATES, [])
+    for count in ballot_counts:
+        block = blockchain.createBlock(
+            genesis["header"]["id"],
+            createBallots(
+                genesis["header"]["id"],
+                [os.urandom(KEY_SIZE).hex() for _ in range(count)],
+            ),
+            blockchain.hashBlock(genesis),
+            genesis["header"]["id"],
+        )
+        results.append(
+            result(
+                "hashBlock",
+                timeCalls(lambda: blockchain.hashBlock(block), repeat),
+                ballots=count,
+            )
+        )
+    return results
+
+
+def benchMining(difficulties, repeat):
+    """Mining time varies a lot from block to block, so each round mines repeat blocks and the
+    mean is reported rather than the fastest round.
+
+    Arguments:
+        difficulties {list} -- Leading zero bits of the mined blocks.
+        repeat {int} -- Number of blocks mined at each difficulty.
+
+    Returns:
+        {list} -- Results of mineBlock for each difficulty.
+    """
+
+    results = []
+    genesis = blockchain.createGenesisBlock("bench", CANDIDATES, [])
+    ballots = createBallots(
+        genesis["header"]["id"],
+        [os.urandom(KEY_SIZE).hex() for _ in range(blockchain.BLOCK_BALLOT_COUNT)],
+    )
+    for difficulty in difficulties:
+        seconds = timeCalls(
+            lambda: blockchain.mineBlock(
+                genesis["header"]["id"], ballots, genesis, difficulty
+            ),
+            repeat,
+            rounds=1,
+        )
+        results.append(result("mineBlock", seconds, difficulty=difficulty))
+    return results
+
+
+def benchSignatures(repeat):
+    """
+    Arguments:
+        repeat {int} -- Number of ballots signed and verified per round.
+
+    Returns:
+        {list} -- Results of generateKeys, signBallot and verifyBallot with parsed verifying keys
+        cached and not.
+    """
+
+    results = []
+    start = time.perf_counter()
+    signing_keys, verifying_keys = blockchain.generateKeys(repeat)
+    results.append(
+        result("generateKeys", (time.perf_counter() - start) / repeat, keys=repeat)
+    )
+
+    ballots = [
+        blockchain.createBallot("bench", CANDIDATES, verifying_key)
+        for verifying_key in verifying_keys
+    ]
+    start = time.perf_counter()
+    signatures = [
+        blockchain.signBallot(ballot, signing_key)
+        for ballot, signing_key in zip(ballots, signing_keys)
+    ]
+    results.append(result("signBallot", (time.perf_counter() - start) / repeat))
+
+    for cached in (False, True):
+        if not cached:
+            blockchain.loadVerifyingKey.cache_clear()
+        start = time.perf_counter()
+        for ballot, signature, verifying_key in zip(
+            ballots, signatures, verifying_keys
+        ):
+            assert blockchain.verifyBallot(ballot, signature, verifying_key)
+        results.append(
+            result(
+                "verifyBallot", (time.perf_counter() - start) / repeat, cached=cached
+            )
+        )
+    return results
+
+
+def benchLookups(block_counts, repeat):
+    """Looks up keys that are in the election and keys that are not, since a miss is the common
+    case for the spent key index.
+
+    Arguments:
+        block_counts {list} -- Numbers of blocks in the chains.
+        repeat {int} -- Number of lookups per round.
+
+    Returns:
+        {list} -- Results of buildSpentKeyIndex, verifyingKeyInBlockchain and
+        verifyingKeyAlreadyUsed for each chain size.
+    """
+
+    results = []
+    for block_count in block_counts:
+        election, keys = createElection(block_count, blockchain.BLOCK_BALLOT_COUNT)
+        spent_keys = blockchain.buildSpentKeyIndex(election, {})
+        results.append(
+            result(
+                "buildSpentKeyIndex",
+                timeCalls(
+                    lambda: blockchain.buildSpentKeyIndex(election, {}),
+                    max(1, repeat // (block_count * 10)),
+                ),
+                blocks=block_count,
+            )
+        )
+        for hit in (True, False):
+            key = keys[-1] if hit else os.urandom(KEY_SIZE)
+            results.append(
+                result(
+                    "verifyingKeyInBlockchain",
+                    timeCalls(
+                        lambda: blockchain.verifyingKeyInBlockchain(
+                            key, election.verifying_keys
+                        ),
+                        repeat,
+                    ),
+                    blocks=block_count,
+                    hit=hit,
+                )
+            )
+            results.append(
+                result(
+                    "verifyingKeyAlreadyUsed",
+                    timeCalls(
+                        lambda: blockchain.verifyingKeyAlreadyUsed(key, spent_keys),
+                        repeat,
+                    ),
+                    blocks=block_count,
+                    hit=hit,
+                )
+            )
+    return results
+
+
+def main():
+    """Parse args, run every microbenchmark and write the results file.
+    """
+
+    parser = argparse.ArgumentParser(description="Run the blockchain microbenchmarks.")
+    parser.add_argument(
+        "-b", "--ballots", dest="ballots", default=[4, 64, 512], type=int, nargs="*"
+    )
+    parser.add_argument(
+        "-c", "--chains", dest="chains", default=[10, 100, 1000], type=int, nargs="*"
+    )
+    parser.add_argument(
+        "-d",
+        "--difficulties",
+        dest="difficulties",
+        default=[8, 12],
+        type=int,
+        nargs="*",
+    )
+    parser.add_argument("-n", "--repeat", dest="repeat", default=10000, type=int)
+    parser.add_argument("-m", "--mined", dest="mined", default=20, type=int)
+    parser.add_argument("-k", "--keys", dest="keys", default=200, type=int)
+    parser.add_argument("-o", "--output", dest="output", default=None)
+    args = parser.parse_args()
+
+    print("%-28s %-28s %14s" % ("function", "params", "us per call"))
+    results = benchHashing(args.ballots, args.repeat)
+    results += benchMining(args.difficulties, args.mined)
+    results += benchSignatures(args.keys)
+    results += benchLookups(args.chains, args.repeat)
+    print("wrote %s" % writeResults("micro", vars(args), results, args.output))
+
+
+if __name__ == "__main__":
+    main()
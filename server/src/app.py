@@ -7,22 +7,39 @@
 # app.py - flask application that runs a block vote full node or miner
 
 
-from flask import Flask, request, abort, jsonify
+from flask import Flask, Response, request, abort, jsonify, g
 import requests
 import blockchain
+from miner import MiningEngine
+import verifier
+import store
+import gossip
+import tally
+import locks
+import scheduler
+import forks
+import sync
+import compact
+import keygen
+import signer
+import events
+import metrics
 import time
 import json
+import tempfile
+from itertools import islice
+from hashlib import md5
 from ecdsa import SigningKey, VerifyingKey
 from flask_cors import CORS
 import threading
-from flask_socketio import SocketIO, emit
+from eventlet import tpool
+from eventlet.greenthread import getcurrent
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from util import *
 import util
 import uuid
 from binascii import hexlify
 from base64 import b64decode, b64encode
-from random import choice
-from copy import deepcopy
 import logging
 
 log = getLogger("app")
@@ -33,13 +50,169 @@ app.debug = False
 CORS(app)
 socketio = SocketIO(app, async_mode="eventlet")
 
+""" Mining engine, only created when the node is a miner. """
+engine = None
+
+""" Scheduler that picks the election of the next mined block, only created when mining. """
+block_scheduler = None
+
+""" Dispatcher that sends messages to the other nodes. """
+dispatcher = gossip.GossipDispatcher()
+util.dispatcher = dispatcher
+
+""" Batcher that groups broadcast ballots into /receive_batch messages. """
+batcher = gossip.BallotBatcher(dispatcher, nodes)
+
+""" Ids of recently received ballots, blocks and elections. """
+seen = gossip.SeenCache()
+
+""" Append-only chain store, only created when the node is given a data directory. """
+chain_store = None
+
+""" The largest number of blocks returned by one /election/<id>/blocks request. """
+BLOCK_PAGE_SIZE = 100
+
+""" Sync that catches up with the peers, created on startup. """
+chain_sync = None
+
+""" Ballot signature verifier, replaced by one with worker processes on startup. """
+ballot_verifier = verifier.BallotVerifier(0)
+
+""" Key pair generator of new elections, replaced by one with worker processes on startup. """
+key_generator = keygen.KeyGenerator(0)
+
+""" Ballot signer of /cast_ballots, replaced by one with worker processes on startup. """
+ballot_signer = signer.BallotSigner(0)
+
+""" The most ballots cast by one /cast_ballots request. """
+MAX_CAST_BATCH = 1000
+
+""" Bus that sends node and election updates to web socket clients, its loop runs on startup. """
+event_bus = events.EventBus(socketio, build_node_info)
+
+""" Seconds taken by the functions that install_metrics times, labelled by function. """
+function_seconds = metrics.Histogram(
+    "blockvote_function_seconds", "Seconds taken by a call.", ("function",)
+)
+
+""" Seconds taken by each route, labelled by endpoint. """
+request_seconds = metrics.Histogram(
+    "blockvote_request_seconds", "Seconds taken to handle a request.", ("endpoint",)
+)
+
+""" Number of requests handled, labelled by endpoint and status code. """
+requests_total = metrics.Counter(
+    "blockvote_requests_total", "Requests handled.", ("endpoint", "status")
+)
+
+""" Seconds spent waiting for and holding the node lock and the election pool locks. """
+lock_wait_seconds = metrics.Histogram(
+    "blockvote_lock_wait_seconds", "Seconds spent waiting for a lock.", ("lock",)
+)
+lock_hold_seconds = metrics.Histogram(
+    "blockvote_lock_hold_seconds", "Seconds a lock was held.", ("lock",)
+)
+
+""" Number of ballots added to the unconfirmed pools. """
+ballots_admitted = metrics.Counter(
+    "blockvote_ballots_admitted_total", "Ballots added to an unconfirmed pool."
+)
+
+""" Seconds gossip messages waited in the dispatcher's queue before they were sent. """
+gossip_queue_seconds = metrics.Histogram(
+    "blockvote_gossip_queue_seconds", "Seconds a message waited to be sent to a peer."
+)
+
+metrics.Gauge(
+    "blockvote_mempool_ballots",
+    "Ballots in the unconfirmed pools.",
+    function=lambda: mempool.stats()["ballots"],
+)
+metrics.Gauge(
+    "blockvote_mempool_bytes",
+    "Bytes of ballots in the unconfirmed pools.",
+    function=lambda: mempool.stats()["bytes"],
+)
+metrics.Gauge(
+    "blockvote_gossip_queue_depth",
+    "Messages waiting to be sent to a peer.",
+    function=lambda: dispatcher.stats()["queue_depth"],
+)
+metrics.Gauge(
+    "blockvote_hashrate",
+    "Hashes per second of the last mining job.",
+    function=lambda: util.hashrate,
+)
+metrics.Counter(
+    "blockvote_hashes_total",
+    "Hashes computed by the mining engine.",
+    function=lambda: engine.hashes if engine else 0,
+)
+
 
 @socketio.on("connect")
 def connect():
-    """On web socket connect, send the node's info.
+    """On web socket connect, send the node's info to the new client. Later changes reach it as
+    "info_diff" messages from the event bus.
+    """
+
+    emit("info", event_bus.connect(request.sid))
+
+
+@socketio.on("disconnect")
+def disconnect(reason=None):
+    """On web socket disconnect, drop the client's subscriptions.
+    """
+
+    event_bus.disconnect(request.sid)
+
+
+@socketio.on("subscribe")
+def subscribe(election):
+    """Adds the client to an election's room, which is sent the election's new blocks and
+    ballots.
+    
+    Arguments:
+        election {str} -- Election id.
+    
+    Returns:
+        {dict} -- Summary of the election that the updates follow on from, None if the election
+        is unknown.
     """
 
-    socketio.emit("info", build_node_info())
+    if not isinstance(election, str) or election not in blockchains.keys():
+        return None
+    join_room(events.electionRoom(election))
+    event_bus.subscribe(request.sid, election)
+    with election_locks[election].chain.read():
+        return summarize_election(election)
+
+
+@socketio.on("unsubscribe")
+def unsubscribe(election):
+    """Removes the client from an election's room.
+    
+    Arguments:
+        election {str} -- Election id.
+    """
+
+    if not isinstance(election, str):
+        return
+    leave_room(events.electionRoom(election))
+    event_bus.unsubscribe(request.sid, election)
+
+
+@app.route("/metrics")
+def get_metrics():
+    """
+    Returns:
+        {Flask response} -- The node's metrics in the Prometheus text format, aborts if the node
+        was not started with --metrics.
+    """
+
+    if not metrics.enabled:
+        abort(500)
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
 
 
 @app.route("/alive")
@@ -62,8 +235,6 @@ def get_nodes():
     port = int(request.headers.get("node-port"))
     if port and port not in nodes:
         nodes.append(port)
-    node_info = build_node_info()
-    socketio.emit("info", node_info)
     return resp(nodes)
 
 
@@ -74,7 +245,33 @@ def get_elections():
         {resp} -- JSON array of blockchain dictionaries.
     """
 
-    return resp(list(blockchains.values()))
+    elections = []
+    tags = []
+    for election in list(blockchains.values()):
+        with election_locks[election.id].chain.read():
+            elections.append((election, election.chain[:]))
+            tags.append(election.id + tip_hash(election.id))
+    etag = md5("".join(tags).encode()).hexdigest()
+    return etag_resp(
+        etag,
+        lambda: b"["
+        + b",".join(encode_blockchain(*election) for election in elections)
+        + b"]",
+    )
+
+
+@app.route("/elections/summary")
+def get_election_summaries():
+    """
+    Returns:
+        {resp} -- JSON array of election summaries without blocks or verifying keys.
+    """
+
+    summaries = []
+    for election in list(blockchains.keys()):
+        with election_locks[election].chain.read():
+            summaries.append(summarize_election(election))
+    return resp(summaries)
 
 
 @app.route("/election/<id>")
@@ -87,9 +284,104 @@ def get_election(id):
         {resp} -- JSON array of blocks from the chain with the given id.
     """
 
-    if id not in blockchains.keys():
+    with election_lock(id).chain.read():
+        chain = blockchains[id].chain[:]
+        etag = tip_hash(id)
+    return etag_resp(etag, lambda: encode_blocks(chain))
+
+
+@app.route("/election/<id>/blocks")
+def get_election_blocks(id):
+    """Returns a page of blocks from a chain. Clients that already hold part of the chain pass
+    the id of their last block as since, or the height to start at as start, and keep
+    requesting from start plus the number of returned blocks until they reach the height.
+
+    Arguments:
+        id {str} -- Election id.
+    
+    Query Arguments:
+        since {str} -- Optional id of a block in the chain, the page starts after it.
+        start {int} -- Height of the first block when since is not given, defaults to 0.
+        end {int} -- Height after the last block, at most BLOCK_PAGE_SIZE past start.
+    
+    Returns:
+        {resp} -- A JSON object with the height of the chain, the height of the first block in the
+        page and the blocks.
+    """
+
+    with election_lock(id).chain.read():
+        chain = blockchains[id].chain
+        since = request.args.get("since")
+        if since is not None:
+            try:
+                start = block_heights[id][compact.packId(since)] + 1
+            except (ValueError, KeyError):
+                abort(500)
+        else:
+            start = max(request.args.get("start", 0, type=int), 0)
+        end = request.args.get("end", len(chain), type=int)
+        end = min(end, start + BLOCK_PAGE_SIZE, len(chain))
+        height = len(chain) - 1
+        blocks = chain[start:end]
+        etag = "%s-%d-%d" % (tip_hash(id), start, end)
+
+    return etag_resp(
+        etag,
+        lambda: b'{"height":%d,"start":%d,"blocks":%s}'
+        % (height, start, encode_blocks(blocks)),
+    )
+
+
+@app.route("/election/<id>/proof/<ballot_id>")
+def get_ballot_proof(id, ballot_id):
+    """
+    Arguments:
+        id {str} -- Election id.
+        ballot_id {str} -- Id of a confirmed ballot.
+    
+    Returns:
+        {resp} -- A JSON object with the header of the block that holds the ballot, the ballot
+        and an inclusion proof that connects the ballot to the header's ballots_root.
+    """
+
+    try:
+        ballot_id = compact.packId(ballot_id)
+    except ValueError:
         abort(500)
-    return resp(blockchains.get(id).chain)
+    with election_lock(id).chain.read():
+        if ballot_id not in ballot_heights[id]:
+            abort(500)
+        height = ballot_heights[id][ballot_id]
+        block = blockchains[id].chain[height]
+        data = block_records[block.id].data
+
+    # The proof is built from the block as it was received
+    index = [ballot.id for ballot in block.ballots].index(ballot_id)
+    received = json.loads(data)
+    return resp(
+        {
+            "height": height,
+            "header": received["header"],
+            "ballot": received["ballots"][index],
+            "proof": blockchain.merkleProof(received["ballots"], index),
+        }
+    )
+
+
+@app.route("/election/<id>/results")
+def get_election_results(id):
+    """
+    Arguments:
+        id {str} -- Election id.
+    
+    Returns:
+        {resp} -- A JSON object with the round by round instant-runoff result of the election.
+    """
+
+    with election_lock(id).chain.read():
+        return etag_resp(
+            tip_hash(id), lambda: json.dumps(tallies[id].results()).encode()
+        )
 
 
 @app.route("/receive_ballot", methods=["POST"])
@@ -99,33 +391,18 @@ def receive_ballot():
 
     body = request.json
     validate_required(["ballot"], body)
-    ballot = body["ballot"]["ballot"]
-    verifying_key = VerifyingKey.from_string(bytes.fromhex(ballot["verifying_key"]))
+    admit_ballots([body["ballot"]])
+    return ""
 
-    lock.acquire()
-    if (
-        ballot["election"] in blockchains.keys()
-        and ballot["id"] not in unconfirmed_ballots[ballot["election"]].keys()
-        and blockchain.verifyingKeyInBlockchain(
-            verifying_key, blockchains[ballot["election"]]
-        )
-        and not blockchain.verifyingKeyAlreadyUsed(
-            verifying_key,
-            blockchains[ballot["election"]],
-            unconfirmed_ballots[ballot["election"]],
-        )
-        and blockchain.verifyBallot(
-            ballot,
-            body["ballot"]["signature"],
-            verifying_key_hex=ballot["verifying_key"],
-        )
-    ):
-        log.info("%d received ballot %s" % (port, ballot["id"]))
-        unconfirmed_ballots[ballot["election"]][ballot["id"]] = body["ballot"]
-        lock.release()
-        threading.Thread(target=broadcast_ballot, args=[body["ballot"]]).start()
-    else:
-        lock.release()
+
+@app.route("/receive_batch", methods=["POST"])
+def receive_batch():
+    """Receives and verifies a batch of ballots that has been broadcast to the network.
+    """
+
+    body = request.json
+    validate_required(["ballots"], body)
+    admit_ballots(body["ballots"])
     return ""
 
 
@@ -136,13 +413,20 @@ def receive_election():
     body = request.json
     validate_required(["election"], body)
     election = body["election"]
+    if not seen.add("election", election["id"]):
+        return ""
 
-    if election["id"] not in blockchains.keys():
-        blockchains[election["id"]] = election
-        unconfirmed_ballots[election["id"]] = {}
-        socketio.emit("info", build_node_info())
+    with lock:
+        received = election["id"] not in blockchains.keys()
+        if received:
+            try:
+                add_election(election)
+            except ValueError:
+                abort(500)
+
+    if received:
         log.info("%d received election %s" % (port, election["id"]))
-        threading.Thread(target=broadcast_election, args=[election]).start()
+        broadcast_election(election)
     return ""
 
 
@@ -154,61 +438,95 @@ def receive_block():
     validate_required(["block"], body)
     block = body["block"]
     election = block["header"]["election"]
-
-    with lock:
-        if (
-            block["header"]["election"] in blockchains.keys()
-            and blockchain.verifyBlock(block)
-            and block["header"]["id"]
-            not in [b["header"]["id"] for b in blockchains[election]["chain"]]
-            and blockchains[election]["chain"][-1]["header"]["id"]
-            == block["header"]["previous_id"]
-        ):
-            blockchains[election]["chain"].append(block)
-            for ballot in block["ballots"]:
-                if ballot["ballot"]["id"] in unconfirmed_ballots.keys():
-                    unconfirmed_ballots.pop(ballot["ballot"]["id"])
-            log.info("%d received block %s" % (port, block["header"]["id"]))
-            threading.Thread(target=broadcast_block, args=[block]).start()
+    if not seen.add("block", block["header"]["id"]):
+        return ""
+
+    if election not in blockchains.keys():
+        # Process the block again if it is received after its election
+        seen.discard("block", block["header"]["id"])
+        return ""
+    record = blockchain.createBlockRecord(block)
+    for accepted in accept_blocks(election, [record]):
+        log.info("%d received block %s" % (port, accepted.block["header"]["id"]))
+        broadcast_block(accepted)
+    with election_locks[election].chain.read():
+        rejected = not block_trees[election].contains(record.hash)
+    if rejected:
+        # A forged copy must not keep the block with its id out
+        seen.discard("block", block["header"]["id"])
     return ""
 
 
 @app.route("/new_election", methods=["POST"])
 def new_election():
-    """Creates a new election and broadcasts it to the network.
+    """Creates a new election and broadcasts it to the network. The body may hold params that
+    replace any of the DEFAULT_PARAMS of the election. Key pairs are generated in chunks on the
+    key generator's processes and the signing keys are spooled to a temporary file, so that they
+    can be streamed back without holding them all in memory.
+
+    The format query argument picks the response. "json", the default, is a JSON object that
+    contains the election information and key pairs. "ndjson" is a downloadable file whose first
+    line is the election information and each following line a key pair.
     
     Returns:
-        {resp} -- A JSON object that contains the election information and key pairs.
+        {Flask response} -- A 200 streamed response of the election and its key pairs.
     """
 
     body = request.json
     validate_required(["label", "candidates", "ballot_count"], body)
+    key_format = request.args.get("format", "json")
+    if key_format not in ("json", "ndjson"):
+        abort(500)
+    ballot_count = body["ballot_count"]
+    if not isinstance(ballot_count, int) or ballot_count < 0:
+        abort(500)
+    params = body.get("params", {})
+    if not isinstance(params, dict) or not blockchain.validParams(
+        dict(blockchain.DEFAULT_PARAMS, **params)
+    ):
+        abort(500)
 
-    signing_keys, verifying_keys = blockchain.generateKeys(body["ballot_count"])
-
-    genesis = blockchain.createGenesisBlock(
-        body["label"], body["candidates"], verifying_keys
-    )
-    new_blockchain = blockchain.createBlockchain(genesis)
+    signing_file = tempfile.TemporaryFile()
+    try:
+        verifying_keys = run_blocking(generate_keys, ballot_count, signing_file)
+        genesis = run_blocking(
+            blockchain.createGenesisBlock,
+            body["label"],
+            body["candidates"],
+            verifying_keys,
+            params,
+        )
+        new_blockchain = blockchain.createBlockchain(genesis)
 
-    with lock:
-        blockchains[genesis["header"]["id"]] = new_blockchain
-        unconfirmed_ballots[genesis["header"]["id"]] = {}
+        with lock:
+            add_election(new_blockchain)
+    except ValueError:
+        signing_file.close()
+        abort(500)
+    seen.add("election", new_blockchain["id"])
 
-    socketio.emit("info", build_node_info())
     log.info("%d created election %s" % (port, new_blockchain["id"]))
-    threading.Thread(target=broadcast_election, args=[new_blockchain]).start()
-
-    return resp(
-        {
-            "id": genesis["header"]["id"],
-            "label": genesis["header"]["label"],
-            "time": genesis["header"]["timestamp"],
-            "candidates": genesis["header"]["candidates"],
-            "verifying_keys": verifying_keys,
-            "signing_keys": signing_keys,
-        }
-    )
+    broadcast_election(new_blockchain)
+
+    info = {
+        "id": genesis["header"]["id"],
+        "label": genesis["header"]["label"],
+        "time": genesis["header"]["timestamp"],
+        "candidates": genesis["header"]["candidates"],
+        "params": genesis["header"]["params"],
+    }
+    signing_file.seek(0)
+    keys = stream_election_keys(info, verifying_keys, signing_file, key_format)
+    if key_format == "ndjson":
+        return Response(
+            keys,
+            200,
+            {
+                "Content-Type": "application/x-ndjson",
+                "Content-Disposition": 'attachment; filename="%s.ndjson"' % info["id"],
+            },
+        )
+    return Response(keys, 200, {"Content-Type": "text/json"})
 
 
 @app.route("/cast_ballot", methods=["POST"])
@@ -225,98 +543,1135 @@ def cast_ballot():
     signing_key = SigningKey.from_string(bytes.fromhex(body["signing_key"]))
     verifying_key = signing_key.get_verifying_key()
 
-    with lock:
-        if body["election"] not in blockchains:
-            abort(500)
-        if not blockchain.verifyingKeyInBlockchain(
-            verifying_key, blockchains[body["election"]]
+    pool_lock = election_lock(body["election"]).pool
+    if not blockchain.verifyingKeyInBlockchain(
+        verifying_key.to_string(), eligible_keys[body["election"]]
+    ):
+        abort(500)
+    with pool_lock:
+        if blockchain.verifyingKeyAlreadyUsed(
+            verifying_key.to_string(), spent_keys[body["election"]]
         ):
             abort(500)
+
+    # Sign outside of the lock, the key is checked again before the ballot is added
+    ballot = blockchain.createBallot(
+        body["election"], body["candidates"], verifying_key.to_string().hex()
+    )
+    signature = blockchain.signBallot(ballot, body["signing_key"])
+
+    ballot_msg = {"ballot": ballot, "signature": signature}
+    try:
+        compact_ballot = compact.Ballot(ballot_msg, blockchains[body["election"]])
+    except ValueError:
+        abort(500)
+
+    with pool_lock:
         if blockchain.verifyingKeyAlreadyUsed(
-            verifying_key,
-            blockchains[body["election"]],
-            unconfirmed_ballots[body["election"]],
+            verifying_key.to_string(), spent_keys[body["election"]]
         ):
             abort(500)
+        if not add_unconfirmed_ballot(body["election"], compact_ballot):
+            abort(500)
+    log.info("%d cast ballot %s" % (port, ballot["id"]))
+    seen.add("ballot", ballot["id"])
+    broadcast_ballots([ballot_msg])
+    return resp(ballot_msg)
+
+
+@app.route("/cast_ballots", methods=["POST"])
+def cast_ballots():
+    """Creates, signs and broadcasts a batch of ballots, each given like the body of /cast_ballot.
+    The body is either a JSON array of them or, with the application/x-ndjson content type, one
+    per line. The response is in the same format with a status for each ballot in order.
+    
+    Returns:
+        {Flask response} -- A 200 response of the status of each ballot.
+    """
+
+    ndjson = request.mimetype == "application/x-ndjson"
+    if ndjson:
+        entries = []
+        for line in request.get_data().splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                entries.append(None)
+    else:
+        entries = request.json
+        if not isinstance(entries, list):
+            abort(500)
+    if len(entries) > MAX_CAST_BATCH:
+        abort(500)
+
+    statuses = cast_batch(entries)
+    if ndjson:
+        return Response(
+            "".join(json.dumps(status) + "\n" for status in statuses),
+            200,
+            {"Content-Type": "application/x-ndjson"},
+        )
+    return resp(statuses)
+
+
+# State Helpers
+
+
+def cast_batch(entries):
+    """Casts a batch of ballots in stages. The verifying keys of the batch are derived on the
+    ballot signer's processes, every key is checked against the indexes of its election in one
+    pass under the election's pool lock, the admissible ballots are signed on the signer's
+    processes, and then each election's ballots are added to its pool under a single hold of the
+    lock. The ballots that were cast are broadcast in a single message.
+
+    Each status is a dictionary whose status is "cast", with the ballot, or the reason the
+    ballot was not cast: "malformed", "unknown_election", "ineligible", "already_voted" or
+    "pool_full".
+    
+    Arguments:
+        entries {list} -- Dictionaries with the signing_key, candidates and election of a ballot.
+    
+    Returns:
+        {list} -- The status of each ballot.
+    """
+
+    statuses = [None] * len(entries)
+    checked = []
+    for i, entry in enumerate(entries):
+        if (
+            not isinstance(entry, dict)
+            or not isinstance(entry.get("signing_key"), str)
+            or not isinstance(entry.get("candidates"), list)
+            or not isinstance(entry.get("election"), str)
+        ):
+            statuses[i] = {"status": "malformed"}
+        elif entry["election"] not in blockchains.keys():
+            statuses[i] = {"status": "unknown_election"}
+        elif not all(
+            isinstance(candidate, str)
+            and candidate in blockchains[entry["election"]].indexes
+            for candidate in entry["candidates"]
+        ):
+            statuses[i] = {"status": "malformed"}
+        else:
+            checked.append(i)
+
+    by_election = {}
+    verifying_keys = run_blocking(
+        ballot_signer.verifyingKeys, [entries[i]["signing_key"] for i in checked]
+    )
+    for i, verifying_key in zip(checked, verifying_keys):
+        if verifying_key is None:
+            statuses[i] = {"status": "malformed"}
+        else:
+            by_election.setdefault(entries[i]["election"], []).append(
+                (i, verifying_key)
+            )
 
-        ballot = blockchain.createBallot(
-            body["election"], body["candidates"], verifying_key.to_string().hex()
+    # A key used earlier in the batch counts as spent
+    admissible = []
+    for election, keyed in by_election.items():
+        batch_keys = set()
+        with election_locks[election].pool:
+            for i, verifying_key in keyed:
+                if not blockchain.verifyingKeyInBlockchain(
+                    verifying_key, eligible_keys[election]
+                ):
+                    statuses[i] = {"status": "ineligible"}
+                elif verifying_key in batch_keys or blockchain.verifyingKeyAlreadyUsed(
+                    verifying_key, spent_keys[election]
+                ):
+                    statuses[i] = {"status": "already_voted"}
+                else:
+                    batch_keys.add(verifying_key)
+                    admissible.append((i, verifying_key))
+
+    # Sign outside of the locks, the keys are checked again before the ballots are added
+    ballots = [
+        blockchain.createBallot(
+            entries[i]["election"], entries[i]["candidates"], verifying_key.hex()
         )
-        signature = blockchain.signBallot(ballot, body["signing_key"])
+        for i, verifying_key in admissible
+    ]
+    signatures = run_blocking(
+        ballot_signer.signBatch,
+        ballots,
+        [entries[i]["signing_key"] for i, _ in admissible],
+    )
 
+    by_election = {}
+    for (i, _), ballot, signature in zip(admissible, ballots, signatures):
         ballot_msg = {"ballot": ballot, "signature": signature}
+        try:
+            compact_ballot = compact.Ballot(ballot_msg, blockchains[ballot["election"]])
+        except ValueError:
+            statuses[i] = {"status": "malformed"}
+            continue
+        by_election.setdefault(ballot["election"], []).append(
+            (i, ballot_msg, compact_ballot)
+        )
 
-        unconfirmed_ballots[body["election"]][ballot["id"]] = ballot_msg
-        log.info("%d cast ballot %s" % (port, ballot["id"]))
-    threading.Thread(target=broadcast_ballot, args=[ballot_msg]).start()
-    return resp(ballot_msg)
+    cast = []
+    for election, signed in by_election.items():
+        with election_locks[election].pool:
+            for i, ballot_msg, compact_ballot in signed:
+                if blockchain.verifyingKeyAlreadyUsed(
+                    compact_ballot.verifying_key, spent_keys[election]
+                ):
+                    statuses[i] = {"status": "already_voted"}
+                elif not add_unconfirmed_ballot(election, compact_ballot):
+                    statuses[i] = {"status": "pool_full"}
+                else:
+                    statuses[i] = {"status": "cast", "ballot": ballot_msg}
+                    cast.append(ballot_msg)
+
+    for ballot_msg in cast:
+        seen.add("ballot", ballot_msg["ballot"]["id"])
+    if cast:
+        log.info("%d cast %d ballots" % (port, len(cast)))
+        broadcast_batch(cast)
+    return statuses
+
+
+def add_election(chain, save=True):
+    """Adds an election to the node from its genesis block with an empty unconfirmed pool and
+    stores it. Any later blocks of the chain are left to sync, which verifies them. The caller
+    must hold lock. The election is published last so that every election in blockchains has
+    its locks and indexes.
+    
+    Arguments:
+        chain {dict} -- Blockchain dictionary from createBlockchain.
+        save {bool} -- Whether or not to append the genesis block to the chain store.
+    
+    Raises:
+        ValueError -- If the genesis block is malformed, has invalid parameters or is not the
+        blockchain's.
+    """
+
+    received = blockchain.createBlockRecord(chain["chain"][0])
+    election = compact.Election(received.block)
+    if election.id != chain["id"]:
+        raise ValueError("genesis block is not election %s" % chain["id"])
+    if election.params is not None and not blockchain.validParams(election.params):
+        raise ValueError("election %s has invalid parameters" % election.id)
+    genesis = blockchain.compactRecord(received, election)
+
+    election_locks[election.id] = locks.ElectionLock()
+    if metrics.enabled:
+        time_pool_lock(election_locks[election.id])
+    mempool.create(election.id)
+    index_election(election, genesis)
+    blockchains[election.id] = election
+    if save and chain_store:
+        chain_store.append(election.id, [genesis])
+
+
+def add_unconfirmed_ballot(election, ballot, limit=True):
+    """Adds a ballot to the unconfirmed pool of an election and marks its key as spent. Ballots
+    that waited in the pool too long are evicted first. The caller must hold the election's pool
+    lock.
+    
+    Arguments:
+        election {str} -- Election id.
+        ballot {Ballot} -- The ballot.
+        limit {bool} -- Whether or not the ballot is refused when the pool is full.
+    
+    Returns:
+        {bool} -- True if the ballot was added.
+    """
+
+    release_ballots(election, mempool.expire(election))
+    if not mempool.add(election, ballot, limit):
+        return False
+    blockchain.indexPendingBallot(spent_keys[election], ballot)
+    if block_scheduler:
+        block_scheduler.add(election, [ballot.id])
+    if metrics.enabled:
+        ballots_admitted.inc()
+    event_bus.ballotsAdded(election, [ballot.id])
+    return True
+
+
+def release_ballots(election, ballots):
+    """Releases the keys of ballots that were evicted from the unconfirmed pool of an election so
+    that they can be cast again. The caller must hold the election's pool lock.
+    
+    Arguments:
+        election {str} -- Election id.
+        ballots {list} -- Ballots that left the pool without being confirmed.
+    """
+
+    for ballot in ballots:
+        blockchain.unindexPendingBallot(spent_keys[election], ballot)
+    if block_scheduler and ballots:
+        block_scheduler.remove(election, [ballot.id for ballot in ballots])
+
+
+def expire_ballots():
+    """Evicts the ballots of every election that waited in the unconfirmed pool too long.
+    """
+
+    for election in list(blockchains.keys()):
+        with election_locks[election].pool:
+            release_ballots(election, mempool.expire(election))
+
+
+def ballot_admissible(ballot):
+    """Runs the checks of a received ballot that do not need its signature. The caller must hold
+    the pool lock of the ballot's election.
+    
+    Arguments:
+        ballot {Ballot} -- A received ballot.
+    
+    Returns:
+        {bool} -- True if the ballot is not already in the pool and its verifying key is eligible
+        and unused.
+    """
+
+    election = ballot.election.id
+    return (
+        not mempool.contains(election, ballot.id)
+        and blockchain.verifyingKeyInBlockchain(
+            ballot.verifying_key, eligible_keys[election]
+        )
+        and not blockchain.verifyingKeyAlreadyUsed(
+            ballot.verifying_key, spent_keys[election]
+        )
+    )
+
+
+def run_blocking(function, *args):
+    """Calls a function that blocks, such as one that waits on a process pool. A green thread
+    runs it on eventlet's native thread pool, since the hub is not monkey patched and a green
+    thread that blocks stops every other request. Native threads call it directly.
+    
+    Arguments:
+        function {function} -- The function.
+        args -- Its arguments.
+    
+    Returns:
+        {obj} -- The function's return value.
+    """
+
+    # Green threads are children of the hub's greenlet, native threads run on their own root
+    if getcurrent().parent is None:
+        return function(*args)
+    return tpool.execute(function, *args)
+
+
+def generate_keys(ballot_count, signing_file):
+    """Generates the key pairs of a new election on the key generator. The genesis block needs
+    every verifying key, only the signing keys leave memory.
+    
+    Arguments:
+        ballot_count {int} -- Number of key pairs.
+        signing_file {file} -- Binary file that the signing keys are written to, one per line.
+    
+    Returns:
+        {list} -- Verifying key hex strings.
+    """
+
+    verifying_keys = []
+    for signing_keys, verifying_chunk in key_generator.generate(ballot_count):
+        verifying_keys.extend(verifying_chunk)
+        signing_file.write("".join(key + "\n" for key in signing_keys).encode())
+    return verifying_keys
+
+
+def admit_ballots(ballots):
+    """Verifies received ballots, adds the valid ones to the unconfirmed pools and broadcasts
+    them. Duplicates and malformed ballots are dropped first, then the cheap checks run under the
+    pool lock of each ballot's election and the signatures are verified outside of it. The ids of
+    rejected ballots are forgotten, so that a forged copy does not keep the real ballot out.
+    
+    Arguments:
+        ballots {list} -- Ballot dictionaries containing a ballot and digital signature.
+    
+    Returns:
+        {list} -- The ballots that were added to the unconfirmed pools.
+    """
+
+    ballots = [
+        ballot for ballot in ballots if seen.add("ballot", ballot["ballot"]["id"])
+    ]
+    if not ballots:
+        return []
+
+    # Pair each ballot with its compact form, the dictionary is verified and broadcast
+    by_election = {}
+    for ballot in ballots:
+        election = ballot["ballot"]["election"]
+        if election not in blockchains.keys():
+            # Process the ballot again if it is received after its election
+            continue
+        try:
+            compact_ballot = compact.Ballot(ballot, blockchains[election])
+        except ValueError:
+            continue
+        by_election.setdefault(election, []).append((ballot, compact_ballot))
+
+    candidates = []
+    for election, pairs in by_election.items():
+        with election_locks[election].pool:
+            candidates.extend(pair for pair in pairs if ballot_admissible(pair[1]))
+
+    verified = []
+    if candidates:
+        verified = run_blocking(
+            ballot_verifier.verifyBatch, [ballot for ballot, _ in candidates]
+        )
+
+    admitted = []
+    for (ballot, compact_ballot), valid in zip(candidates, verified):
+        if not valid:
+            continue
+        election = compact_ballot.election.id
+        with election_locks[election].pool:
+            # Another request may have used the key while the signatures were verified
+            if ballot_admissible(compact_ballot) and add_unconfirmed_ballot(
+                election, compact_ballot
+            ):
+                admitted.append(ballot)
+
+    admitted_ids = {ballot["ballot"]["id"] for ballot in admitted}
+    for ballot in ballots:
+        if ballot["ballot"]["id"] not in admitted_ids:
+            seen.discard("ballot", ballot["ballot"]["id"])
+    for ballot in admitted:
+        log.info("%d received ballot %s" % (port, ballot["ballot"]["id"]))
+    if admitted:
+        broadcast_ballots(admitted)
+    return admitted
+
+
+def accept_blocks(election, records):
+    """Verifies received blocks of an election and adds the valid ones to its block tree. The
+    header and proof of work of every block are checked against its branch first, then the
+    signatures of the blocks that pass are verified in one batch outside of the election's locks,
+    and the signed blocks are added under a single hold of the locks. A block whose parent is
+    unknown waits in the orphan pool and is accepted after its parent.
+    
+    Arguments:
+        election {str} -- Election id.
+        records {list} -- BlockRecords of the received blocks, parents before children.
+    
+    Returns:
+        {list} -- Records of the blocks that were added to the tree, parents before children.
+    """
+
+    election_lock = election_locks[election]
+    tree = block_trees[election]
+    # A block that fails costs no more than hashing it, only the blocks that pass are verified
+    # ballot by ballot. A block may extend one that is earlier in the list.
+    checked = []
+    branches = {}
+    orphan_hashes = set()
+    with election_lock.chain.read():
+        for record in records:
+            block = record.block
+            if tree.contains(record.hash):
+                continue
+            previous_hash = block["header"]["previous_hash"]
+            if previous_hash in tree.nodes:
+                parent, descendants = tree.nodes[previous_hash], []
+            elif previous_hash in branches:
+                parent, descendants = branches[previous_hash]
+            else:
+                # The parameters of an orphan are unknown, it may be at most a retarget easier
+                # than the next block of the chain
+                if block["header"].get("election") == election and (
+                    blockchain.verifyOrphan(block, orphan_difficulty(election))
+                ):
+                    orphan_hashes.add(record.hash)
+                    checked.append(record)
+                continue
+            if verify_block(
+                election, block, branch_params(election, parent, descendants)
+            ):
+                branches[record.hash] = (
+                    parent,
+                    descendants + [blockchain.headerFields(block)],
+                )
+                checked.append(record)
+    if not checked:
+        return []
+    signed = verify_signatures(election, checked)
+
+    accepted = []
+    orphans = []
+    switched = False
+    with election_lock.chain.write(), election_lock.pool:
+        for record, valid in zip(checked, signed):
+            if not valid or tree.contains(record.hash):
+                continue
+            parent = tree.nodes.get(record.block["header"]["previous_hash"])
+            if parent is None:
+                # Unless its parent in the list was rejected
+                if record.hash in orphan_hashes:
+                    tree.addOrphan(record)
+                continue
+            if record.hash in orphan_hashes and not verify_block(
+                election, record.block, branch_params(election, parent)
+            ):
+                # The parent was added while the signatures were verified
+                continue
+            switched = add_block(election, record) or switched
+            if record.hash in tree.nodes:
+                accepted.append(record)
+                orphans.extend(tree.popOrphans(record.hash))
+
+    if switched and engine:
+        engine.abort(election)
+    if orphans:
+        accepted.extend(accept_blocks(election, orphans))
+    return accepted
+
+
+def verify_signatures(election, records):
+    """Verifies the signature of every ballot in a list of blocks in one batch.
+    
+    Arguments:
+        election {str} -- Election id.
+        records {list} -- BlockRecords of received blocks.
+    
+    Returns:
+        {list} -- True for each block whose ballots all belong to the election and are signed.
+    """
+
+    ballots = [ballot for record in records for ballot in record.block["ballots"]]
+    verified = run_blocking(ballot_verifier.verifyBatch, ballots) if ballots else []
+    signed = []
+    offset = 0
+    for record in records:
+        ballots = record.block["ballots"]
+        signed.append(
+            all(verified[offset : offset + len(ballots)])
+            and all(ballot["ballot"]["election"] == election for ballot in ballots)
+        )
+        offset += len(ballots)
+    return signed
+
+
+def orphan_difficulty(election):
+    """The caller must hold the election's chain lock.
+    
+    Arguments:
+        election {str} -- Election id.
+    
+    Returns:
+        {int} -- The least difficulty of a block of the election whose parent is unknown.
+    """
+
+    params = blockchain.nextBlockParams(
+        blockchains[election], blockchains[election].chain
+    )
+    return max(1, params["difficulty"] - blockchain.ORPHAN_DIFFICULTY_SLACK)
+
+
+def verify_block(election, block, params):
+    """Verifies the header, parameters, ballots root and proof of work of a block.
+    
+    Arguments:
+        election {str} -- Election id.
+        block {dict} -- A received block.
+        params {dict} -- The parameters in force at the block's height from branch_params.
+    
+    Returns:
+        {bool} -- True if the block is valid on top of its parent.
+    """
+
+    return block["header"].get("election") == election and blockchain.verifyBlock(
+        block, params
+    )
+
+
+def branch_params(election, parent, descendants=()):
+    """Computes the parameters in force for a block that extends any branch of an election. The
+    caller must hold the election's chain lock.
+    
+    Arguments:
+        election {str} -- Election id.
+        parent {TreeNode} -- Node of the block that is extended.
+        descendants {list} -- headerFields of checked blocks that extend the parent and are not in
+        the tree yet, in order. (default: {()})
+    
+    Returns:
+        {dict} -- The parameters from nextBlockParams.
+    """
+
+    chain = blockchains[election].chain
+    if chain[-1] is parent.record.block:
+        return blockchain.nextBlockParams(
+            blockchains[election], chain + list(descendants) if descendants else chain
+        )
+
+    # Splice the side branch onto the part of the chain it shares
+    branch = []
+    node = parent
+    while not on_chain(election, node):
+        branch.append(node.record.block)
+        node = block_trees[election].nodes[node.parent]
+    return blockchain.nextBlockParams(
+        blockchains[election],
+        chain[: node.height + 1] + branch[::-1] + list(descendants),
+    )
+
+
+def on_chain(election, node):
+    """
+    Arguments:
+        election {str} -- Election id.
+        node {TreeNode} -- Node of a block in the election's block tree.
+    
+    Returns:
+        {bool} -- True if the block is part of the election's chain.
+    """
+
+    chain = blockchains[election].chain
+    return node.height < len(chain) and chain[node.height] is node.record.block
+
+
+def add_block(election, record, save=True):
+    """Adds a block whose parent is in the tree of an election to the tree and stores it. If its
+    branch now has more work than the chain the election switches to it. The caller must hold
+    the election's chain lock for writing and its pool lock.
+    
+    Arguments:
+        election {str} -- Election id.
+        record {BlockRecord} -- Record of the received block, it must not be changed afterwards.
+        save {bool} -- Whether or not to append the block to the chain store.
+    
+    Returns:
+        {bool} -- True if the chain changed. A malformed block is not added, and a block that turns
+        out to reuse a key of its branch is removed from the tree again.
+    """
+
+    try:
+        record = blockchain.compactRecord(record, blockchains[election])
+    except ValueError:
+        return False
+    tree = block_trees[election]
+    tip = tree.nodes[tip_hash(election)]
+    node = tree.insert(record)
+    if node.work > tip.work:
+        switch_chain(election, record.hash)
+    if record.hash not in tree.nodes:
+        return False
+    if save and chain_store:
+        chain_store.append(election, [record])
+    return node.work > tip.work
+
+
+def switch_chain(election, block_hash):
+    """Makes the branch that ends in a block the chain of an election. Blocks of the old chain
+    past the fork are removed and their ballots go back to the unconfirmed pool unless the new
+    branch confirms their keys. If a block of the new branch reuses a key it is removed from the
+    tree with its descendants and the election switches to the best branch that is left. The
+    caller must hold the election's chain lock for writing and its pool lock.
+    
+    Arguments:
+        election {str} -- Election id.
+        block_hash {str} -- Hash of the tip of the branch.
+    """
+
+    tree = block_trees[election]
+    chain = blockchains[election].chain
+    branch = []
+    node = tree.nodes[block_hash]
+    while not on_chain(election, node):
+        branch.append(node)
+        node = tree.nodes[node.parent]
+
+    abandoned = [
+        disconnect_block(election) for _ in range(len(chain) - 1 - node.height)
+    ]
+    for node in reversed(branch):
+        if not connect_block(election, node.record):
+            tree.remove(node.record.hash)
+            switch_chain(election, tree.best())
+            break
+
+    for block in reversed(abandoned):
+        for ballot in block.ballots:
+            if not blockchain.verifyingKeyAlreadyUsed(
+                ballot.verifying_key, spent_keys[election]
+            ):
+                add_unconfirmed_ballot(election, ballot, limit=False)
+    if abandoned:
+        tallies[election] = tally.createTally(blockchains[election], util.tally_backend)
+
+
+def connect_block(election, record):
+    """Adds a block to the end of the chain of an election and removes every unconfirmed ballot
+    that used one of the block's keys from the pool. The caller must hold the election's chain
+    lock for writing and its pool lock.
+    
+    Arguments:
+        election {str} -- Election id.
+        record {BlockRecord} -- Record of a block in the election's block tree whose parent is the
+        last block in the chain.
+    
+    Returns:
+        {bool} -- False if the block was not added because its id is already in the chain or one
+        of its keys is ineligible or already confirmed.
+    """
+
+    block = record.block
+    if block.id in block_heights[election]:
+        return False
+    if not blockchain.verifyBlockKeys(
+        block, eligible_keys[election], spent_keys[election]
+    ):
+        return False
+
+    block_records[block.id] = record
+    blockchain.addBlock(blockchains[election], block)
+    removed = mempool.remove(
+        election, blockchain.indexBlock(spent_keys[election], block)
+    )
+    if block_scheduler:
+        block_scheduler.remove(election, removed)
+    height = len(blockchains[election].chain) - 1
+    block_heights[election][block.id] = height
+    for ballot in block.ballots:
+        ballot_heights[election][ballot.id] = height
+    tallies[election].addBlock(block)
+    event_bus.blockAdded(election, block, height, record.hash)
+    return True
+
+
+def disconnect_block(election):
+    """Removes the last block from the chain of an election. The block stays in the election's
+    block tree. The caller must hold the election's chain lock for writing and its pool lock.
+    
+    Arguments:
+        election {str} -- Election id.
+    
+    Returns:
+        {Block} -- The removed block, the tally no longer matches the chain until it is rebuilt.
+    """
+
+    block = blockchains[election].chain.pop()
+    del block_heights[election][block.id]
+    del block_records[block.id]
+    for ballot in block.ballots:
+        ballot_heights[election].pop(ballot.id, None)
+    blockchain.unindexBlock(spent_keys[election], block)
+    return block
+
+
+def index_election(election, genesis):
+    """Starts the chain of an election with its genesis block and builds the spent key index,
+    ballot and block heights, block records, block tree and tally from the chain and unconfirmed
+    pool, and gives the scheduler its block sizes. Called before the election is published in
+    blockchains.
+    
+    Arguments:
+        election {Election} -- An election whose chain is empty.
+        genesis {BlockRecord} -- Record of the election's genesis block from compactRecord.
+    """
+
+    blockchain.addBlock(election, genesis.block)
+    eligible_keys[election.id] = election.verifying_keys
+    spent_keys[election.id] = blockchain.buildSpentKeyIndex(
+        election, mempool.ballots(election.id)
+    )
+    ballot_heights[election.id] = blockchain.buildBallotHeights(election)
+    block_heights[election.id] = blockchain.buildBlockHeights(election)
+    block_records[genesis.block.id] = genesis
+    block_trees[election.id] = forks.BlockTree(genesis)
+    tallies[election.id] = tally.createTally(election, util.tally_backend)
+    if block_scheduler:
+        params = blockchain.electionParams(election)
+        block_scheduler.configure(
+            election.id, params["min_block_size"], params["max_block_size"]
+        )
+
+
+def election_lock(election):
+    """
+    Arguments:
+        election {str} -- Election id.
+    
+    Returns:
+        {ElectionLock} -- The locks of the election, aborts if the election is unknown.
+    """
+
+    if election not in blockchains.keys():
+        abort(500)
+    return election_locks[election]
+
+
+def summarize_election(election):
+    """Describes an election without its blocks. The caller must hold the election's chain lock.
+    
+    Arguments:
+        election {str} -- Election id.
+    
+    Returns:
+        {dict} -- The election's id, label, candidates, creation time, height, tip block id, work
+        of the chain and number of unconfirmed ballots.
+    """
+
+    chain = blockchains[election].chain
+    return {
+        "id": election,
+        "label": blockchains[election].label,
+        "candidates": list(blockchains[election].candidates),
+        "timestamp": blockchains[election].timestamp,
+        "height": len(chain) - 1,
+        "tip": compact.formatId(chain[-1].id),
+        "work": block_trees[election].nodes[tip_hash(election)].work,
+        "unconfirmed": mempool.size(election),
+    }
+
+
+def tip_hash(election):
+    """The hash of the last block commits to the whole chain, so it is used as the ETag of
+    responses built from the chain. The caller must hold the election's chain lock.
+    
+    Arguments:
+        election {str} -- Election id.
+    
+    Returns:
+        {str} -- Hash of the last block in the election's chain.
+    """
+
+    return block_records[blockchains[election].chain[-1].id].hash
+
+
+def encode_blocks(blocks):
+    """
+    Arguments:
+        blocks {list} -- Blocks from a chain.
+    
+    Returns:
+        {bytes} -- JSON array of the blocks.
+    """
+
+    return b"[" + b",".join(block_records[block.id].data for block in blocks) + b"]"
+
+
+def encode_blockchain(election, chain):
+    """
+    Arguments:
+        election {Election} -- An election.
+        chain {list} -- Copy of the election's chain taken under its chain lock.
+    
+    Returns:
+        {bytes} -- JSON object of the blockchain.
+    """
+
+    fields = {"id": election.id, "label": election.label}
+    data = json.dumps(fields, sort_keys=True, separators=(",", ":")).encode()
+    return data[:-1] + b',"chain":' + encode_blocks(chain) + b"}"
+
+
+def stream_election_keys(info, verifying_keys, signing_file, key_format):
+    """Encodes the response of /new_election a chunk of key pairs at a time and closes the
+    signing key file once it has been read.
+    
+    Arguments:
+        info {dict} -- The election information.
+        verifying_keys {list} -- Verifying key hex strings of the election.
+        signing_file {file} -- Binary file of the matching signing key hex strings, one per line.
+        key_format {str} -- "json" or "ndjson".
+    
+    Yields:
+        {bytes} -- The next part of the response body.
+    """
+
+    try:
+        if key_format == "ndjson":
+            yield json.dumps(info).encode() + b"\n"
+        else:
+            yield json.dumps(info)[:-1].encode() + b',"verifying_keys":['
+            for start in range(0, len(verifying_keys), keygen.CHUNK_SIZE):
+                chunk = verifying_keys[start : start + keygen.CHUNK_SIZE]
+                yield (b"," if start else b"") + json.dumps(chunk)[1:-1].encode()
+            yield b'],"signing_keys":['
+
+        start = 0
+        while True:
+            lines = list(islice(signing_file, keygen.CHUNK_SIZE))
+            if not lines:
+                break
+            signing_keys = [line.decode().rstrip("\n") for line in lines]
+            if key_format == "ndjson":
+                yield "".join(
+                    json.dumps({"signing_key": sk, "verifying_key": vk}) + "\n"
+                    for sk, vk in zip(
+                        signing_keys, verifying_keys[start : start + len(lines)]
+                    )
+                ).encode()
+            else:
+                yield (b"," if start else b"") + json.dumps(signing_keys)[1:-1].encode()
+            start += len(lines)
+
+        if key_format == "json":
+            yield b"]}"
+    finally:
+        signing_file.close()
+
+
+def load_store():
+    """Loads every blockchain saved in the store, follows the branch with the most work and
+    rebuilds the indexes.
+    """
+
+    with lock:
+        for blocks in chain_store.load():
+            try:
+                add_election(blockchain.createBlockchain(blocks[0]), save=False)
+            except ValueError as e:
+                log.warning("%d skipped stored election: %s" % (port, e))
+                continue
+            election = blocks[0]["header"]["id"]
+            # Blocks were stored once their parent was in the tree, so parents come first
+            tree = block_trees[election]
+            for block in blocks[1:]:
+                record = blockchain.createBlockRecord(block)
+                if (
+                    block["header"]["previous_hash"] in tree.nodes
+                    and record.hash not in tree.nodes
+                ):
+                    add_block(election, record, save=False)
+
+
+# Metrics
+
+
+def install_metrics():
+    """Enables metrics and puts timers around the node lock, the election pool locks, the gossip
+    queue and the functions on the ballot, block and broadcast paths. Called once on
+    startup before the node's threads start, a node that is not given --metrics installs none of
+    them.
+    """
+
+    global lock, broadcast_election, broadcast_ballots, broadcast_batch, broadcast_block
+
+    metrics.enabled = True
+    for name in ("verifyBallot", "verifyingKeyAlreadyUsed", "hashBlock", "mineBlock"):
+        metrics.instrument(blockchain, name, function_seconds)
+    metrics.instrument(ballot_verifier, "verifyBatch", function_seconds)
+    metrics.instrument(ballot_signer, "verifyingKeys", function_seconds)
+    metrics.instrument(ballot_signer, "signBatch", function_seconds)
+    if engine:
+        metrics.instrument(engine, "mine", function_seconds)
+    broadcast_election = metrics.timed(
+        broadcast_election, function_seconds, ("broadcast_election",)
+    )
+    broadcast_ballots = metrics.timed(
+        broadcast_ballots, function_seconds, ("broadcast_ballots",)
+    )
+    broadcast_batch = metrics.timed(
+        broadcast_batch, function_seconds, ("broadcast_batch",)
+    )
+    broadcast_block = metrics.timed(
+        broadcast_block, function_seconds, ("broadcast_block",)
+    )
+
+    lock = util.lock = metrics.TimedLock(
+        lock, lock_wait_seconds, lock_hold_seconds, ("node",)
+    )
+    for election_lock in election_locks.values():
+        time_pool_lock(election_lock)
+
+    send = dispatcher.send
+
+    def timedSend(peer, path, body, queued_at, attempts=0):
+        gossip_queue_seconds.observe(time.time() - queued_at)
+        return send(peer, path, body, queued_at, attempts)
+
+    dispatcher.send = timedSend
+
+
+@app.before_request
+def start_request_timer():
+    """Notes when a request started, if metrics are enabled.
+    """
+
+    if metrics.enabled:
+        g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    """Observes how long a request took and counts it by endpoint and status, if metrics are
+    enabled.
+    
+    Arguments:
+        response {Flask response} -- The response to the request.
+    
+    Returns:
+        {Flask response} -- The same response.
+    """
+
+    if metrics.enabled and "request_start" in g:
+        endpoint = request.endpoint or "unknown"
+        request_seconds.observe(time.perf_counter() - g.request_start, (endpoint,))
+        requests_total.inc(1, (endpoint, response.status_code))
+    return response
+
+
+def time_pool_lock(election_lock):
+    """Puts a timer around the pool lock of an election.
+    
+    Arguments:
+        election_lock {ElectionLock} -- The locks of the election.
+    """
+
+    election_lock.pool = metrics.TimedLock(
+        election_lock.pool, lock_wait_seconds, lock_hold_seconds, ("pool",)
+    )
+
+
+# Sync With Other Nodes
+
+
+def local_tip(election):
+    """
+    Arguments:
+        election {str} -- Election id.
+    
+    Returns:
+        {(int, int)} -- The height and work of the election's chain, None if it is unknown.
+    """
+
+    if election not in blockchains.keys():
+        return None
+    with election_locks[election].chain.read():
+        chain = blockchains[election].chain
+        return len(chain) - 1, block_trees[election].nodes[tip_hash(election)].work
+
+
+def has_block(election, block_hash):
+    """
+    Arguments:
+        election {str} -- Election id.
+        block_hash {str} -- Hash of a block.
+    
+    Returns:
+        {bool} -- True if the block is in the election's block tree.
+    """
+
+    with election_locks[election].chain.read():
+        return block_hash in block_trees[election].nodes
+
+
+def add_synced_election(election):
+    """Adds an election downloaded from a peer unless it was received in the meantime.
+    
+    Arguments:
+        election {dict} -- Blockchain dictionary holding the election's genesis block.
+    
+    Raises:
+        ValueError -- If the genesis block is malformed.
+    """
+
+    with lock:
+        if election["id"] not in blockchains.keys():
+            add_election(election)
+    seen.add("election", election["id"])
+    log.info("%d synced election %s" % (port, election["id"]))
 
 
 # Discover Other Nodes
 
 
 def discover():
-    """Iterates through currently known nodes in the network and requests for more nodes from them.
+    """Registers with every known node and adds the nodes it knows of, then catches up with the
+    elections and blocks of the network. Afterwards the node follows gossip and only checks the
+    tips of its peers every SYNC_INTERVAL seconds in case it missed a block, evicting stale
+    ballots from the unconfirmed pool at the same time.
     """
 
     time.sleep(5)
     for n in nodes:
-        r = requests.get(build_url(n, "/get_nodes"), headers={"node-port": str(port)})
-        for n2 in r.json():
+        try:
+            r = requests.get(
+                build_url(n, "/get_nodes"),
+                headers={"node-port": str(port)},
+                timeout=sync.SYNC_TIMEOUT,
+            )
+            known = r.json()
+        except (requests.RequestException, ValueError):
+            log.warning("%d failed to discover nodes from %d" % (port, n))
+            continue
+        for n2 in known:
             n2 = int(n2)
-            # if n2 not in nodes and n2 != conf("port"):
-            # nodes.append(n2)
+            if n2 not in nodes and n2 != port:
+                nodes.append(n2)
+
+    while True:
+        start = time.time()
+        try:
+            added = chain_sync.run()
+            if added:
+                log.info(
+                    "%d synced %d blocks in %.2fs" % (port, added, time.time() - start)
+                )
+        except Exception:
+            log.exception("%d failed to sync" % port)
+        expire_ballots()
+        time.sleep(sync.SYNC_INTERVAL)
 
 
 def mine():
     """
-    Infinite loop to continuously check for unconfirmed ballots to mine blocks from and
-    broadcast to the network.
+    Infinite loop that mines a block for the election chosen by the scheduler whenever one is
+    ready and broadcasts it to the network.
     """
-    global mining
 
     while True:
-        election = None
-        mine_election = None
-        mine_ballots = None
-        mine_prev_block = None
-        with lock:
-            keys = list(blockchains.keys())
-            if len(keys) > 0:
-                election = choice(keys)
-            if (
-                election
-                and len(unconfirmed_ballots[election]) >= blockchain.BLOCK_BALLOT_COUNT
-            ):
-                mine_election = election
-                mine_ballots = deepcopy(
-                    list(unconfirmed_ballots[election].values())[
-                        : blockchain.BLOCK_BALLOT_COUNT
-                    ]
+        mine_election, size = block_scheduler.next()
+        try:
+            # Ballots and block records are never changed once added, so references are enough
+            mine_locks = election_locks[mine_election]
+            with mine_locks.chain.read(), mine_locks.pool:
+                mine_ballots = mempool.take(mine_election, size)
+                mine_prev_block = block_records[blockchains[mine_election].chain[-1].id]
+                mine_params = blockchain.nextBlockParams(
+                    blockchains[mine_election], blockchains[mine_election].chain
                 )
-                mine_prev_block = deepcopy(blockchains[election]["chain"][-1])
+            if not mine_ballots:
+                continue
 
-        if mine_election and mine_ballots and mine_prev_block:
             log.info(
-                "%d started mining block %d"
-                % (port, len(blockchains[mine_election]["chain"]))
+                "%d started mining block %d with %d ballots"
+                % (port, len(blockchains[mine_election].chain), len(mine_ballots))
+            )
+            util.mining = len(blockchains[mine_election].chain)
+            block = engine.mine(
+                mine_election,
+                [ballot.toDict() for ballot in mine_ballots],
+                mine_prev_block,
+                mine_params["difficulty"],
             )
-            mining = len(blockchains[election]["chain"])
-            socketio.emit("info", build_node_info())
-            block = blockchain.mineBlock(mine_election, mine_ballots, mine_prev_block)
+            util.hashrate = engine.hashrate
+            util.mining = None
+            if not block:
+                log.info("%d stopped mining block, chain was extended" % port)
+                continue
             log.info(
                 "%d finished mining block %d"
-                % (port, len(blockchains[mine_election]["chain"]))
+                % (port, len(blockchains[mine_election].chain))
             )
-            with lock:
-                for ballot in mine_ballots:
-                    unconfirmed_ballots[mine_election].pop(ballot["ballot"]["id"])
-                blockchain.addBlock(blockchains[election], block)
-            threading.Thread(target=broadcast_block, args=[block]).start()
-        else:
-            mining = None
-            socketio.emit("info", build_node_info())
-            time.sleep(1)
+            record = blockchain.createBlockRecord(block)
+            with mine_locks.chain.write(), mine_locks.pool:
+                # If another node extended the chain while this block was mined it starts a branch
+                add_block(mine_election, record)
+                if record.hash not in block_trees[mine_election].nodes:
+                    continue
+            seen.add("block", block["header"]["id"])
+            broadcast_block(record)
+        except Exception:
+            # Stop mining the election rather than the miner, the others still need blocks
+            log.exception("%d stopped mining election %s" % (port, mine_election))
+            block_scheduler.forget(mine_election)
+            util.mining = None
 
 
 def broadcast_election(election):
@@ -326,31 +1681,38 @@ def broadcast_election(election):
         election {dict} -- Election dictionary from createBlockchain.
     """
 
-    for n in nodes:
-        r = requests.post(
-            build_url(n, "/receive_election"), json={"election": election}
-        )
+    dispatcher.broadcast("/receive_election", {"election": election}, nodes)
 
 
-def broadcast_ballot(ballot):
-    """Broadcast the ballot to the network.
+def broadcast_ballots(ballots):
+    """Broadcast the ballots to the network in batches.
     
     Arguments:
-        ballot {dict} -- Ballot dictionary containing a ballot and digital signature.
+        ballots {list} -- Ballot dictionaries containing a ballot and digital signature.
     """
-    for n in nodes:
-        r = requests.post(build_url(n, "/receive_ballot"), json={"ballot": ballot})
 
+    batcher.add(ballots)
+
+
+def broadcast_batch(ballots):
+    """Broadcast ballots that were cast together to the network in a single message, without
+    waiting for the batcher.
+    
+    Arguments:
+        ballots {list} -- Ballot dictionaries containing a ballot and digital signature.
+    """
+
+    dispatcher.broadcast("/receive_batch", {"ballots": ballots}, nodes)
 
-def broadcast_block(block):
+
+def broadcast_block(record):
     """Broadcast the block to the network.
     
     Arguments:
-        block {dict} -- Block dictionary from createBlock.
+        record {BlockRecord} -- Record of a block in the election's block tree.
     """
 
-    for n in nodes:
-        r = requests.post(build_url(n, "/receive_block"), json={"block": block})
+    dispatcher.broadcast("/receive_block", b'{"block":' + record.data + b"}", nodes)
 
 
 if __name__ == "__main__":
@@ -367,13 +1729,34 @@ if __name__ == "__main__":
     else:
         log.info("Node started on %d" % port)
 
+    util.tally_backend = args.tally_backend
+    if args.mine:
+        block_scheduler = scheduler.MiningScheduler(blockchain.BLOCK_BALLOT_COUNT)
+    if args.data_dir:
+        chain_store = store.ChainStore(args.data_dir)
+        load_store()
+        log.info("%d loaded %d elections from disk" % (port, len(blockchains)))
+    ballot_verifier = verifier.BallotVerifier(args.verify_workers)
+    key_generator = keygen.KeyGenerator(args.keygen_workers)
+    ballot_signer = signer.BallotSigner(args.sign_workers)
+    event_bus = events.EventBus(socketio, build_node_info, args.event_tick)
+    chain_sync = sync.ChainSync(
+        dispatcher, nodes, local_tip, has_block, add_synced_election, accept_blocks
+    )
+
+    if args.mine:
+        util.miner = True
+        engine = MiningEngine(args.workers)
+    if args.metrics:
+        install_metrics()
+
     discover_thread = threading.Thread(target=discover)
     discover_thread.start()
     if args.mine:
-        util.miner = True
         mine_thread = threading.Thread(target=mine)
         mine_thread.start()
 
+    socketio.start_background_task(event_bus.run)
     socketio.run(app, port=port)
     mine_thread.join()
     discover_thread.join()
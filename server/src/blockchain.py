@@ -7,8 +7,12 @@
 # blockchain.py - provide functions to create/verify/update blockchain entities
 
 import time
+import math
+from functools import lru_cache
 from hashlib import md5
 from json import dumps
+from collections import namedtuple
+from compact import Block
 from ecdsa import SigningKey, VerifyingKey, BadSignatureError
 from util import getUUID, getLogger, port
 
@@ -17,9 +21,54 @@ log = getLogger("blockchain")
 """ The number of ballots that are stored in a single block. """
 BLOCK_BALLOT_COUNT = 4
 
-""" The number of leading zeroes required at the end of a block's hash value. """
+"""
+The number of leading zero hex digits required at the start of the hash of a block that does not
+record its difficulty.
+"""
 MINING_DIFFICULTY = 2
 
+"""
+Parameters recorded in the genesis block of new elections.
+
+difficulty -- Leading zero bits required in the hash of the first blocks.
+block_interval -- Seconds between blocks that retargeting aims for.
+retarget_blocks -- Number of blocks between difficulty retargets, 0 turns retargeting off.
+min_block_size -- Number of ballots that make a full block.
+max_block_size -- The largest number of ballots in a block.
+"""
+DEFAULT_PARAMS = {
+    "difficulty": MINING_DIFFICULTY * 4,
+    "block_interval": 2,
+    "retarget_blocks": 8,
+    "min_block_size": BLOCK_BALLOT_COUNT,
+    "max_block_size": 256,
+}
+
+""" Parameters of elections whose genesis block does not record any, they never retarget. """
+LEGACY_PARAMS = dict(DEFAULT_PARAMS, retarget_blocks=0)
+
+""" Number of bits in a block hash, the most leading zero bits a difficulty can require. """
+HASH_BITS = 128
+
+""" The largest factor that a retarget changes the expected work of a block by. """
+MAX_RETARGET_FACTOR = 4
+
+""" Bits that the difficulty of an orphan may be below the difficulty in force at the tip, the
+most that one retarget lowers it by. """
+ORPHAN_DIFFICULTY_SLACK = round(math.log2(MAX_RETARGET_FACTOR))
+
+""" Seconds that a block's timestamp may be ahead of the local clock. """
+MAX_CLOCK_DRIFT = 60
+
+"""
+The version of blocks created by createBlock. Version 1 blocks hash the whole block. Version 2
+blocks commit to their ballots with a Merkle root in the header and only hash the header.
+"""
+BLOCK_VERSION = 2
+
+""" The number of parsed verifying keys kept by loadVerifyingKey. """
+VERIFYING_KEY_CACHE_SIZE = 65536
+
 
 def generateKeys(ballot_count):
     """Generates key pairs to be used for signing/verifying transactions.
@@ -63,11 +112,215 @@ def hashBlock(block):
     # Using a weak hashing algorithm for performance reasons during testing
     m = md5()
 
-    # Convert block to JSON string and compute hash of the JSON string
-    m.update(dumps(block, sort_keys=True).encode())
+    if block["header"].get("version", 1) >= 2:
+        # The header commits to the ballots, so only the header and nonce are hashed
+        m.update(headerPrefix(block))
+        m.update(b"%d" % block["header"]["nonce"])
+    else:
+        # Convert block to JSON string and compute hash of the JSON string
+        m.update(dumps(block, sort_keys=True).encode())
     return m.hexdigest()
 
 
+def headerPrefix(block):
+    """Serializes the part of a version 2 block header that does not change while mining.
+    
+    Arguments:
+        block {dict} -- A version 2 block.
+    
+    Returns:
+        {bytes} -- JSON serialization of the header without the nonce.
+    """
+
+    header = {key: value for key, value in block["header"].items() if key != "nonce"}
+    return dumps(header, sort_keys=True).encode()
+
+
+def hashMerkleLeaf(ballot):
+    """Computes the Merkle tree leaf hash of a ballot.
+    
+    Arguments:
+        ballot {dict} -- Ballot dictionary containing a ballot and digital signature.
+    
+    Returns:
+        {bytes} -- The leaf hash.
+    """
+
+    return md5(b"\x00" + dumps(ballot, sort_keys=True).encode()).digest()
+
+
+def hashMerkleNode(left, right):
+    """Computes the hash of an inner Merkle tree node.
+    
+    Arguments:
+        left {bytes} -- Hash of the left child.
+        right {bytes} -- Hash of the right child.
+    
+    Returns:
+        {bytes} -- The node hash.
+    """
+
+    return md5(b"\x01" + left + right).digest()
+
+
+def merkleLevels(ballots):
+    """Computes every level of the Merkle tree of a list of ballots.
+
+    Leaves and inner nodes are hashed with different prefixes so that an inner node can not be
+    passed off as a ballot. A node without a sibling is carried up to the next level unchanged.
+    
+    Arguments:
+        ballots {list} -- List of ballot dictionaries containing a ballot and digital signature.
+    
+    Returns:
+        {list} -- Lists of node hashes from the leaves up to the root.
+    """
+
+    levels = [[hashMerkleLeaf(ballot) for ballot in ballots]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        next_level = [
+            hashMerkleNode(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        levels.append(next_level)
+    return levels
+
+
+def merkleRoot(ballots):
+    """Computes the Merkle root of a list of ballots.
+    
+    Arguments:
+        ballots {list} -- List of ballot dictionaries containing a ballot and digital signature.
+    
+    Returns:
+        {str} -- The Merkle root as a hex string.
+    """
+
+    if not ballots:
+        return md5(b"").hexdigest()
+    return merkleLevels(ballots)[-1][0].hex()
+
+
+def merkleProof(ballots, index):
+    """Creates an inclusion proof for one of the ballots of a block.
+    
+    Arguments:
+        ballots {list} -- The ballots of the block.
+        index {int} -- Index of the ballot in ballots.
+    
+    Returns:
+        {list} -- The sibling hashes on the path from the ballot to the root. Each step is a
+        dictionary with the sibling's "position" ("left" or "right") and its "hash" as a hex string.
+    """
+
+    proof = []
+    for level in merkleLevels(ballots)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(
+                {
+                    "position": "left" if sibling < index else "right",
+                    "hash": level[sibling].hex(),
+                }
+            )
+        index //= 2
+    return proof
+
+
+def verifyMerkleProof(ballot, proof, root):
+    """Verifies that a ballot is included in a block using an inclusion proof.
+    
+    Arguments:
+        ballot {dict} -- Ballot dictionary containing a ballot and digital signature.
+        proof {list} -- Inclusion proof created by merkleProof.
+        root {str} -- Hex string Merkle root from the block header.
+    
+    Returns:
+        {bool} -- True if the proof connects the ballot to the root.
+    """
+
+    node = hashMerkleLeaf(ballot)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        if step["position"] == "left":
+            node = hashMerkleNode(sibling, node)
+        else:
+            node = hashMerkleNode(node, sibling)
+    return node.hex() == root
+
+
+def searchNonceRange(block, start, stop):
+    """Searches a range of nonces for one that gives the block a hash that conforms to the
+    difficulty requirement. For version 2 blocks the fixed part of the header is hashed once and
+    each nonce only updates a copy of that hash state.
+    
+    Arguments:
+        block {dict} -- The block to be mined.
+        start {int} -- The first nonce to try.
+        stop {int} -- The nonce after the last nonce to try.
+    
+    Returns:
+        {int} -- The first valid nonce in the range, or None if there is none.
+    """
+
+    # A hash has the required leading zero bits when it is below the limit
+    limit = 1 << (128 - blockDifficulty(block))
+    header = block["header"]
+    if header.get("version", 1) >= 2:
+        prefix = md5(headerPrefix(block))
+        for nonce in range(start, stop):
+            m = prefix.copy()
+            m.update(b"%d" % nonce)
+            if int.from_bytes(m.digest(), "big") < limit:
+                return nonce
+    else:
+        for nonce in range(start, stop):
+            header["nonce"] = nonce
+            if int(hashBlock(block), 16) < limit:
+                return nonce
+    return None
+
+
+def blockDifficulty(block):
+    """
+    Arguments:
+        block {dict} -- A block.
+    
+    Returns:
+        {int} -- The number of leading zero bits required in the block's hash.
+    """
+
+    return block["header"].get("difficulty", MINING_DIFFICULTY * 4)
+
+
+def blockWork(block):
+    """
+    Arguments:
+        block {Block} -- A block in a chain.
+    
+    Returns:
+        {int} -- The expected number of hashes needed to mine the block.
+    """
+
+    if block.difficulty is None:
+        return 1 << (MINING_DIFFICULTY * 4)
+    return 1 << block.difficulty
+
+
+def verifyProofOfWork(block):
+    """
+    Arguments:
+        block {dict} -- A block.
+    
+    Returns:
+        {bool} -- True if the block's hash has the number of leading zero bits in its header.
+    """
+
+    return int(hashBlock(block), 16) < 1 << (HASH_BITS - blockDifficulty(block))
+
+
 def signBallot(ballot, signing_key_hex):
     """Creates digital signature of a ballot using the provided signing key.
     
@@ -85,6 +338,20 @@ def signBallot(ballot, signing_key_hex):
     return signing_key.sign(dumps(ballot, sort_keys=True).encode()).hex()
 
 
+@lru_cache(maxsize=VERIFYING_KEY_CACHE_SIZE)
+def loadVerifyingKey(verifying_key_hex):
+    """Parses a verifying key, recently parsed keys are cached.
+    
+    Arguments:
+        verifying_key_hex {str} -- Hex string verifying key.
+    
+    Returns:
+        {VerifyingKey} -- The parsed verifying key.
+    """
+
+    return VerifyingKey.from_string(bytes.fromhex(verifying_key_hex))
+
+
 def verifyBallot(ballot, signature_hex, verifying_key_hex=None, signing_key_hex=None):
     """Verifies that the digital signature of a ballot matches the provided verifying/signing key.
 
@@ -103,7 +370,7 @@ def verifyBallot(ballot, signature_hex, verifying_key_hex=None, signing_key_hex=
     vk = None
     # Get verifying key from hex of either the signing or verifying key
     if verifying_key_hex:
-        vk = VerifyingKey.from_string(bytes.fromhex(verifying_key_hex))
+        vk = loadVerifyingKey(verifying_key_hex)
     elif signing_key_hex:
         vk = SigningKey.from_string(bytes.fromhex(signing_key_hex)).get_verifying_key()
     if vk:
@@ -119,73 +386,421 @@ def verifyBallot(ballot, signature_hex, verifying_key_hex=None, signing_key_hex=
     return False
 
 
-def verifyBlock(block):
+def verifyBlock(block, params):
     """Verifies that a block is valid.
     
     Arguments:
         block {dict} -- The block to be verified.
+        params {dict} -- The parameters in force at the block's height from nextBlockParams.
     
     Returns:
         {bool} -- True if the block is a valid block.
     """
 
+    # The block must follow the parameters of its height.
+    if blockDifficulty(block) != params["difficulty"]:
+        return False
+    if len(block["ballots"]) > params["max_block_size"]:
+        return False
+    timestamp = block["header"].get("timestamp", 0)
+    if not params["min_timestamp"] <= timestamp <= time.time() + MAX_CLOCK_DRIFT:
+        return False
+
     # Make sure the blocks hash conforms to the required difficulty.
-    valid_pow = hashBlock(block)[:MINING_DIFFICULTY] == MINING_DIFFICULTY * "0"
-    return valid_pow
+    return verifyBallotsRoot(block) and verifyProofOfWork(block)
+
+
+def verifyOrphan(block, min_difficulty):
+    """Verifies what can be checked of a block whose parent is unknown, so that a copy of a valid
+    header with other ballots or a block with next to no work is not held in its place.
+
+    Arguments:
+        block {dict} -- The block to be verified.
+        min_difficulty {int} -- The least difficulty the block may have.
+
+    Returns:
+        {bool} -- True if the block commits to its ballots and meets a difficulty of at least
+        min_difficulty.
+    """
+
+    difficulty = blockDifficulty(block)
+    if not isinstance(difficulty, int) or not min_difficulty <= difficulty <= HASH_BITS:
+        return False
+    return verifyBallotsRoot(block) and verifyProofOfWork(block)
+
+
+def verifyBallotsRoot(block):
+    """
+    Arguments:
+        block {dict} -- A block.
+
+    Returns:
+        {bool} -- True if the block is version 1, whose hash covers its ballots, or its header
+        commits to its ballots.
+    """
+
+    if block["header"].get("version", 1) < 2:
+        return True
+    return block["header"].get("ballots_root") == merkleRoot(block["ballots"])
+
+
+def validParams(params):
+    """Checks that election parameters are complete and in range, so that every block of the
+    election needs some work and the miner always has a block size to schedule.
+
+    Arguments:
+        params {dict} -- Parameters from a genesis block header.
+
+    Returns:
+        {bool} -- True if params has exactly the keys of DEFAULT_PARAMS, each an integer, with a
+        difficulty of 1 to HASH_BITS, a block_interval of at least 1, a retarget_blocks of at least
+        0 and 1 <= min_block_size <= max_block_size.
+    """
+
+    if not isinstance(params, dict) or params.keys() != DEFAULT_PARAMS.keys():
+        return False
+    if not all(
+        isinstance(value, int) and not isinstance(value, bool)
+        for value in params.values()
+    ):
+        return False
+    return (
+        1 <= params["difficulty"] <= HASH_BITS
+        and params["block_interval"] >= 1
+        and params["retarget_blocks"] >= 0
+        and 1 <= params["min_block_size"] <= params["max_block_size"]
+    )
+
+
+def electionParams(election):
+    """
+    Arguments:
+        election {Election} -- An election.
+    
+    Returns:
+        {dict} -- The parameters recorded in the genesis block, or LEGACY_PARAMS.
+    """
+
+    return LEGACY_PARAMS if election.params is None else election.params
+
+
+def nextBlockParams(election, chain):
+    """Computes the parameters in force for the block that extends the chain. Every
+    retarget_blocks blocks the difficulty is raised or lowered by a whole number of bits, so that
+    the expected work of a block changes by the power of two that comes closest to the ratio of
+    the intended to the actual time the last retarget_blocks blocks took, at most
+    MAX_RETARGET_FACTOR either way.
+    
+    Arguments:
+        election {Election} -- An election.
+        chain {list} -- Blocks of the election's chain or of one of its branches, starting with the
+        genesis block.
+    
+    Returns:
+        {dict} -- The difficulty and largest number of ballots of the next block, and the earliest
+        timestamp it may have.
+    """
+
+    params = electionParams(election)
+    height = len(chain)
+    tip = chain[-1]
+    difficulty = params["difficulty"] if tip.difficulty is None else tip.difficulty
+
+    window = params["retarget_blocks"]
+    if window and height > window and (height - 1) % window == 0:
+        expected = window * params["block_interval"]
+        actual = tip.timestamp - chain[height - 1 - window].timestamp
+        actual = min(
+            max(actual, expected / MAX_RETARGET_FACTOR), expected * MAX_RETARGET_FACTOR
+        )
+        difficulty = max(1, min(64, difficulty + round(math.log2(expected / actual))))
+
+    return {
+        "difficulty": difficulty,
+        "max_block_size": params["max_block_size"],
+        "min_timestamp": tip.timestamp,
+    }
 
 
-def verifyingKeyInBlockchain(verifying_key, blockchain):
+def verifyingKeyInBlockchain(verifying_key, eligible_keys):
     """Returns whether or not a verifying key is included in the genesis block of the blockchain.
     
     Arguments:
-        verifying_key {VerifyingKey} -- The key to be checked.
-        blockchain {dict} -- A blockchain dictionary.
+        verifying_key {bytes} -- Raw bytes of the key to be checked.
+        eligible_keys {frozenset} -- The verifying_keys of the election.
     
     Returns:
         {bool} -- True if the verifying key is included in the blockchain genesis block header.
     """
 
-    return (
-        verifying_key.to_string().hex()
-        in blockchain["chain"][0]["header"]["verifying_keys"]
-    )
+    return verifying_key in eligible_keys
 
 
-def verifyingKeyAlreadyUsed(verifying_key, blockchain, unconfirmed_ballots):
+def verifyingKeyAlreadyUsed(verifying_key, spent_keys):
     """Returns whether or not a verifying key has already been used to cast a ballot.
 
     Arguments:
-        verifying_key {VerifyingKey} -- The verifying key in question.
-        blockchain {dict} -- A blockchain dictionary.
-        unconfirmed_ballots {dict} -- The pool of unconfirmed ballots associated with blockchain.
+        verifying_key {bytes} -- Raw bytes of the verifying key in question.
+        spent_keys {dict} -- The spent key index of the election from createSpentKeyIndex.
     
     Returns:
         {bool} -- True if the verifying key is already associated with a ballot in either
         the unconfirmed ballot pool or a block in the blockchain.
     """
 
-    key_string = verifying_key.to_string().hex()
+    return (
+        verifying_key in spent_keys["confirmed"]
+        or verifying_key in spent_keys["pending"]
+    )
 
-    # Look for the key in the chain
-    for block in blockchain["chain"]:
-        for ballot in block["ballots"]:
-            if ballot["ballot"]["verifying_key"] == key_string:
-                return True
 
-    # Look for the key in the unconfirmed ballots
+def createSpentKeyIndex():
+    """Create an empty spent key index.
+
+    The index tracks the verifying keys that have already cast a ballot in an election. Keys of
+    ballots in the chain are kept in a "confirmed" set, keys of ballots in the unconfirmed pool
+    are kept in a "pending" dictionary that maps the key to the id of the pending ballot. Keys and
+    id's are held as the raw bytes of the Ballots.
+    
+    Returns:
+        {dict} -- An empty spent key index.
+    """
+
+    return {"confirmed": set(), "pending": {}}
+
+
+def buildSpentKeyIndex(election, unconfirmed_ballots):
+    """Build a spent key index from an election's chain and its pool of unconfirmed ballots.
+    
+    Arguments:
+        election {Election} -- An election.
+        unconfirmed_ballots {dict} -- The pool of unconfirmed Ballots of the election.
+    
+    Returns:
+        {dict} -- A spent key index holding every key used in the chain or the pool.
+    """
+
+    spent_keys = createSpentKeyIndex()
+    for block in election.chain:
+        indexBlock(spent_keys, block)
     for ballot in unconfirmed_ballots.values():
-        if ballot["ballot"]["verifying_key"] == key_string:
-            return True
-    return False
+        indexPendingBallot(spent_keys, ballot)
+    return spent_keys
+
+
+def indexPendingBallot(spent_keys, ballot):
+    """Mark the verifying key of an unconfirmed ballot as spent.
+    
+    Arguments:
+        spent_keys {dict} -- The spent key index of the ballot's election.
+        ballot {Ballot} -- The unconfirmed ballot.
+    """
+
+    spent_keys["pending"][ballot.verifying_key] = ballot.id
+
+
+def unindexPendingBallot(spent_keys, ballot):
+    """Release the verifying key of an unconfirmed ballot that is dropped from the pool.
+    
+    Arguments:
+        spent_keys {dict} -- The spent key index of the ballot's election.
+        ballot {Ballot} -- The unconfirmed ballot.
+    """
+
+    if spent_keys["pending"].get(ballot.verifying_key) == ballot.id:
+        spent_keys["pending"].pop(ballot.verifying_key)
+
+
+def indexBlock(spent_keys, block):
+    """Mark the verifying keys of every ballot in a block as confirmed.
+    
+    Arguments:
+        spent_keys {dict} -- The spent key index of the block's election.
+        block {Block} -- The block that was added to the chain.
+    
+    Returns:
+        {list} -- Ids of the unconfirmed ballots that used one of the block's keys. These ballots
+        are either included in the block or conflict with it and should leave the pool.
+    """
 
+    displaced = []
+    for ballot in block.ballots:
+        if ballot.verifying_key in spent_keys["pending"]:
+            displaced.append(spent_keys["pending"].pop(ballot.verifying_key))
+        spent_keys["confirmed"].add(ballot.verifying_key)
+    return displaced
 
-def createGenesisBlock(label, candidates, verifying_keys):
+
+def unindexBlock(spent_keys, block):
+    """Release the verifying keys of every ballot in a block that was removed from the chain.
+    
+    Arguments:
+        spent_keys {dict} -- The spent key index of the block's election.
+        block {Block} -- The block that was removed from the end of the chain.
+    """
+
+    for ballot in block.ballots:
+        spent_keys["confirmed"].discard(ballot.verifying_key)
+
+
+def verifyBlockKeys(block, eligible_keys, spent_keys):
+    """Verifies that a block can extend a chain without a key casting two ballots.
+    
+    Arguments:
+        block {Block} -- The block that would extend the chain.
+        eligible_keys {frozenset} -- The verifying_keys of the election.
+        spent_keys {dict} -- The spent key index of the chain the block would extend.
+    
+    Returns:
+        {bool} -- True if every ballot in the block uses a different eligible key that has not been
+        confirmed in the chain.
+    """
+
+    keys = set()
+    for ballot in block.ballots:
+        key = ballot.verifying_key
+        if key in keys or key in spent_keys["confirmed"] or key not in eligible_keys:
+            return False
+        keys.add(key)
+    return True
+
+
+def buildBallotHeights(election):
+    """Build a lookup of the block that holds each confirmed ballot.
+    
+    Arguments:
+        election {Election} -- An election.
+    
+    Returns:
+        {dict} -- A dictionary that maps ballot id's to the height of their block in the chain.
+    """
+
+    return {
+        ballot.id: height
+        for height, block in enumerate(election.chain)
+        for ballot in block.ballots
+    }
+
+
+def buildBlockHeights(election):
+    """Build a lookup of the height of each block in the chain.
+    
+    Arguments:
+        election {Election} -- An election.
+    
+    Returns:
+        {dict} -- A dictionary that maps block id's to their height in the chain.
+    """
+
+    return {block.id: height for height, block in enumerate(election.chain)}
+
+
+def encodeBlock(block):
+    """Serialize a block to compact JSON with sorted keys.
+    
+    Arguments:
+        block {dict} -- The block to be serialized.
+    
+    Returns:
+        {bytes} -- The UTF-8 JSON encoding of the block.
+    """
+
+    return dumps(block, sort_keys=True, separators=(",", ":")).encode()
+
+
+"""
+A block with its encodeBlock serialization and hash. The block is the received dictionary until
+compactRecord replaces it with a Block once the block is accepted into a block tree.
+"""
+BlockRecord = namedtuple("BlockRecord", ["block", "data", "hash"])
+
+""" The fields of a block that nextBlockParams reads, for a received block that is not compacted
+yet. """
+HeaderFields = namedtuple("HeaderFields", ["timestamp", "difficulty"])
+
+
+def createBlockRecord(block):
+    """Serialize and hash a block once so that its bytes and hash can be reused. The block must
+    not be changed afterwards.
+    
+    Arguments:
+        block {dict} -- A block that is being added to a chain.
+    
+    Returns:
+        {BlockRecord} -- The block, its encodeBlock serialization and its hashBlock hash.
+    """
+
+    return BlockRecord(block, encodeBlock(block), hashBlock(block))
+
+
+def headerFields(block):
+    """
+    Arguments:
+        block {dict} -- A received block.
+
+    Returns:
+        {HeaderFields} -- The timestamp and difficulty of the block, as a Block has them.
+    """
+
+    return HeaderFields(
+        block["header"].get("timestamp", 0), block["header"].get("difficulty")
+    )
+
+
+def compactRecord(record, election):
+    """Replaces the dictionary of a received block with a Block. The dictionary can be decoded
+    again from the record's data.
+    
+    Arguments:
+        record {BlockRecord} -- Record of a received block from createBlockRecord.
+        election {Election} -- The block's election.
+    
+    Raises:
+        ValueError -- If the block or one of its ballots is malformed.
+    
+    Returns:
+        {BlockRecord} -- The record with a Block in place of the dictionary.
+    """
+
+    return record._replace(block=Block(record.block, election))
+
+
+def checkSpentKeyIndex(spent_keys, election, unconfirmed_ballots):
+    """Compares a spent key index against the chain and unconfirmed pool it was built from.
+    
+    Arguments:
+        spent_keys {dict} -- The spent key index to be checked.
+        election {Election} -- An election.
+        unconfirmed_ballots {dict} -- The pool of unconfirmed Ballots of the election.
+    
+    Returns:
+        {list} -- Human readable descriptions of every inconsistency, empty if the index is valid.
+    """
+
+    expected = buildSpentKeyIndex(election, unconfirmed_ballots)
+    problems = []
+    for key in expected["confirmed"] - spent_keys["confirmed"]:
+        problems.append("confirmed key %s missing from index" % key.hex())
+    for key in spent_keys["confirmed"] - expected["confirmed"]:
+        problems.append("confirmed key %s not in chain" % key.hex())
+    for key, ballot_id in expected["pending"].items():
+        if spent_keys["pending"].get(key) != ballot_id:
+            problems.append("pending key %s missing from index" % key.hex())
+    for key in spent_keys["pending"].keys() - expected["pending"].keys():
+        problems.append("pending key %s not in unconfirmed pool" % key.hex())
+    for key in expected["pending"].keys() & expected["confirmed"]:
+        problems.append("pending key %s already confirmed" % key.hex())
+    return problems
+
+
+def createGenesisBlock(label, candidates, verifying_keys, params=None):
     """Create a genesis block.
     
     Arguments:
         label {str} -- The human readable label of the election.
         candidates {list} -- A list of candidate names, each name should be unique.
         verifying_keys {list} -- A list of verifying key hex strings.
+        params {dict} -- Election parameters that replace those in DEFAULT_PARAMS.
     
     Returns:
         {dict} -- A properly structured genesis block for a blockchain. Has a randomly generated id.
@@ -199,6 +814,7 @@ def createGenesisBlock(label, candidates, verifying_keys):
             "verifying_keys": verifying_keys,
             "label": label,
             "nonce": 0,
+            "params": dict(DEFAULT_PARAMS, **(params or {})),
         },
         "ballots": [],
     }
@@ -222,7 +838,7 @@ def createBlockchain(genesis_block):
     }
 
 
-def createBlock(election, ballots, previous_hash, previous_id):
+def createBlock(election, ballots, previous_hash, previous_id, difficulty=None):
     """Create a block.
     
     Arguments:
@@ -230,23 +846,30 @@ def createBlock(election, ballots, previous_hash, previous_id):
         ballots {list} -- A list of ballots that the block holds.
         previous_hash {str} -- Hex string of the hash of the preceding block in the chain.
         previous_id {str} -- Id of the preceding block in the chain.
+        difficulty {int} -- Leading zero bits required in the block's hash from nextBlockParams,
+        left out of the header of blocks for elections without parameters.
     
     Returns:
         {dict} -- A block with a randomly generated id, filled in header, and list of ballots.
     """
 
-    return {
+    block = {
         "header": {
+            "version": BLOCK_VERSION,
             "election": election,
             "id": getUUID(),
             "timestamp": time.time(),
             "nonce": 0,
             "previous_hash": previous_hash,
             "previous_id": previous_id,
+            "ballots_root": merkleRoot(ballots),
             "mined_by": port,
         },
         "ballots": ballots,
     }
+    if difficulty is not None:
+        block["header"]["difficulty"] = difficulty
+    return block
 
 
 def createBallot(election, candidates, verifying_key):
@@ -269,35 +892,44 @@ def createBallot(election, candidates, verifying_key):
     }
 
 
-def addBlock(blockchain, block):
-    """Adds a block to the end of a blockchain.
+def addBlock(election, block):
+    """Adds a block to the end of an election's chain.
     
     Arguments:
-        blockchain {dict} -- The blockchain to be added to.
-        block {dict} -- The block to be added.
+        election {Election} -- The election to be added to.
+        block {Block} -- The block to be added.
     """
 
-    assert "chain" in blockchain and type(blockchain["chain"]) is list
-    blockchain["chain"].append(block)
+    election.chain.append(block)
 
 
-def mineBlock(election, ballots, previous_block):
+def mineBlock(election, ballots, previous_block, difficulty=None):
     """Mines a new block containing the given ballots.
     
     Arguments:
         election {str} -- Election id.
         ballots {list} -- List of ballot dictionaries.
         previous_block {dict} -- Block dictionary preceding the mined block.
+        difficulty {int} -- Leading zero bits required in the block's hash from nextBlockParams.
     
     Returns:
         {dict} -- Returns a new block with a valid hash and reference to the previous block.
     """
 
     block = createBlock(
-        election, ballots, hashBlock(previous_block), previous_block["header"]["id"]
+        election,
+        ballots,
+        hashBlock(previous_block),
+        previous_block["header"]["id"],
+        difficulty,
     )
 
-    # Increment nonce until the hash of the block conforms to the difficulty requirement
-    while hashBlock(block)[:MINING_DIFFICULTY] != MINING_DIFFICULTY * "0":
-        block["header"]["nonce"] += 1
+    # Search increasing nonces until the hash of the block conforms to the difficulty requirement
+    start = 0
+    range_size = 4096
+    nonce = None
+    while nonce is None:
+        nonce = searchNonceRange(block, start, start + range_size)
+        start += range_size
+    block["header"]["nonce"] = nonce
     return block
@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# compact.py - slotted in-memory forms of the elections, blocks and ballots that a node holds
+
+from sys import getsizeof
+from array import array
+
+
+def packId(id_string):
+    """
+    Arguments:
+        id_string {str} -- A UUID string from getUUID.
+
+    Raises:
+        ValueError -- If the string is not a UUID in its canonical lowercase form.
+
+    Returns:
+        {bytes} -- The 16 bytes of the UUID.
+    """
+
+    if not isinstance(id_string, str) or len(id_string) != 36:
+        raise ValueError("id is not a UUID string")
+    packed = bytes.fromhex(id_string.replace("-", ""))
+    if len(packed) != 16 or formatId(packed) != id_string:
+        raise ValueError("id %s is not a canonical UUID" % id_string)
+    return packed
+
+
+def formatId(packed):
+    """
+    Arguments:
+        packed {bytes} -- The 16 bytes of a UUID from packId.
+
+    Returns:
+        {str} -- The UUID string.
+    """
+
+    # Slicing the hex is several times faster than going through uuid.UUID
+    h = packed.hex()
+    return "%s-%s-%s-%s-%s" % (h[:8], h[8:12], h[12:16], h[16:20], h[20:])
+
+
+def packHex(hex_string):
+    """
+    Arguments:
+        hex_string {str} -- A lowercase hex string such as a verifying key or signature.
+
+    Raises:
+        ValueError -- If the string is not lowercase hex.
+
+    Returns:
+        {bytes} -- The bytes of the hex string.
+    """
+
+    if not isinstance(hex_string, str):
+        raise ValueError("hex value is not a string")
+    packed = bytes.fromhex(hex_string)
+    if packed.hex() != hex_string:
+        raise ValueError("hex value is not lowercase")
+    return packed
+
+
+class Election:
+    """An election and its chain. Only the parts of the genesis block header that the node reads
+    are kept, the verifying keys as a set of raw bytes. The genesis block's JSON stays in its
+    BlockRecord.
+    """
+
+    __slots__ = (
+        "id",
+        "label",
+        "timestamp",
+        "candidates",
+        "indexes",
+        "typecode",
+        "params",
+        "verifying_keys",
+        "chain",
+    )
+
+    def __init__(self, genesis):
+        """
+        Arguments:
+            genesis {dict} -- A genesis block created by createGenesisBlock.
+
+        Raises:
+            ValueError -- If the genesis block is malformed.
+        """
+
+        try:
+            header = genesis["header"]
+            self.id = header["id"]
+            packId(self.id)
+            self.label = header["label"]
+            self.timestamp = header["timestamp"]
+            self.candidates = tuple(header["candidates"])
+            self.params = header.get("params")
+            self.verifying_keys = frozenset(
+                packHex(key_string) for key_string in header["verifying_keys"]
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError("malformed genesis block") from e
+        if not all(isinstance(candidate, str) for candidate in self.candidates):
+            raise ValueError("candidate is not a string")
+
+        """ A dictionary that maps candidate names to their index in candidates. """
+        self.indexes = {candidate: i for i, candidate in enumerate(self.candidates)}
+
+        """ The array type code of ballot rankings, one byte per choice unless there are more
+        than 256 candidates. """
+        self.typecode = "B" if len(self.candidates) <= 256 else "I"
+
+        """ List of the Blocks in the chain, starting with the genesis block once it is added. """
+        self.chain = []
+
+
+class Block:
+    """The parts of an accepted block that a node reads. The block's JSON stays in its BlockRecord
+    and is what the node serves and hashes.
+    """
+
+    __slots__ = ("id", "previous_hash", "timestamp", "difficulty", "ballots")
+
+    def __init__(self, block, election):
+        """
+        Arguments:
+            block {dict} -- A block of the election.
+            election {Election} -- The block's election.
+
+        Raises:
+            ValueError -- If the block or one of its ballots is malformed.
+        """
+
+        try:
+            header = block["header"]
+            self.id = packId(header["id"])
+            self.previous_hash = header.get("previous_hash")
+            self.timestamp = header.get("timestamp", 0)
+            self.difficulty = header.get("difficulty")
+            self.ballots = tuple(
+                Ballot(ballot, election) for ballot in block["ballots"]
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError("malformed block") from e
+
+
+class Ballot:
+    """A signed ballot. The id is the 16 bytes of its UUID, the verifying key and signature are raw
+    bytes and the ranking is an array of indexes into the candidates of the election's genesis
+    block.
+    """
+
+    __slots__ = ("id", "election", "ranking", "verifying_key", "signature")
+
+    def __init__(self, ballot, election):
+        """
+        Arguments:
+            ballot {dict} -- Ballot dictionary containing a ballot and digital signature.
+            election {Election} -- The ballot's election.
+
+        Raises:
+            ValueError -- If the ballot is of another election, ranks an unknown candidate or is
+            not exactly the dictionary that toDict gives back, since its signature would no longer
+            match.
+        """
+
+        try:
+            fields = ballot["ballot"]
+            if fields["election"] != election.id:
+                raise ValueError("ballot is not of election %s" % election.id)
+            self.id = packId(fields["id"])
+            self.election = election
+            self.ranking = array(
+                election.typecode,
+                [election.indexes[candidate] for candidate in fields["candidates"]],
+            )
+            self.verifying_key = packHex(fields["verifying_key"])
+            self.signature = packHex(ballot["signature"])
+        except (KeyError, TypeError) as e:
+            raise ValueError("malformed ballot") from e
+        if self.toDict() != ballot:
+            raise ValueError("ballot has unknown fields")
+
+    def candidates(self):
+        """
+        Returns:
+            {list} -- The ranked candidate names from highest rank to least.
+        """
+
+        candidates = self.election.candidates
+        return [candidates[i] for i in self.ranking]
+
+    def toDict(self):
+        """
+        Returns:
+            {dict} -- Ballot dictionary containing a ballot and digital signature.
+        """
+
+        return {
+            "ballot": {
+                "id": formatId(self.id),
+                "election": self.election.id,
+                "candidates": self.candidates(),
+                "verifying_key": self.verifying_key.hex(),
+            },
+            "signature": self.signature.hex(),
+        }
+
+    def size(self):
+        """
+        Returns:
+            {int} -- The bytes of memory the ballot takes, not counting its shared election.
+        """
+
+        return (
+            getsizeof(self)
+            + getsizeof(self.id)
+            + getsizeof(self.ranking)
+            + getsizeof(self.verifying_key)
+            + getsizeof(self.signature)
+        )
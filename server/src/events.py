@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# events.py - coalesce node and election updates into periodic web socket messages
+
+import threading
+from compact import formatId
+
+""" Seconds between the updates sent to web socket clients. """
+EVENT_TICK = 0.5
+
+""" The most ballot id's sent to an election's room in one update, later ones are only counted. """
+MAX_EVENT_BALLOTS = 1000
+
+
+def electionRoom(election):
+    """
+    Arguments:
+        election {str} -- Election id.
+
+    Returns:
+        {str} -- Name of the web socket room of the election's subscribers.
+    """
+
+    return "election:" + election
+
+
+def diffInfo(old, new):
+    """
+    Arguments:
+        old {dict} -- Node info that clients already have.
+        new {dict} -- Current node info.
+
+    Returns:
+        {dict} -- The fields of new whose values are not in old.
+    """
+
+    return {
+        key: value for key, value in new.items() if key not in old or old[key] != value
+    }
+
+
+class EventBus:
+    """Collects what changed on the node and sends it to web socket clients once per tick. Every
+    client gets the fields of the node info that changed since the last tick as an "info_diff"
+    message. Clients that subscribed to an election also get the blocks added to its chain as a
+    "blocks" message and the ballots added to its pool as a "ballots" message. Changes are only
+    collected for elections that have a subscriber, and the node info is only built while a
+    client is connected.
+    """
+
+    def __init__(self, socketio, build_info, tick=EVENT_TICK):
+        """
+        Arguments:
+            socketio {SocketIO} -- The server that messages are sent from.
+            build_info {function} -- Function that returns the node info dictionary.
+            tick {float} -- Seconds between updates.
+        """
+
+        self.socketio = socketio
+        self.build_info = build_info
+        self.tick = tick
+
+        """ Lock to control access to the clients, subscriptions and collected changes. """
+        self.lock = threading.Lock()
+
+        """ A dictionary that maps the session id of each connected client to the set of election
+        id's it subscribed to. """
+        self.clients = {}
+
+        """ A dictionary that maps election id's to their number of subscribers. """
+        self.watchers = {}
+
+        """ The node info as of the last tick. """
+        self.info = {}
+
+        """ A dictionary that maps election id's to the blocks added since the last tick. """
+        self.blocks = {}
+
+        """ A dictionary that maps election id's to the id's of the ballots added since the last
+        tick. """
+        self.ballots = {}
+
+    def connect(self, sid):
+        """Adds a client.
+
+        Arguments:
+            sid {str} -- Session id of the client.
+
+        Returns:
+            {dict} -- The current node info, which the caller sends to the client.
+        """
+
+        with self.lock:
+            self.clients.setdefault(sid, set())
+        return self.build_info()
+
+    def disconnect(self, sid):
+        """Removes a client and its subscriptions.
+
+        Arguments:
+            sid {str} -- Session id of the client.
+        """
+
+        with self.lock:
+            for election in self.clients.pop(sid, ()):
+                self.unwatch(election)
+
+    def subscribe(self, sid, election):
+        """Records that a client joined an election's room.
+
+        Arguments:
+            sid {str} -- Session id of the client.
+            election {str} -- Election id.
+        """
+
+        with self.lock:
+            elections = self.clients.setdefault(sid, set())
+            if election not in elections:
+                elections.add(election)
+                self.watchers[election] = self.watchers.get(election, 0) + 1
+
+    def unsubscribe(self, sid, election):
+        """Records that a client left an election's room.
+
+        Arguments:
+            sid {str} -- Session id of the client.
+            election {str} -- Election id.
+        """
+
+        with self.lock:
+            elections = self.clients.get(sid, set())
+            if election in elections:
+                elections.remove(election)
+                self.unwatch(election)
+
+    def unwatch(self, election):
+        """Removes a subscriber of an election and drops the changes collected for it once it has
+        none left. The caller must hold lock.
+
+        Arguments:
+            election {str} -- Election id.
+        """
+
+        self.watchers[election] -= 1
+        if not self.watchers[election]:
+            del self.watchers[election]
+            self.blocks.pop(election, None)
+            self.ballots.pop(election, None)
+
+    def blockAdded(self, election, block, height, block_hash):
+        """Records a block that was added to the end of an election's chain.
+
+        Arguments:
+            election {str} -- Election id.
+            block {Block} -- The block.
+            height {int} -- Height of the block in the chain.
+            block_hash {str} -- Hash of the block.
+        """
+
+        # Checked again under the lock, this only skips it when nobody is watching
+        if election not in self.watchers:
+            return
+        with self.lock:
+            if election in self.watchers:
+                self.blocks.setdefault(election, []).append(
+                    (block.id, height, block_hash, len(block.ballots))
+                )
+
+    def ballotsAdded(self, election, ballot_ids):
+        """Records ballots that were added to an election's unconfirmed pool.
+
+        Arguments:
+            election {str} -- Election id.
+            ballot_ids {list} -- Id's of the Ballots.
+        """
+
+        if election not in self.watchers:
+            return
+        with self.lock:
+            if election in self.watchers:
+                self.ballots.setdefault(election, []).extend(ballot_ids)
+
+    def flush(self):
+        """Sends the changes collected since the last tick.
+        """
+
+        with self.lock:
+            connected = bool(self.clients)
+            blocks, self.blocks = self.blocks, {}
+            ballots, self.ballots = self.ballots, {}
+
+        if connected:
+            info = self.build_info()
+            diff = diffInfo(self.info, info)
+            self.info = info
+            if diff:
+                self.socketio.emit("info_diff", diff)
+
+        for election, added in blocks.items():
+            self.socketio.emit(
+                "blocks",
+                {
+                    "election": election,
+                    "blocks": [
+                        {
+                            "id": formatId(block_id),
+                            "height": height,
+                            "hash": block_hash,
+                            "ballots": ballot_count,
+                        }
+                        for block_id, height, block_hash, ballot_count in added
+                    ],
+                },
+                room=electionRoom(election),
+            )
+        for election, added in ballots.items():
+            self.socketio.emit(
+                "ballots",
+                {
+                    "election": election,
+                    "ballots": [formatId(i) for i in added[:MAX_EVENT_BALLOTS]],
+                    "count": len(added),
+                },
+                room=electionRoom(election),
+            )
+
+    def run(self):
+        """Infinite loop that flushes the collected changes every tick. Runs as a background task
+        of the web socket server so that messages are sent from its own event loop.
+        """
+
+        while True:
+            self.socketio.sleep(self.tick)
+            self.flush()
@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# forks.py - tree of the competing branches of an election's chain
+
+from collections import OrderedDict, namedtuple
+import blockchain
+
+""" The largest number of blocks held per election while their parent is unknown. """
+MAX_ORPHANS = 256
+
+""" A block in a BlockTree with the hash of its parent, its height and the work of its branch. """
+TreeNode = namedtuple("TreeNode", ["record", "parent", "height", "work"])
+
+
+class BlockTree:
+    """Holds every block of an election that connects to its genesis block, indexed by hash, so
+    that competing branches can be compared by the work needed to build them. Blocks that arrive
+    before their parent wait in a bounded orphan pool, the oldest orphan is dropped when it is
+    full. Records in the tree hold compact Blocks, orphans are kept as received until they are
+    verified.
+    """
+
+    def __init__(self, genesis):
+        """
+        Arguments:
+            genesis {BlockRecord} -- Record of the election's genesis block from compactRecord.
+        """
+
+        """ A dictionary that maps block hashes to TreeNodes. """
+        self.nodes = {genesis.hash: TreeNode(genesis, None, 0, 0)}
+
+        """ A dictionary that maps block hashes to the hashes of their children. """
+        self.children = {}
+
+        """ An OrderedDict that maps the hashes of orphan blocks to their records, oldest first. """
+        self.orphans = OrderedDict()
+
+        """ A dictionary that maps the hashes of missing parents to the hashes of their orphans. """
+        self.orphan_children = {}
+
+    def contains(self, block_hash):
+        """
+        Arguments:
+            block_hash {str} -- Hash of a block.
+
+        Returns:
+            {bool} -- True if the block is in the tree or the orphan pool.
+        """
+
+        return block_hash in self.nodes or block_hash in self.orphans
+
+    def insert(self, record):
+        """Adds a block whose parent is in the tree.
+
+        Arguments:
+            record {BlockRecord} -- Record of the block from compactRecord.
+
+        Returns:
+            {TreeNode} -- The block's node.
+        """
+
+        parent_hash = record.block.previous_hash
+        parent = self.nodes[parent_hash]
+        node = TreeNode(
+            record,
+            parent_hash,
+            parent.height + 1,
+            parent.work + blockchain.blockWork(record.block),
+        )
+        self.nodes[record.hash] = node
+        self.children.setdefault(parent_hash, []).append(record.hash)
+        return node
+
+    def remove(self, block_hash):
+        """Removes a block and every block that descends from it.
+
+        Arguments:
+            block_hash {str} -- Hash of a block in the tree other than the genesis block.
+        """
+
+        self.children[self.nodes[block_hash].parent].remove(block_hash)
+        stack = [block_hash]
+        while stack:
+            block_hash = stack.pop()
+            del self.nodes[block_hash]
+            stack.extend(self.children.pop(block_hash, []))
+
+    def best(self):
+        """Finds the tip of the branch with the most work, the block added first wins a tie.
+
+        Returns:
+            {str} -- Hash of the block.
+        """
+
+        return max(self.nodes, key=lambda block_hash: self.nodes[block_hash].work)
+
+    def addOrphan(self, record):
+        """Holds a block whose parent is not in the tree.
+
+        Arguments:
+            record {BlockRecord} -- Record of the received block from createBlockRecord.
+        """
+
+        if record.hash in self.orphans:
+            return
+        if len(self.orphans) >= MAX_ORPHANS:
+            _, oldest = self.orphans.popitem(last=False)
+            parent_hash = oldest.block["header"]["previous_hash"]
+            self.orphan_children[parent_hash].remove(oldest.hash)
+            if not self.orphan_children[parent_hash]:
+                del self.orphan_children[parent_hash]
+        self.orphans[record.hash] = record
+        self.orphan_children.setdefault(
+            record.block["header"]["previous_hash"], []
+        ).append(record.hash)
+
+    def popOrphans(self, parent_hash):
+        """Removes the orphans that were waiting for a block.
+
+        Arguments:
+            parent_hash {str} -- Hash of the block that was added to the tree.
+
+        Returns:
+            {list} -- Records of the block's orphaned children.
+        """
+
+        return [
+            self.orphans.pop(block_hash)
+            for block_hash in self.orphan_children.pop(parent_hash, [])
+        ]
@@ -0,0 +1,383 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# gossip.py - send messages to peers over pooled keep-alive sessions on a bounded worker pool
+
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from util import build_url, getLogger
+
+log = getLogger("gossip")
+
+""" The number of threads that send messages to peers. """
+GOSSIP_WORKERS = 8
+
+""" The most messages waiting to be sent before new messages are held back for their peer. """
+MAX_QUEUE_DEPTH = 10000
+
+""" The most messages held back for a peer, beyond which the oldest are dropped. """
+MAX_DEFERRED = 10000
+
+""" Seconds to wait for a connection to a peer, a peer that does not accept one is backed off. """
+PEER_TIMEOUT = 2
+
+""" Seconds to wait for a peer to answer a message, which covers verifying a large batch. """
+PEER_READ_TIMEOUT = 30
+
+""" Times a message is sent to a peer that keeps timing out while answering before it is
+dropped. """
+MAX_ATTEMPTS = 5
+
+""" Seconds between checks for held back messages that can be sent again. """
+RETRY_INTERVAL = 0.5
+
+""" Seconds that a peer is skipped after its first failure, doubled for each further failure. """
+BACKOFF_BASE = 1
+
+""" The longest a failing peer is skipped for, in seconds. """
+BACKOFF_MAX = 60
+
+""" Seconds that a message id is remembered by SeenCache. """
+SEEN_TTL = 600
+
+""" The most message ids remembered by SeenCache. """
+SEEN_MAX_SIZE = 1000000
+
+""" Seconds that BallotBatcher waits for more ballots before sending a batch. """
+BATCH_LINGER = 0.05
+
+""" The most ballots sent in one batch. """
+BATCH_MAX_SIZE = 256
+
+
+class GossipDispatcher:
+    """Sends messages to peers from a bounded pool of threads. Each peer has its own keep-alive
+    session. Messages for a peer that fails are held back in a bounded queue while the peer is
+    skipped with exponential backoff, and are sent again once a retried message gets through.
+    """
+
+    def __init__(self, worker_count=GOSSIP_WORKERS):
+        """
+        Arguments:
+            worker_count {int} -- The number of sending threads. (default: {GOSSIP_WORKERS})
+        """
+
+        self.worker_count = worker_count
+        self.pool = ThreadPoolExecutor(
+            max_workers=worker_count, thread_name_prefix="gossip"
+        )
+
+        """ Lock to control access to the sessions, backoff state and counters. """
+        self.lock = threading.Lock()
+
+        """ A dictionary that maps peer ports to sessions. """
+        self.sessions = {}
+
+        """ A dictionary that maps peer ports to (consecutive failures, retry time). """
+        self.backoff = {}
+
+        """ A dictionary that maps peer ports to deques of held back (path, body, queued_at,
+        attempts) messages. """
+        self.deferred = {}
+
+        """ Peers with a retried message in flight. """
+        self.retrying = set()
+
+        self.queue_depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+        """ Average seconds a message waits in the queue before it is sent. """
+        self.queue_latency = 0
+
+        self.thread = threading.Thread(target=self.retryLoop, daemon=True)
+        self.thread.start()
+
+    def session(self, peer):
+        """
+        Arguments:
+            peer {int} -- Port of the peer.
+
+        Returns:
+            {Session} -- The peer's keep-alive session, created on first use.
+        """
+
+        with self.lock:
+            if peer not in self.sessions:
+                session = requests.Session()
+                session.mount(
+                    "http://",
+                    HTTPAdapter(pool_connections=1, pool_maxsize=self.worker_count),
+                )
+                self.sessions[peer] = session
+            return self.sessions[peer]
+
+    def broadcast(self, path, body, peers):
+        """Queues a message to be posted to every peer. It is held back for a peer that is
+        backing off or already has messages held back, and for every peer while the queue is full.
+
+        Arguments:
+            path {str} -- The endpoint path with a leading slash.
+            body {dict} -- The JSON body of the message, or bytes that are already encoded.
+            peers {list} -- Ports of the peers.
+        """
+
+        now = time.time()
+        for peer in list(peers):
+            with self.lock:
+                if (
+                    self.deferred.get(peer)
+                    or self.backoff.get(peer, (0, 0))[1] > now
+                    or self.queue_depth >= MAX_QUEUE_DEPTH
+                ):
+                    self.defer(peer, (path, body, now, 0))
+                    continue
+                self.queue_depth += 1
+            self.pool.submit(self.send, peer, path, body, now)
+
+    def defer(self, peer, message, first=False):
+        """Holds back a message for a peer. The caller must hold the lock.
+
+        Arguments:
+            peer {int} -- Port of the peer.
+            message {tuple} -- (path, body, queued_at, attempts) of the message.
+            first {bool} -- Whether the message is sent before the others, as a message that
+            failed is. (default: {False})
+        """
+
+        deferred = self.deferred.setdefault(peer, deque(maxlen=MAX_DEFERRED))
+        if len(deferred) == MAX_DEFERRED:
+            self.dropped += 1
+        if first:
+            deferred.appendleft(message)
+        else:
+            deferred.append(message)
+
+    def send(self, peer, path, body, queued_at, attempts=0):
+        """Posts a message to a peer and updates its backoff state. A message that fails is held
+        back to be sent again, and a message that gets through releases the peer's held back
+        messages.
+
+        Arguments:
+            peer {int} -- Port of the peer.
+            path {str} -- The endpoint path with a leading slash.
+            body {dict} -- The JSON body of the message, or bytes that are already encoded.
+            queued_at {float} -- Time the message was queued.
+            attempts {int} -- Times the message was sent before. (default: {0})
+        """
+
+        with self.lock:
+            self.queue_depth -= 1
+            self.queue_latency = 0.9 * self.queue_latency + 0.1 * (
+                time.time() - queued_at
+            )
+
+        try:
+            # Only connection problems count as failures, a peer that rejects a message is alive
+            timeout = (PEER_TIMEOUT, PEER_READ_TIMEOUT)
+            if isinstance(body, bytes):
+                self.session(peer).post(
+                    build_url(peer, path),
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                    timeout=timeout,
+                )
+            else:
+                self.session(peer).post(
+                    build_url(peer, path), json=body, timeout=timeout
+                )
+        except requests.exceptions.ReadTimeout as e:
+            # The peer is alive but busy, it is sent the message again without backing off
+            with self.lock:
+                self.failed += 1
+                self.retrying.discard(peer)
+                if attempts + 1 < MAX_ATTEMPTS:
+                    self.defer(peer, (path, body, queued_at, attempts + 1), True)
+                else:
+                    self.dropped += 1
+            log.warning("%d timed out answering %s: %s" % (peer, path, e))
+            return
+        except requests.RequestException as e:
+            with self.lock:
+                self.failed += 1
+                self.retrying.discard(peer)
+                failures = self.backoff.get(peer, (0, 0))[0] + 1
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+                self.backoff[peer] = (failures, time.time() + delay)
+                self.defer(peer, (path, body, queued_at, attempts), True)
+            log.warning(
+                "failed to send %s to %d, retrying in %ds: %s" % (path, peer, delay, e)
+            )
+            return
+
+        with self.lock:
+            self.sent += 1
+            self.backoff.pop(peer, None)
+            self.retrying.discard(peer)
+            deferred = self.deferred.get(peer)
+            messages = []
+            while deferred and self.queue_depth < MAX_QUEUE_DEPTH:
+                messages.append(deferred.popleft())
+                self.queue_depth += 1
+        for message in messages:
+            self.pool.submit(self.send, peer, *message)
+
+    def retryLoop(self):
+        """Sends the first held back message of each peer whose backoff has expired, one peer at
+        a time, so that a peer that is still down is not sent its whole queue.
+        """
+
+        while True:
+            time.sleep(RETRY_INTERVAL)
+            now = time.time()
+            with self.lock:
+                retries = []
+                for peer, deferred in self.deferred.items():
+                    if (
+                        deferred
+                        and peer not in self.retrying
+                        and self.backoff.get(peer, (0, 0))[1] <= now
+                        and self.queue_depth < MAX_QUEUE_DEPTH
+                    ):
+                        self.retrying.add(peer)
+                        retries.append((peer, deferred.popleft()))
+                        self.queue_depth += 1
+            for peer, message in retries:
+                self.pool.submit(self.send, peer, *message)
+
+    def stats(self):
+        """
+        Returns:
+            {dict} -- Queue depth, message counters and the peers that are backing off.
+        """
+
+        with self.lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "queue_latency": self.queue_latency,
+                "sent": self.sent,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "deferred": sum(len(deferred) for deferred in self.deferred.values()),
+                "backoff": sorted(self.backoff.keys()),
+            }
+
+
+class SeenCache:
+    """Remembers the ids of recently received messages so that duplicates can be dropped before
+    any work is done. Ids are forgotten after SEEN_TTL seconds.
+    """
+
+    def __init__(self, ttl=SEEN_TTL, max_size=SEEN_MAX_SIZE):
+        """
+        Arguments:
+            ttl {float} -- Seconds that an id is remembered. (default: {SEEN_TTL})
+            max_size {int} -- The most ids remembered. (default: {SEEN_MAX_SIZE})
+        """
+
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        """ Maps (kind, id) to expiry time, in order of expiry since the ttl is constant. """
+        self.entries = OrderedDict()
+
+    def add(self, kind, id):
+        """Records a message id.
+
+        Arguments:
+            kind {str} -- The kind of message, "ballot", "block" or "election".
+            id {str} -- The message id.
+
+        Returns:
+            {bool} -- True if the id was not seen before, False for a duplicate.
+        """
+
+        now = time.time()
+        key = (kind, id)
+        with self.lock:
+            while self.entries and (
+                next(iter(self.entries.values())) <= now
+                or len(self.entries) >= self.max_size
+            ):
+                self.entries.popitem(last=False)
+            if key in self.entries:
+                return False
+            self.entries[key] = now + self.ttl
+            return True
+
+    def discard(self, kind, id):
+        """Forgets a message id so that the message is processed if it is received again.
+
+        Arguments:
+            kind {str} -- The kind of message, "ballot", "block" or "election".
+            id {str} -- The message id.
+        """
+
+        with self.lock:
+            self.entries.pop((kind, id), None)
+
+
+class BallotBatcher:
+    """Collects ballots for BATCH_LINGER seconds and broadcasts them to the peers together in a
+    single /receive_batch message.
+    """
+
+    def __init__(self, dispatcher, peers, linger=BATCH_LINGER, max_size=BATCH_MAX_SIZE):
+        """
+        Arguments:
+            dispatcher {GossipDispatcher} -- Dispatcher that sends the batches.
+            peers {list} -- Ports of the peers, read each time a batch is sent.
+            linger {float} -- Seconds to wait for more ballots. (default: {BATCH_LINGER})
+            max_size {int} -- The most ballots in one batch. (default: {BATCH_MAX_SIZE})
+        """
+
+        self.dispatcher = dispatcher
+        self.peers = peers
+        self.linger = linger
+        self.max_size = max_size
+        self.condition = threading.Condition()
+        self.pending = []
+        self.thread = threading.Thread(target=self.flushLoop, daemon=True)
+        self.thread.start()
+
+    def add(self, ballots):
+        """Queues ballots to be broadcast in the next batch.
+
+        Arguments:
+            ballots {list} -- Ballot dictionaries containing a ballot and digital signature.
+        """
+
+        with self.condition:
+            self.pending.extend(ballots)
+            self.condition.notify()
+
+    def flushLoop(self):
+        """Waits for ballots, lets more of them arrive for the linger window, then broadcasts
+        them in batches of at most max_size ballots.
+        """
+
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                deadline = time.time() + self.linger
+                while len(self.pending) < self.max_size and time.time() < deadline:
+                    self.condition.wait(deadline - time.time())
+                pending = self.pending
+                self.pending = []
+
+            for start in range(0, len(pending), self.max_size):
+                self.dispatcher.broadcast(
+                    "/receive_batch",
+                    {"ballots": pending[start : start + self.max_size]},
+                    self.peers,
+                )
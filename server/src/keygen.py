@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# keygen.py - generate the key pairs of an election in chunks on a pool of processes
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import blockchain
+from util import getLogger
+
+log = getLogger("keygen")
+
+""" The most key pairs a worker process generates in one task. """
+CHUNK_SIZE = 256
+
+""" The most chunks per worker that are generated ahead of the caller. """
+CHUNKS_AHEAD = 2
+
+
+class KeyGenerator:
+    """Generates key pairs in chunks, spreading the chunks across a pool of worker processes.
+    Only a few chunks are generated ahead of the caller, so memory does not grow with the number
+    of keys.
+    """
+
+    def __init__(self, worker_count):
+        """
+        Arguments:
+            worker_count {int} -- The number of worker processes, 0 generates on the calling
+            thread.
+        """
+
+        self.worker_count = worker_count
+        self.pool = None
+        if worker_count > 0:
+            self.pool = ProcessPoolExecutor(
+                max_workers=worker_count,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def generate(self, key_count):
+        """Generates key pairs a chunk at a time.
+
+        Arguments:
+            key_count {int} -- Number of key pairs to generate.
+
+        Yields:
+            {(list, list)} -- The signing and verifying hex strings of a chunk of key pairs, as
+            returned by generateKeys. Chunks come in order and hold at most CHUNK_SIZE pairs.
+        """
+
+        chunk_size = CHUNK_SIZE
+        if self.pool:
+            # Split small elections so that every worker gets a share
+            chunk_size = max(1, min(CHUNK_SIZE, -(-key_count // self.worker_count)))
+        sizes = (
+            min(chunk_size, key_count - start)
+            for start in range(0, key_count, chunk_size)
+        )
+        if not self.pool:
+            for size in sizes:
+                yield blockchain.generateKeys(size)
+            return
+
+        pending = deque()
+        try:
+            for size in sizes:
+                pending.append(self.pool.submit(blockchain.generateKeys, size))
+                if len(pending) >= self.worker_count * CHUNKS_AHEAD:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # The caller stopped early, drop the chunks that were not started
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        """Stops the worker processes.
+        """
+
+        if self.pool:
+            self.pool.shutdown()
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# locks.py - per-election locks that let elections be read and updated independently
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """A lock that can be held by many readers or a single writer. Waiting writers are served
+    before new readers so that a steady stream of reads cannot starve them. The lock is not
+    reentrant, a thread must not acquire it again while holding it.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+
+        """ Number of threads holding the lock for reading. """
+        self.readers = 0
+
+        """ Number of threads waiting to acquire the lock for writing. """
+        self.waiting_writers = 0
+
+        """ Flag that specifies whether or not a thread holds the lock for writing. """
+        self.writer = False
+
+    @contextmanager
+    def read(self):
+        """Holds the lock for reading for the duration of a with block.
+        """
+
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if self.readers == 0:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Holds the lock for writing for the duration of a with block.
+        """
+
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+class ElectionLock:
+    """The locks that guard the state of one election. A thread that needs both takes chain
+    before pool.
+    """
+
+    def __init__(self):
+        """ Guards the chain, its block records and heights, and the tally. """
+        self.chain = ReadWriteLock()
+
+        """ Guards the unconfirmed pool and the spent key index. """
+        self.pool = threading.Lock()
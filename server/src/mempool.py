@@ -0,0 +1,258 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# mempool.py - bounded pool of the ballots that are waiting to be added to a chain
+
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+""" The most unconfirmed ballots held for all elections together. """
+MAX_POOL_BALLOTS = 200000
+
+""" The most bytes of unconfirmed ballots held for all elections together. """
+MAX_POOL_BYTES = 256 * 1024 * 1024
+
+""" The most unconfirmed ballots held for one election. """
+MAX_ELECTION_BALLOTS = 50000
+
+""" The most bytes of unconfirmed ballots held for one election. """
+MAX_ELECTION_BYTES = 64 * 1024 * 1024
+
+""" Bytes that a ballot's entry in the pool takes beyond the ballot, as measured by
+bench/bench_mempool.py. """
+ENTRY_OVERHEAD = 240
+
+""" Seconds that a ballot may wait in the pool before it is evicted. """
+BALLOT_TTL = 3600
+
+""" A ballot in the pool with its size from ballotSize and the time it is evicted at. """
+PoolEntry = namedtuple("PoolEntry", ["ballot", "size", "expires"])
+
+
+def ballotSize(ballot):
+    """
+    Arguments:
+        ballot {Ballot} -- A ballot.
+
+    Returns:
+        {int} -- The approximate number of bytes of memory the ballot takes in the pool.
+    """
+
+    return ballot.size() + ENTRY_OVERHEAD
+
+
+class Mempool:
+    """Holds the unconfirmed ballots of every election in the order they arrived, which is the
+    order they are put in blocks. A ballot is refused when its election or the whole pool is
+    full, and ballots that waited longer than the ttl are evicted from the front. The pool does
+    not know about spent keys, the caller releases the keys of the ballots it evicts.
+    """
+
+    def __init__(
+        self,
+        max_ballots=MAX_POOL_BALLOTS,
+        max_bytes=MAX_POOL_BYTES,
+        max_election_ballots=MAX_ELECTION_BALLOTS,
+        max_election_bytes=MAX_ELECTION_BYTES,
+        ttl=BALLOT_TTL,
+    ):
+        """
+        Arguments:
+            max_ballots {int} -- The most ballots in the pool.
+            max_bytes {int} -- The most bytes of ballots in the pool.
+            max_election_ballots {int} -- The most ballots of one election.
+            max_election_bytes {int} -- The most bytes of ballots of one election.
+            ttl {float} -- Seconds before a ballot is evicted.
+        """
+
+        self.max_ballots = max_ballots
+        self.max_bytes = max_bytes
+        self.max_election_ballots = max_election_ballots
+        self.max_election_bytes = max_election_bytes
+        self.ttl = ttl
+
+        """ Lock to control access to the entries and counters. """
+        self.lock = threading.Lock()
+
+        """ A dictionary that maps election id's to OrderedDicts of ballot id's and PoolEntries. """
+        self.entries = {}
+
+        """ A dictionary that maps election id's to the bytes of their ballots. """
+        self.election_bytes = {}
+
+        self.ballot_count = 0
+        self.byte_count = 0
+        self.refused = 0
+        self.expired = 0
+
+    def create(self, election):
+        """Adds an empty pool for an election.
+
+        Arguments:
+            election {str} -- Election id.
+        """
+
+        with self.lock:
+            self.entries.setdefault(election, OrderedDict())
+            self.election_bytes.setdefault(election, 0)
+
+    def add(self, election, ballot, limit=True):
+        """Adds a ballot to the end of an election's pool.
+
+        Arguments:
+            election {str} -- Election id.
+            ballot {Ballot} -- The ballot.
+            limit {bool} -- Whether or not the ballot is refused when the pool is full.
+
+        Returns:
+            {bool} -- True if the ballot was added.
+        """
+
+        size = ballotSize(ballot)
+        with self.lock:
+            entries = self.entries[election]
+            if limit and (
+                len(entries) >= self.max_election_ballots
+                or self.election_bytes[election] + size > self.max_election_bytes
+                or self.ballot_count >= self.max_ballots
+                or self.byte_count + size > self.max_bytes
+            ):
+                self.refused += 1
+                return False
+            entries[ballot.id] = PoolEntry(ballot, size, time.time() + self.ttl)
+            self.election_bytes[election] += size
+            self.ballot_count += 1
+            self.byte_count += size
+            return True
+
+    def remove(self, election, ballot_ids):
+        """Removes ballots from an election's pool.
+
+        Arguments:
+            election {str} -- Election id.
+            ballot_ids {list} -- Id's of ballots, those not in the pool are skipped.
+
+        Returns:
+            {list} -- Id's of the ballots that were removed.
+        """
+
+        removed = []
+        with self.lock:
+            entries = self.entries[election]
+            for ballot_id in ballot_ids:
+                entry = entries.pop(ballot_id, None)
+                if entry is not None:
+                    self.forget(election, entry)
+                    removed.append(ballot_id)
+        return removed
+
+    def expire(self, election):
+        """Evicts the ballots of an election that waited longer than the ttl.
+
+        Arguments:
+            election {str} -- Election id.
+
+        Returns:
+            {list} -- The evicted Ballots.
+        """
+
+        now = time.time()
+        expired = []
+        with self.lock:
+            entries = self.entries[election]
+            # Every ballot gets the same ttl, so the oldest ballots expire first
+            while entries and next(iter(entries.values())).expires <= now:
+                _, entry = entries.popitem(last=False)
+                self.forget(election, entry)
+                expired.append(entry.ballot)
+            self.expired += len(expired)
+        return expired
+
+    def forget(self, election, entry):
+        """Subtracts a ballot that left the pool from the counters. The caller must hold lock.
+
+        Arguments:
+            election {str} -- Election id.
+            entry {PoolEntry} -- The ballot's entry.
+        """
+
+        self.election_bytes[election] -= entry.size
+        self.ballot_count -= 1
+        self.byte_count -= entry.size
+
+    def contains(self, election, ballot_id):
+        """
+        Arguments:
+            election {str} -- Election id.
+            ballot_id {bytes} -- Id of a Ballot.
+
+        Returns:
+            {bool} -- True if the ballot is in the election's pool.
+        """
+
+        with self.lock:
+            return ballot_id in self.entries[election]
+
+    def take(self, election, count):
+        """
+        Arguments:
+            election {str} -- Election id.
+            count {int} -- The most ballots to return.
+
+        Returns:
+            {list} -- The oldest Ballots of the election's pool, oldest first. They stay in the
+            pool.
+        """
+
+        with self.lock:
+            return [
+                entry.ballot
+                for _, entry in zip(range(count), self.entries[election].values())
+            ]
+
+    def ballots(self, election):
+        """
+        Arguments:
+            election {str} -- Election id.
+
+        Returns:
+            {dict} -- A new dictionary that maps the id's of the ballots in the election's pool to
+            the Ballots, oldest first.
+        """
+
+        with self.lock:
+            return {
+                ballot_id: entry.ballot
+                for ballot_id, entry in self.entries[election].items()
+            }
+
+    def size(self, election):
+        """
+        Arguments:
+            election {str} -- Election id.
+
+        Returns:
+            {int} -- The number of ballots in the election's pool.
+        """
+
+        with self.lock:
+            return len(self.entries[election])
+
+    def stats(self):
+        """
+        Returns:
+            {dict} -- The number and bytes of pooled ballots, and how many were refused or
+            evicted.
+        """
+
+        with self.lock:
+            return {
+                "ballots": self.ballot_count,
+                "bytes": self.byte_count,
+                "refused": self.refused,
+                "expired": self.expired,
+            }
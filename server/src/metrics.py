@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# metrics.py - counters, gauges and histograms rendered in the Prometheus text format
+
+import time
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+""" Upper bounds in seconds of the buckets of a timing histogram. """
+TIME_BUCKETS = (0.00001, 0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+
+""" Whether metrics are collected. Timers are only installed once the node enables metrics and
+counters are only incremented after checking it, so a node without metrics does next to none of
+the work of this module. """
+enabled = False
+
+""" Every metric in the order they were created, which is the order they are rendered in. """
+registry = []
+
+
+def formatLabels(names, values):
+    """
+    Arguments:
+        names {tuple} -- Label names.
+        values {tuple} -- Label values in the same order.
+
+    Returns:
+        {str} -- The labels as they appear after a sample name, empty if there are none.
+    """
+
+    if not names:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+            for name, value in zip(names, values)
+        )
+        + "}"
+    )
+
+
+def formatValue(value):
+    """
+    Arguments:
+        value {float} -- A sample value.
+
+    Returns:
+        {str} -- The value in the text format, integers without a decimal point.
+    """
+
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """A value that only goes up, such as a number of ballots. Either counted with inc or read
+    from a function at each scrape.
+    """
+
+    def __init__(self, name, help, labels=(), function=None):
+        """
+        Arguments:
+            name {str} -- Metric name.
+            help {str} -- Description of the metric.
+            labels {tuple} -- Label names. (default: {()})
+            function {function} -- Function that returns the value, in place of inc.
+        """
+
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.function = function
+        self.lock = threading.Lock()
+
+        """ A dictionary that maps tuples of label values to counts. """
+        self.values = {}
+        registry.append(self)
+
+    def inc(self, amount=1, labels=()):
+        """
+        Arguments:
+            amount {float} -- Amount to add. (default: {1})
+            labels {tuple} -- Label values. (default: {()})
+        """
+
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        """
+        Returns:
+            {list} -- (sample name, label names, label values, value) of every sample.
+        """
+
+        if self.function:
+            return [(self.name, (), (), self.function())]
+        with self.lock:
+            return [
+                (self.name, self.labels, labels, value)
+                for labels, value in sorted(self.values.items())
+            ]
+
+    def kind(self):
+        return "counter"
+
+
+class Gauge(Counter):
+    """A value that goes up and down, such as the depth of a queue. Either set or read from a
+    function at each scrape.
+    """
+
+    def set(self, value, labels=()):
+        """
+        Arguments:
+            value {float} -- The new value.
+            labels {tuple} -- Label values. (default: {()})
+        """
+
+        with self.lock:
+            self.values[labels] = value
+
+    def kind(self):
+        return "gauge"
+
+
+class Histogram:
+    """Counts observations such as durations in cumulative buckets, with their sum and count.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        """
+        Arguments:
+            name {str} -- Metric name.
+            help {str} -- Description of the metric.
+            labels {tuple} -- Label names. (default: {()})
+            buckets {tuple} -- Increasing upper bounds of the buckets. (default: {TIME_BUCKETS})
+        """
+
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+
+        """ A dictionary that maps tuples of label values to [bucket counts, sum, count]. """
+        self.values = {}
+        registry.append(self)
+
+    def observe(self, value, labels=()):
+        """
+        Arguments:
+            value {float} -- The observation.
+            labels {tuple} -- Label values. (default: {()})
+        """
+
+        # Counts are per bucket here and made cumulative when rendered
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        """
+        Returns:
+            {list} -- (sample name, label names, label values, value) of every sample.
+        """
+
+        samples = []
+        with self.lock:
+            for labels, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket
+                    samples.append(
+                        (
+                            self.name + "_bucket",
+                            self.labels + ("le",),
+                            labels + (formatValue(bound),),
+                            cumulative,
+                        )
+                    )
+                samples.append((self.name + "_sum", self.labels, labels, total))
+                samples.append((self.name + "_count", self.labels, labels, count))
+        return samples
+
+    def kind(self):
+        return "histogram"
+
+
+class TimedLock:
+    """Wraps a lock to observe how long threads wait for it and hold it.
+    """
+
+    def __init__(self, lock, wait, hold, labels=()):
+        """
+        Arguments:
+            lock {Lock} -- The lock, it must not be reentrant.
+            wait {Histogram} -- Histogram of the seconds spent waiting for the lock.
+            hold {Histogram} -- Histogram of the seconds the lock was held.
+            labels {tuple} -- Label values of both histograms. (default: {()})
+        """
+
+        self.lock = lock
+        self.wait = wait
+        self.hold = hold
+        self.labels = labels
+        self.acquired_at = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        if acquired:
+            self.acquired_at = time.perf_counter()
+            self.wait.observe(self.acquired_at - start, self.labels)
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self.acquired_at
+        self.lock.release()
+        self.hold.observe(held, self.labels)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def timed(function, histogram, labels=()):
+    """
+    Arguments:
+        function {function} -- The function to be timed.
+        histogram {Histogram} -- Histogram of the seconds each call takes.
+        labels {tuple} -- Label values of the histogram. (default: {()})
+
+    Returns:
+        {function} -- A function that calls function and observes how long it took.
+    """
+
+    @wraps(function)
+    def timedFunction(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start, labels)
+
+    return timedFunction
+
+
+def instrument(owner, name, histogram, labels=None):
+    """Replaces a function of a module or object with a timed version of it. Callers that look the
+    function up on its owner at call time are timed from then on.
+
+    Arguments:
+        owner {obj} -- Module or object that holds the function.
+        name {str} -- Name of the function.
+        histogram {Histogram} -- Histogram of the seconds each call takes.
+        labels {tuple} -- Label values of the histogram. (default: {(name,)})
+    """
+
+    setattr(
+        owner,
+        name,
+        timed(getattr(owner, name), histogram, (name,) if labels is None else labels),
+    )
+
+
+def render():
+    """
+    Returns:
+        {str} -- Every metric in the registry in the Prometheus text format.
+    """
+
+    lines = []
+    for metric in registry:
+        lines.append("# HELP %s %s" % (metric.name, metric.help))
+        lines.append("# TYPE %s %s" % (metric.name, metric.kind()))
+        for name, label_names, label_values, value in metric.samples():
+            lines.append(
+                "%s%s %s"
+                % (name, formatLabels(label_names, label_values), formatValue(value))
+            )
+    return "\n".join(lines) + "\n"
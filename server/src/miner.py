@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# miner.py - proof-of-work mining engine that searches the nonce space in a pool of processes
+
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import blockchain
+from compact import formatId
+from util import getLogger
+
+log = getLogger("miner")
+
+""" The number of consecutive nonces a worker tries before checking for cancellation. """
+NONCE_RANGE = 4096
+
+""" Cancellation event shared with the worker processes, set by initWorker. """
+cancel_event = None
+
+
+def initWorker(event):
+    """Initializes a worker process with the engine's cancellation event.
+
+    Arguments:
+        event {Event} -- Event that is set when the current job should stop.
+    """
+
+    global cancel_event
+    cancel_event = event
+
+
+def searchNonces(block, worker, worker_count):
+    """Searches nonce ranges for a hash that conforms to the difficulty requirement. The nonce
+    space is split into ranges of NONCE_RANGE nonces and worker n searches ranges n,
+    n + worker_count, n + 2 * worker_count, ...
+
+    Arguments:
+        block {dict} -- The block to be mined.
+        worker {int} -- Index of this worker.
+        worker_count {int} -- Total number of workers searching for the block.
+
+    Returns:
+        {(int, int)} -- The valid nonce, or None if the search was cancelled, and the number of
+        hashes computed.
+    """
+
+    hashes = 0
+    start = worker * NONCE_RANGE
+    while not cancel_event.is_set():
+        nonce = blockchain.searchNonceRange(block, start, start + NONCE_RANGE)
+        if nonce is not None:
+            return nonce, hashes + nonce - start + 1
+        hashes += NONCE_RANGE
+        start += worker_count * NONCE_RANGE
+    return None, hashes
+
+
+class MiningEngine:
+    """Mines blocks by splitting the nonce space across a pool of worker processes. Only one
+    block is mined at a time.
+    """
+
+    def __init__(self, worker_count):
+        """
+        Arguments:
+            worker_count {int} -- The number of worker processes.
+        """
+
+        # Spawn workers rather than forking a process that is already running server threads
+        context = multiprocessing.get_context("spawn")
+        self.worker_count = worker_count
+        self.cancel_event = context.Event()
+        self.pool = ProcessPoolExecutor(
+            max_workers=worker_count,
+            mp_context=context,
+            initializer=initWorker,
+            initargs=(self.cancel_event,),
+        )
+
+        """ Lock to control access to the current job. """
+        self.lock = threading.Lock()
+
+        """ Id of the election whose block is being mined, None when idle. """
+        self.election = None
+
+        """ Hashes per second measured over the last job. """
+        self.hashrate = 0
+
+        """ Hashes computed over every job. """
+        self.hashes = 0
+
+    def mine(self, election, ballots, previous, difficulty):
+        """Mines a new block containing the given ballots.
+
+        Arguments:
+            election {str} -- Election id.
+            ballots {list} -- List of ballot dictionaries.
+            previous {BlockRecord} -- Record of the block preceding the mined block in a block
+            tree.
+            difficulty {int} -- Leading zero bits required in the block's hash.
+
+        Returns:
+            {dict} -- A new block with a valid hash and reference to the previous block, or None
+            if the job was aborted.
+        """
+
+        block = blockchain.createBlock(
+            election, ballots, previous.hash, formatId(previous.block.id), difficulty
+        )
+
+        with self.lock:
+            self.cancel_event.clear()
+            self.election = election
+
+        start = time.time()
+        pending = {
+            self.pool.submit(searchNonces, block, worker, self.worker_count)
+            for worker in range(self.worker_count)
+        }
+
+        # Stop every worker as soon as one of them finds a valid nonce
+        nonce = None
+        hashes = 0
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, count = future.result()
+                hashes += count
+                if found is not None and nonce is None:
+                    nonce = found
+                    self.cancel_event.set()
+
+        self.hashrate = hashes / max(time.time() - start, 0.000001)
+        self.hashes += hashes
+        with self.lock:
+            self.election = None
+
+        if nonce is None:
+            return None
+        block["header"]["nonce"] = nonce
+        return block
+
+    def abort(self, election):
+        """Aborts the current job if it is mining a block for the given election.
+
+        Arguments:
+            election {str} -- Election id.
+        """
+
+        with self.lock:
+            if self.election == election:
+                log.info("aborted mining block for election %s" % election)
+                self.cancel_event.set()
+
+    def shutdown(self):
+        """Cancels the current job and stops the worker processes.
+        """
+
+        self.cancel_event.set()
+        self.pool.shutdown()
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# scheduler.py - chooses which election the miner builds its next block for
+
+import time
+import threading
+from collections import OrderedDict
+
+""" The largest number of ballots in a mined block. """
+MAX_BLOCK_SIZE = 256
+
+""" Seconds a ballot may wait before a block is mined for it even though the block is not full. """
+FLUSH_DEADLINE = 5
+
+
+class MiningScheduler:
+    """Tracks the unconfirmed ballots of every election and hands the miner the election that
+    most needs a block. An election is ready once it has a full block of ballots or its oldest
+    ballot has waited for the flush deadline. Ready elections are ranked by how many blocks of
+    ballots are waiting plus how many deadlines the oldest ballot has waited, so deep backlogs
+    are mined first without leaving a small election waiting much past its deadline.
+    """
+
+    def __init__(
+        self, block_size, max_block_size=MAX_BLOCK_SIZE, deadline=FLUSH_DEADLINE
+    ):
+        """
+        Arguments:
+            block_size {int} -- Number of ballots in a full block.
+            max_block_size {int} -- The largest number of ballots in a block.
+            deadline {float} -- Seconds before a partial block is mined.
+        """
+
+        self.block_size = block_size
+        self.max_block_size = max_block_size
+        self.deadline = deadline
+
+        """ Condition that is notified when an election may have become ready. """
+        self.condition = threading.Condition()
+
+        """ A dictionary that maps election id's to OrderedDicts of ballot id's and arrival times. """
+        self.pending = {}
+
+        """ A dictionary that maps election id's to their full and largest block sizes. """
+        self.sizes = {}
+
+    def configure(self, election, block_size, max_block_size):
+        """Sets the block sizes of an election in place of the scheduler's.
+
+        Arguments:
+            election {str} -- Election id.
+            block_size {int} -- Number of ballots in a full block.
+            max_block_size {int} -- The largest number of ballots in a block.
+        """
+
+        with self.condition:
+            self.sizes[election] = (block_size, max_block_size)
+
+    def add(self, election, ballot_ids):
+        """Records unconfirmed ballots and wakes the miner if their election became ready.
+
+        Arguments:
+            election {str} -- Election id.
+            ballot_ids {list} -- Id's of ballots added to the election's unconfirmed pool.
+        """
+
+        now = time.time()
+        with self.condition:
+            pending = self.pending.setdefault(election, OrderedDict())
+            block_size, _ = self.sizes.get(
+                election, (self.block_size, self.max_block_size)
+            )
+            count = len(pending)
+            for ballot_id in ballot_ids:
+                pending.setdefault(ballot_id, now)
+            # A first ballot starts a new deadline, a full block makes the election ready
+            if count == 0 or count < block_size <= len(pending):
+                self.condition.notify()
+
+    def remove(self, election, ballot_ids):
+        """Forgets ballots that left the unconfirmed pool.
+
+        Arguments:
+            election {str} -- Election id.
+            ballot_ids {list} -- Id's of ballots removed from the election's unconfirmed pool.
+        """
+
+        with self.condition:
+            pending = self.pending.get(election)
+            if pending is None:
+                return
+            for ballot_id in ballot_ids:
+                pending.pop(ballot_id, None)
+
+    def forget(self, election):
+        """Stops scheduling an election.
+
+        Arguments:
+            election {str} -- Election id.
+        """
+
+        with self.condition:
+            self.pending.pop(election, None)
+            self.sizes.pop(election, None)
+
+    def next(self):
+        """Waits until an election is ready for a block.
+
+        Returns:
+            {(str, int)} -- Id of the election with the highest priority and the number of ballots
+            to put in its block.
+        """
+
+        with self.condition:
+            while True:
+                now = time.time()
+                best = None
+                best_priority = 0
+                wait = None
+                for election, pending in self.pending.items():
+                    if not pending:
+                        continue
+                    block_size, _ = self.sizes.get(
+                        election, (self.block_size, self.max_block_size)
+                    )
+                    age = now - next(iter(pending.values()))
+                    if len(pending) >= block_size or age >= self.deadline:
+                        priority = len(pending) / block_size + age / self.deadline
+                        if best is None or priority > best_priority:
+                            best = election
+                            best_priority = priority
+                    elif wait is None or self.deadline - age < wait:
+                        wait = self.deadline - age
+
+                if best is not None:
+                    _, max_block_size = self.sizes.get(
+                        best, (self.block_size, self.max_block_size)
+                    )
+                    return best, min(len(self.pending[best]), max_block_size)
+                self.condition.wait(wait)
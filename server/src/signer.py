@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# signer.py - derive verifying keys and sign ballots in batches on a pool of processes
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from ecdsa import SigningKey
+import blockchain
+from util import getLogger
+
+log = getLogger("signer")
+
+""" The most keys or ballots sent to a worker process in one task. """
+BATCH_SIZE = 64
+
+
+def deriveVerifyingKeys(signing_keys):
+    """
+    Arguments:
+        signing_keys {list} -- Hex string signing keys.
+
+    Returns:
+        {list} -- The raw bytes of the verifying key of each signing key, None for a signing key
+        that can not be parsed.
+    """
+
+    verifying_keys = []
+    for signing_key in signing_keys:
+        try:
+            verifying_keys.append(
+                SigningKey.from_string(bytes.fromhex(signing_key))
+                .get_verifying_key()
+                .to_string()
+            )
+        except (TypeError, ValueError, AssertionError):
+            verifying_keys.append(None)
+    return verifying_keys
+
+
+def signBallots(pairs):
+    """
+    Arguments:
+        pairs {list} -- (ballot dictionary, hex string signing key) of each ballot.
+
+    Returns:
+        {list} -- Hex string digital signature of each ballot, as created by signBallot.
+    """
+
+    return [blockchain.signBallot(ballot, signing_key) for ballot, signing_key in pairs]
+
+
+class BallotSigner:
+    """Derives verifying keys and signs ballots on behalf of voters, spreading batches across a
+    pool of worker processes.
+    """
+
+    def __init__(self, worker_count):
+        """
+        Arguments:
+            worker_count {int} -- The number of worker processes, 0 signs on the calling thread.
+        """
+
+        self.pool = None
+        if worker_count > 0:
+            self.pool = ProcessPoolExecutor(
+                max_workers=worker_count,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def map(self, function, items):
+        """Applies a batch function to items a batch at a time.
+
+        Arguments:
+            function {function} -- Function that takes a list and returns a result for each item.
+            items {list} -- The items.
+
+        Returns:
+            {list} -- The result of each item.
+        """
+
+        batches = [
+            items[start : start + BATCH_SIZE]
+            for start in range(0, len(items), BATCH_SIZE)
+        ]
+        mapper = self.pool.map if self.pool else map
+        return [result for batch in mapper(function, batches) for result in batch]
+
+    def verifyingKeys(self, signing_keys):
+        """
+        Arguments:
+            signing_keys {list} -- Hex string signing keys.
+
+        Returns:
+            {list} -- The raw bytes of the verifying key of each signing key, None for a signing
+            key that can not be parsed.
+        """
+
+        return self.map(deriveVerifyingKeys, signing_keys)
+
+    def signBatch(self, ballots, signing_keys):
+        """
+        Arguments:
+            ballots {list} -- Ballot dictionaries to be signed.
+            signing_keys {list} -- The hex string signing key of each ballot.
+
+        Returns:
+            {list} -- Hex string digital signature of each ballot.
+        """
+
+        return self.map(signBallots, list(zip(ballots, signing_keys)))
+
+    def shutdown(self):
+        """Stops the worker processes.
+        """
+
+        if self.pool:
+            self.pool.shutdown()
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# store.py - append-only on-disk storage of blockchains, one segment file per election
+
+import os
+import mmap
+import struct
+import threading
+from json import loads
+from util import getLogger
+
+log = getLogger("store")
+
+""" Extension of segment files. """
+SEGMENT_EXTENSION = ".seg"
+
+""" Each record in a segment is a 4 byte big-endian length followed by a JSON block. """
+RECORD_HEADER = struct.Struct(">I")
+
+""" Seconds between batched fsyncs of segments that have been written to. """
+SYNC_INTERVAL = 0.5
+
+
+def encodeRecord(record):
+    """Encodes a block as a segment record.
+
+    Arguments:
+        record {BlockRecord} -- Record of the block to be encoded.
+
+    Returns:
+        {bytes} -- The length-prefixed JSON serialization of the block.
+    """
+
+    return RECORD_HEADER.pack(len(record.data)) + record.data
+
+
+def readSegment(path):
+    """Reads every complete record of a segment file. A partial record left at the end of the file
+    by a crash is cut off so that later appends start on a record boundary.
+
+    Arguments:
+        path {str} -- Path of the segment file.
+
+    Returns:
+        {list} -- The blocks in the segment in the order they were appended.
+    """
+
+    blocks = []
+    with open(path, "r+b") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return blocks
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset + RECORD_HEADER.size <= size:
+                (length,) = RECORD_HEADER.unpack_from(data, offset)
+                end = offset + RECORD_HEADER.size + length
+                if end > size:
+                    break
+                blocks.append(loads(data[offset + RECORD_HEADER.size : end]))
+                offset = end
+        if offset != size:
+            log.warning("truncating partial record at end of %s" % path)
+            f.truncate(offset)
+    return blocks
+
+
+class ChainStore:
+    """Stores each election's blocks in an append-only segment file. Appends are buffered and a
+    background thread fsyncs every segment that was written to once per SYNC_INTERVAL.
+    """
+
+    def __init__(self, directory):
+        """
+        Arguments:
+            directory {str} -- Directory that holds the segment files, created if missing.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        """ Lock to control access to the open segment files. """
+        self.lock = threading.Lock()
+
+        """ A dictionary that maps election id's to open segment files. """
+        self.segments = {}
+
+        """ Segment files written to since the last fsync. """
+        self.dirty = set()
+
+        self.closed = threading.Event()
+        self.sync_thread = threading.Thread(target=self.syncLoop, daemon=True)
+        self.sync_thread.start()
+
+    def segmentPath(self, election):
+        """
+        Arguments:
+            election {str} -- Election id.
+
+        Returns:
+            {str} -- Path of the election's segment file.
+        """
+
+        return os.path.join(self.directory, election + SEGMENT_EXTENSION)
+
+    def append(self, election, records):
+        """Appends blocks to the end of an election's segment.
+
+        Arguments:
+            election {str} -- Election id.
+            records {list} -- BlockRecords with parents before children, the first block of an
+            election is its genesis.
+        """
+
+        data = b"".join(encodeRecord(record) for record in records)
+        with self.lock:
+            if election not in self.segments:
+                self.segments[election] = open(self.segmentPath(election), "ab")
+            self.segments[election].write(data)
+            self.dirty.add(election)
+
+    def sync(self):
+        """Flushes and fsyncs every segment written to since the last sync.
+        """
+
+        with self.lock:
+            dirty = [self.segments[election] for election in self.dirty]
+            self.dirty = set()
+            for segment in dirty:
+                segment.flush()
+        for segment in dirty:
+            os.fsync(segment.fileno())
+
+    def syncLoop(self):
+        """Syncs written segments until the store is closed.
+        """
+
+        while not self.closed.wait(SYNC_INTERVAL):
+            self.sync()
+
+    def load(self):
+        """Reads every stored election.
+
+        Returns:
+            {list} -- The blocks of each election in the order they were appended. The first block
+            is the genesis block and every other block follows its parent, but blocks of competing
+            branches are interleaved.
+        """
+
+        elections = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SEGMENT_EXTENSION):
+                continue
+            blocks = readSegment(os.path.join(self.directory, name))
+            if blocks:
+                elections.append(blocks)
+        return elections
+
+    def close(self):
+        """Syncs and closes every segment.
+        """
+
+        self.closed.set()
+        self.sync_thread.join()
+        self.sync()
+        with self.lock:
+            for segment in self.segments.values():
+                segment.close()
+            self.segments = {}
@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# sync.py - catch up with the elections and blocks that peers already have
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import blockchain
+from util import build_url, getLogger
+
+log = getLogger("sync")
+
+""" The number of threads that download blocks from peers. """
+SYNC_WORKERS = 8
+
+""" Blocks requested at a time, at most the BLOCK_PAGE_SIZE of the peers. """
+SYNC_PAGE_SIZE = 100
+
+""" Pages downloading or waiting to be applied at a time, so that a long chain is not held in
+memory before the pages ahead of it are applied. """
+SYNC_WINDOW = 2 * SYNC_WORKERS
+
+""" Errors of a request to a peer or of a response that is not in the expected form. """
+PEER_ERRORS = (
+    requests.RequestException,
+    ValueError,
+    TypeError,
+    KeyError,
+    IndexError,
+    AttributeError,
+)
+
+""" Blocks below the local tip that are downloaded again so that a short fork is followed. """
+SYNC_OVERLAP = 8
+
+""" Seconds to wait for a peer to answer a sync request. """
+SYNC_TIMEOUT = 10
+
+""" Seconds between checks of the peers' tips once the node has caught up. """
+SYNC_INTERVAL = 30
+
+
+class ChainSync:
+    """Brings the node up to date with its peers. The tip of every election is fetched from each
+    peer, and the blocks of the tip with the most work are downloaded in pages that are spread
+    across the peers that share it. Each page is verified and applied in bulk as soon as the
+    pages before it are, while later pages are still downloading.
+    """
+
+    def __init__(
+        self,
+        dispatcher,
+        peers,
+        local_tip,
+        has_block,
+        add_election,
+        accept_blocks,
+        worker_count=SYNC_WORKERS,
+    ):
+        """
+        Arguments:
+            dispatcher {GossipDispatcher} -- Dispatcher whose keep-alive sessions are reused.
+            peers {list} -- Ports of the peers, read each time the node syncs.
+            local_tip {function} -- Function of an election id that returns the height and work of
+            the node's chain, or None if the election is unknown.
+            has_block {function} -- Function of an election id and block hash that returns whether
+            the block is in the election's block tree.
+            add_election {function} -- Function that adds a blockchain dictionary to the node.
+            accept_blocks {function} -- Function of an election id and BlockRecords that verifies
+            and adds the blocks, and returns the records that were added.
+            worker_count {int} -- The number of downloading threads. (default: {SYNC_WORKERS})
+        """
+
+        self.dispatcher = dispatcher
+        self.peers = peers
+        self.local_tip = local_tip
+        self.has_block = has_block
+        self.add_election = add_election
+        self.accept_blocks = accept_blocks
+        self.pool = ThreadPoolExecutor(
+            max_workers=worker_count, thread_name_prefix="sync"
+        )
+
+    def get(self, peer, path):
+        """
+        Arguments:
+            peer {int} -- Port of the peer.
+            path {str} -- The endpoint path with a leading slash.
+
+        Returns:
+            {obj} -- The peer's JSON response.
+        """
+
+        response = self.dispatcher.session(peer).get(
+            build_url(peer, path), timeout=SYNC_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def tips(self):
+        """Asks every peer for the tips of its elections.
+
+        Returns:
+            {dict} -- A dictionary that maps election id's to lists of (peer, summary) pairs.
+        """
+
+        peers = list(self.peers)
+        futures = [
+            self.pool.submit(self.get, peer, "/elections/summary") for peer in peers
+        ]
+        tips = {}
+        for peer, future in zip(peers, futures):
+            try:
+                summaries = future.result()
+                if not isinstance(summaries, list) or not all(
+                    validSummary(summary) for summary in summaries
+                ):
+                    raise ValueError("malformed summaries")
+            except PEER_ERRORS as e:
+                log.warning("failed to get tips from %d: %s" % (peer, e))
+                continue
+            for summary in summaries:
+                tips.setdefault(summary["id"], []).append((peer, summary))
+        return tips
+
+    def run(self):
+        """Syncs every election that a peer has a chain with more work for.
+
+        Returns:
+            {int} -- The number of blocks added.
+        """
+
+        added = 0
+        for election, summaries in self.tips().items():
+            best = max(summaries, key=lambda pair: pair[1]["work"])[1]
+            local = self.local_tip(election)
+            if local is not None and local[1] >= best["work"]:
+                continue
+            peers = [
+                peer for peer, summary in summaries if summary["tip"] == best["tip"]
+            ]
+            try:
+                added += self.syncElection(election, best["height"], peers)
+            except PEER_ERRORS as e:
+                log.warning("failed to sync election %s: %s" % (election, e))
+        return added
+
+    def fetchPage(self, election, start, end, peers):
+        """Downloads a range of blocks from the first of the peers that returns it, skipping
+        peers that fail or answer with a malformed page.
+
+        Arguments:
+            election {str} -- Election id.
+            start {int} -- Height of the first block.
+            end {int} -- Height after the last block.
+            peers {list} -- Ports of peers that share the chain, in the order they are tried.
+
+        Returns:
+            {list} -- BlockRecords of the blocks.
+
+        Raises:
+            ValueError -- If no peer returned the page.
+        """
+
+        path = "/election/%s/blocks?start=%d&end=%d" % (election, start, end)
+        for peer in peers:
+            try:
+                return [
+                    blockchain.createBlockRecord(block)
+                    for block in self.get(peer, path)["blocks"]
+                ]
+            except PEER_ERRORS as e:
+                log.warning("failed to get %s from %d: %s" % (path, peer, e))
+        raise ValueError("no peer returned %s" % path)
+
+    def syncElection(self, election, height, peers):
+        """Downloads and applies the blocks of a chain that the node is missing. An unknown
+        election is added from its genesis block first. If the chain forked below the node's tip
+        the download starts further back until it reaches a block the node has.
+
+        Arguments:
+            election {str} -- Election id.
+            height {int} -- Height of the peers' chain.
+            peers {list} -- Ports of peers whose chains end in the same block.
+
+        Returns:
+            {int} -- The number of blocks added.
+        """
+
+        local = self.local_tip(election)
+        if local is None:
+            genesis = self.fetchPage(election, 0, 1, peers)[0].block
+            if genesis["header"]["id"] != election:
+                raise ValueError("genesis block is not election %s" % election)
+            self.add_election(blockchain.createBlockchain(genesis))
+            start = 1
+        else:
+            start = max(1, min(local[0], height) + 1 - SYNC_OVERLAP)
+            first = self.fetchPage(election, start, start + 1, peers)
+            while (
+                start > 1
+                and first
+                and not self.has_block(
+                    election, first[0].block["header"]["previous_hash"]
+                )
+            ):
+                start = max(1, 2 * start - local[0] - 1)
+                first = self.fetchPage(election, start, start + 1, peers)
+
+        # Download up to SYNC_WINDOW pages at once, each from a different peer first, and apply
+        # them in order
+        starts = iter(enumerate(range(start, height + 1, SYNC_PAGE_SIZE)))
+        pages = deque()
+        added = 0
+        try:
+            while True:
+                for i, page_start in starts:
+                    pages.append(
+                        self.pool.submit(
+                            self.fetchPage,
+                            election,
+                            page_start,
+                            min(page_start + SYNC_PAGE_SIZE, height + 1),
+                            peers[i % len(peers) :] + peers[: i % len(peers)],
+                        )
+                    )
+                    if len(pages) >= SYNC_WINDOW:
+                        break
+                if not pages:
+                    return added
+                added += len(self.accept_blocks(election, pages.popleft().result()))
+        finally:
+            for page in pages:
+                page.cancel()
+
+
+def validSummary(summary):
+    """
+    Arguments:
+        summary {obj} -- An election summary from a peer.
+
+    Returns:
+        {bool} -- True if the summary has an id, tip hash, height and work of the right types.
+    """
+
+    return (
+        isinstance(summary, dict)
+        and isinstance(summary.get("id"), str)
+        and isinstance(summary.get("tip"), str)
+        and type(summary.get("height")) is int
+        and type(summary.get("work")) is int
+    )
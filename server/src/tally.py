@@ -0,0 +1,322 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# tally.py - incremental instant-runoff tally of the ballots in a blockchain
+
+from util import getLogger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = getLogger("tally")
+
+""" Whether the fallback to the python backend has been logged, it is only logged once. """
+fallback_logged = False
+
+""" The initial number of rows in a NumpyTally rank matrix. """
+INITIAL_CAPACITY = 1024
+
+
+def normalizeRanking(known, ranking):
+    """Drops unknown and repeated candidates from a ballot's ranking.
+
+    Arguments:
+        known {set} -- Candidate names from the genesis block header.
+        ranking {list} -- An ordered list of candidates from highest rank to least.
+
+    Returns:
+        {tuple} -- The valid part of the ranking.
+    """
+
+    return tuple(dict.fromkeys(c for c in ranking if c in known))
+
+
+def instantRunoff(candidates, groups):
+    """Runs instant-runoff elimination rounds over grouped ballots.
+
+    Each candidate holds a pile of ranking groups whose highest remaining choice is that
+    candidate. When a candidate is eliminated only its pile is redistributed, so a round costs
+    time proportional to the eliminated candidate's pile rather than to the number of ballots.
+    The candidate with the fewest votes is eliminated each round, ties go to the candidate listed
+    last in the genesis block.
+
+    Arguments:
+        candidates {list} -- Candidate names from the genesis block header.
+        groups {dict} -- A dictionary that maps normalized ranking tuples to ballot counts.
+
+    Returns:
+        {dict} -- The "winner" (None if there is none), the "ballots" counted and the "rounds",
+        each with the vote "counts" of the remaining candidates, the number of "exhausted" ballots
+        and the candidate "eliminated" at the end of the round.
+    """
+
+    order = {candidate: i for i, candidate in enumerate(candidates)}
+    piles = {candidate: {} for candidate in candidates}
+    counts = {candidate: 0 for candidate in candidates}
+    exhausted = 0
+    ballots = 0
+    for ranking, count in groups.items():
+        ballots += count
+        if not ranking:
+            exhausted += count
+            continue
+        piles[ranking[0]][ranking] = piles[ranking[0]].get(ranking, 0) + count
+        counts[ranking[0]] += count
+
+    rounds = []
+    winner = None
+    while counts:
+        rounds.append(
+            {"counts": dict(counts), "exhausted": exhausted, "eliminated": None}
+        )
+        active = ballots - exhausted
+        leader = max(counts, key=lambda c: (counts[c], -order[c]))
+        if active == 0:
+            break
+        if counts[leader] * 2 > active or len(counts) == 1:
+            winner = leader
+            break
+
+        loser = min(counts, key=lambda c: (counts[c], -order[c]))
+        rounds[-1]["eliminated"] = loser
+        del counts[loser]
+
+        # Move each ranking in the loser's pile to its next remaining choice
+        for ranking, count in piles.pop(loser).items():
+            remaining = tuple(c for c in ranking if c in counts)
+            if remaining:
+                pile = piles[remaining[0]]
+                pile[remaining] = pile.get(remaining, 0) + count
+                counts[remaining[0]] += count
+            else:
+                exhausted += count
+
+    return {"winner": winner, "ballots": ballots, "rounds": rounds}
+
+
+def createTally(election, backend):
+    """Creates the tally of an election's chain with the requested backend, falling back to the
+    pure Python backend when NumPy is not installed.
+
+    Arguments:
+        election {Election} -- An election.
+        backend {str} -- "numpy" or "python".
+
+    Returns:
+        {Tally} -- A Tally or NumpyTally of the election.
+    """
+
+    global fallback_logged
+
+    if backend == "numpy":
+        if np is not None:
+            return NumpyTally(election)
+        if not fallback_logged:
+            fallback_logged = True
+            log.warning("numpy is not installed, using the python tally backend")
+    return Tally(election)
+
+
+class Tally:
+    """Keeps the ballots of a blockchain grouped by ranking as blocks are added and caches the
+    instant-runoff result until the next block.
+    """
+
+    def __init__(self, election):
+        """
+        Arguments:
+            election {Election} -- An election, the existing blocks of its chain are counted.
+        """
+
+        self.candidates = list(election.candidates)
+
+        """ A dictionary that maps normalized ranking tuples to ballot counts. """
+        self.groups = {}
+
+        """ A dictionary that maps candidates to first preference counts. """
+        self.first_preferences = {candidate: 0 for candidate in self.candidates}
+
+        self.block_count = 0
+        self.cached = None
+        for block in election.chain:
+            self.addBlock(block)
+
+    def addBlock(self, block):
+        """Counts the ballots of a block that was added to the chain.
+
+        Arguments:
+            block {Block} -- The block that was added.
+        """
+
+        candidates = self.candidates
+        for ballot in block.ballots:
+            # Ballots only rank genesis candidates, so only repeats are dropped
+            ranking = tuple(candidates[i] for i in dict.fromkeys(ballot.ranking))
+            self.groups[ranking] = self.groups.get(ranking, 0) + 1
+            if ranking:
+                self.first_preferences[ranking[0]] += 1
+        self.block_count += 1
+        self.cached = None
+
+    def results(self):
+        """
+        Returns:
+            {dict} -- The instant-runoff result from instantRunoff, with the number of "blocks"
+            counted and the "first_preferences" of every candidate.
+        """
+
+        if self.cached is None:
+            # Fill in the result before caching it since readers may call this concurrently
+            results = instantRunoff(self.candidates, self.groups)
+            results["blocks"] = self.block_count
+            results["first_preferences"] = dict(self.first_preferences)
+            self.cached = results
+        return self.cached
+
+
+class NumpyTally:
+    """Keeps the ballots of a blockchain in a dense int16 rank matrix with one row per ballot and
+    computes instant-runoff rounds with vectorized operations. Column j of a row holds the index
+    in the genesis candidate list of the ballot's j-th choice, or -1 past the end of the ranking.
+    """
+
+    def __init__(self, election):
+        """
+        Arguments:
+            election {Election} -- An election, the existing blocks of its chain are counted.
+        """
+
+        self.candidates = list(election.candidates)
+        self.ranks = np.full(
+            (INITIAL_CAPACITY, max(len(self.candidates), 1)), -1, dtype=np.int16
+        )
+        self.ballot_count = 0
+        self.block_count = 0
+        self.cached = None
+        for block in election.chain:
+            self.addBlock(block)
+
+    def addBlock(self, block):
+        """Adds a row to the rank matrix for each ballot of a block that was added to the chain.
+
+        Arguments:
+            block {Block} -- The block that was added.
+        """
+
+        needed = self.ballot_count + len(block.ballots)
+        if needed > len(self.ranks):
+            grown = np.full(
+                (max(needed, 2 * len(self.ranks)), self.ranks.shape[1]),
+                -1,
+                dtype=np.int16,
+            )
+            grown[: self.ballot_count] = self.ranks[: self.ballot_count]
+            self.ranks = grown
+
+        # Fill the new rows with one scatter instead of a slice assignment per ballot
+        flat = []
+        lengths = []
+        for ballot in block.ballots:
+            # A ballot's ranking already holds candidate indexes, only repeats are dropped
+            ranking = dict.fromkeys(ballot.ranking)
+            flat.extend(ranking)
+            lengths.append(len(ranking))
+        lengths = np.array(lengths, dtype=np.int64)
+        rows = np.repeat(np.arange(self.ballot_count, needed), lengths)
+        columns = np.arange(len(flat)) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        self.ranks[rows, columns] = flat
+        self.ballot_count = needed
+        self.block_count += 1
+        self.cached = None
+
+    def results(self):
+        """
+        Returns:
+            {dict} -- The same result as Tally.results.
+        """
+
+        if self.cached is None:
+            self.cached = self.instantRunoff()
+        return self.cached
+
+    def instantRunoff(self):
+        """Runs instant-runoff elimination rounds over the rank matrix with the same rules as
+        instantRunoff.
+
+        Returns:
+            {dict} -- The same result as Tally.results.
+        """
+
+        candidate_count = len(self.candidates)
+
+        # Index candidate_count stands for "no candidate" and is never active. An extra column of
+        # it ends every row so that a ballot's choice can always advance one column.
+        ranks = np.full(
+            (self.ballot_count, candidate_count + 1), candidate_count, dtype=np.int16
+        )
+        ranks[:, :candidate_count] = np.where(
+            self.ranks[: self.ballot_count, :candidate_count] < 0,
+            candidate_count,
+            self.ranks[: self.ballot_count, :candidate_count],
+        )
+        active = np.ones(candidate_count + 1, dtype=bool)
+        active[candidate_count] = False
+
+        # Column of each ballot's highest remaining choice, and that choice
+        position = np.zeros(self.ballot_count, dtype=np.int64)
+        top = ranks[:, 0].astype(np.int64)
+        first_preferences = np.bincount(top, minlength=candidate_count + 1)
+
+        # Ties are broken by genesis order
+        order = np.arange(candidate_count)
+
+        rounds = []
+        winner = None
+        while active.any():
+            tallied = np.bincount(top, minlength=candidate_count + 1)
+            counts = tallied[:candidate_count]
+            standing = np.flatnonzero(active[:candidate_count])
+            rounds.append(
+                {
+                    "counts": {self.candidates[i]: int(counts[i]) for i in standing},
+                    "exhausted": int(tallied[candidate_count]),
+                    "eliminated": None,
+                }
+            )
+            total = int(counts.sum())
+            if total == 0:
+                break
+            leader = standing[np.lexsort((order[standing], -counts[standing]))[0]]
+            if counts[leader] * 2 > total or len(standing) == 1:
+                winner = self.candidates[leader]
+                break
+
+            loser = standing[np.lexsort((-order[standing], counts[standing]))[0]]
+            rounds[-1]["eliminated"] = self.candidates[loser]
+            active[loser] = False
+
+            # Advance only the loser's ballots until they reach a remaining choice or run out
+            moving = np.flatnonzero(top == loser)
+            while moving.size:
+                position[moving] += 1
+                top[moving] = ranks[moving, position[moving]]
+                choice = top[moving]
+                moving = moving[(choice != candidate_count) & ~active[choice]]
+
+        return {
+            "winner": winner,
+            "ballots": self.ballot_count,
+            "rounds": rounds,
+            "blocks": self.block_count,
+            "first_preferences": {
+                candidate: int(first_preferences[i])
+                for i, candidate in enumerate(self.candidates)
+            },
+        }
@@ -6,11 +6,13 @@
 #
 # util.py - Provides helper functions and stores application state
 
-from flask import abort, jsonify, current_app as app
+from flask import abort, jsonify, request, current_app as app
 import uuid
 import argparse
+import os
 import threading
 import logging
+from mempool import Mempool
 
 
 def validate_required(required, body):
@@ -39,6 +41,25 @@ def resp(data):
     return jsonify(data), 200, {"Content-Type": "text/json"}
 
 
+def etag_resp(etag, encode):
+    """Construct a JSON response with a strong ETag. If the request already holds the tag the
+    body is not encoded and a 304 response is returned instead.
+    
+    Arguments:
+        etag {str} -- Tag that changes whenever the body would.
+        encode {function} -- Function that returns the UTF-8 JSON body.
+    
+    Returns:
+        {Flask response} -- A 200 JSON reponse or a 304 response.
+    """
+
+    headers = {"ETag": '"%s"' % etag}
+    if request.if_none_match.contains(etag):
+        return "", 304, headers
+    headers["Content-Type"] = "text/json"
+    return encode(), 200, headers
+
+
 def build_url(port, path):
     """Construct an API url.
     
@@ -61,10 +82,13 @@ def build_node_info():
     """
 
     return {
-        "nodes": nodes,
+        "nodes": list(nodes),
         "blockchain_count": len(blockchains),
         "is_miner": miner,
         "mining": mining,
+        "hashrate": hashrate,
+        "gossip": dispatcher.stats() if dispatcher else None,
+        "mempool": mempool.stats(),
     }
 
 
@@ -83,6 +107,21 @@ def parse_args():
         "-s", "--servers", dest="servers", default=[], type=int, nargs="*"
     )
     parser.add_argument("-m", "--mine", dest="mine", default=False, action="store_true")
+    parser.add_argument(
+        "-w", "--workers", dest="workers", default=os.cpu_count(), type=int
+    )
+    parser.add_argument("--verify-workers", dest="verify_workers", default=2, type=int)
+    parser.add_argument("--keygen-workers", dest="keygen_workers", default=2, type=int)
+    parser.add_argument("--sign-workers", dest="sign_workers", default=2, type=int)
+    parser.add_argument("--event-tick", dest="event_tick", default=0.5, type=float)
+    parser.add_argument("--metrics", dest="metrics", default=False, action="store_true")
+    parser.add_argument("-d", "--data-dir", dest="data_dir", default=None)
+    parser.add_argument(
+        "--tally-backend",
+        dest="tally_backend",
+        default="numpy",
+        choices=["numpy", "python"],
+    )
     return parser.parse_args()
 
 
@@ -119,9 +158,12 @@ log = getLogger("util")
 
 """ Application state. """
 
-""" Lock to control access to the application state. Needed by miners. """
+""" Lock to control adding elections, each election is guarded by its own ElectionLock. """
 lock = threading.Lock()
 
+""" A dictionary that maps election id's to ElectionLocks. """
+election_locks = {}
+
 """
 The lowest port that can be used by a node. 
 All other nodes should be increasing from this port by one.
@@ -131,7 +173,7 @@ base_port = 5000
 """ The base URL that all nodes are on. """
 API_BASE = "http://localhost:"
 
-""" A dictionary that maps election id's to blockchains. """
+""" A dictionary that maps election id's to Elections. """
 blockchains = {}
 
 """ A list of other known nodes on the network. """
@@ -140,11 +182,41 @@ nodes = []
 """ The port that the current node listens on. """
 port = base_port
 
-""" A dictionary that maps ballot id's to ballots that have not been added to the chain yet. """
-unconfirmed_ballots = {}
+""" Pool of the ballots of every election that have not been added to the chain yet. """
+mempool = Mempool()
+
+""" A dictionary that maps election id's to the verifying_keys of their Elections. """
+eligible_keys = {}
+
+""" A dictionary that maps election id's to spent key indexes from createSpentKeyIndex. """
+spent_keys = {}
+
+""" A dictionary that maps election id's to the block heights of their confirmed ballots. """
+ballot_heights = {}
+
+""" A dictionary that maps election id's to the heights of the blocks in their chains. """
+block_heights = {}
+
+""" A dictionary that maps the id's of blocks in a chain to their BlockRecords. """
+block_records = {}
+
+""" A dictionary that maps election id's to the BlockTrees of every branch of their chains. """
+block_trees = {}
+
+""" A dictionary that maps election id's to Tally or NumpyTally objects. """
+tallies = {}
+
+""" The tally backend passed to createTally, "numpy" or "python". """
+tally_backend = "numpy"
 
 """ Flag that specifies whether or not this node is a miner. """
 miner = False
 
 """ Mining block ID. """
 mining = None
+
+""" Hashes per second measured over the last mined block. """
+hashrate = 0
+
+""" The node's GossipDispatcher, set by app. """
+dispatcher = None
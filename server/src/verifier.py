@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+# Independent Study
+# RIT 2185
+# Professor: Alan Kaminsky
+# Author: Eric Dudley
+#
+# verifier.py - verify ballot signatures in batches on a pool of processes
+
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import md5
+from json import dumps
+import blockchain
+from util import getLogger
+
+log = getLogger("verifier")
+
+""" The number of verified ballots remembered so that duplicates skip verification. """
+VERIFIED_CACHE_SIZE = 100000
+
+""" The most ballots sent to a worker process in one task. """
+BATCH_SIZE = 64
+
+
+def verifyBallots(ballots):
+    """Verifies the digital signature of every ballot in a batch.
+
+    Arguments:
+        ballots {list} -- List of ballot dictionaries containing a ballot and digital signature.
+
+    Returns:
+        {list} -- A bool for each ballot, True if its signature is valid.
+    """
+
+    results = []
+    for ballot in ballots:
+        try:
+            results.append(
+                blockchain.verifyBallot(
+                    ballot["ballot"],
+                    ballot["signature"],
+                    verifying_key_hex=ballot["ballot"]["verifying_key"],
+                )
+            )
+        except (KeyError, TypeError, ValueError, AssertionError):
+            # Malformed ballot or key
+            results.append(False)
+    return results
+
+
+def cacheKey(ballot):
+    """Builds the verified cache key of a ballot. The digest of the ballot's contents is part of
+    the key so that a known id and signature can not be replayed with different contents.
+
+    Arguments:
+        ballot {dict} -- Ballot dictionary containing a ballot and digital signature.
+
+    Returns:
+        {tuple} -- The ballot id, signature and a digest of the ballot.
+    """
+
+    return (
+        ballot["ballot"]["id"],
+        ballot["signature"],
+        md5(dumps(ballot["ballot"], sort_keys=True).encode()).digest(),
+    )
+
+
+class BallotVerifier:
+    """Verifies ballot signatures, remembering ballots that were already verified and spreading
+    batches of new ballots across a pool of worker processes.
+    """
+
+    def __init__(self, worker_count):
+        """
+        Arguments:
+            worker_count {int} -- The number of worker processes, 0 verifies on the calling thread.
+        """
+
+        self.pool = None
+        if worker_count > 0:
+            self.pool = ProcessPoolExecutor(
+                max_workers=worker_count,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        """ Lock to control access to the verified cache. """
+        self.lock = threading.Lock()
+
+        """ Cache keys of verified ballots, least recently used first. """
+        self.verified = OrderedDict()
+
+    def verify(self, ballot):
+        """Verifies the digital signature of a ballot.
+
+        Arguments:
+            ballot {dict} -- Ballot dictionary containing a ballot and digital signature.
+
+        Returns:
+            {bool} -- True if the signature is valid.
+        """
+
+        return self.verifyBatch([ballot])[0]
+
+    def verifyBatch(self, ballots):
+        """Verifies the digital signatures of a list of ballots.
+
+        Arguments:
+            ballots {list} -- List of ballot dictionaries containing a ballot and digital signature.
+
+        Returns:
+            {list} -- A bool for each ballot, True if its signature is valid.
+        """
+
+        results = [True] * len(ballots)
+        keys = [None] * len(ballots)
+        for i, ballot in enumerate(ballots):
+            try:
+                keys[i] = cacheKey(ballot)
+            except (KeyError, TypeError):
+                results[i] = False
+
+        unverified = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                if key in self.verified:
+                    self.verified.move_to_end(key)
+                elif key:
+                    unverified.append(i)
+
+        if not unverified:
+            return results
+
+        batches = [
+            [ballots[i] for i in unverified[start : start + BATCH_SIZE]]
+            for start in range(0, len(unverified), BATCH_SIZE)
+        ]
+        mapper = self.pool.map if self.pool else map
+        verified = [
+            valid for batch in mapper(verifyBallots, batches) for valid in batch
+        ]
+
+        with self.lock:
+            for i, valid in zip(unverified, verified):
+                results[i] = valid
+                if valid:
+                    self.verified[keys[i]] = True
+            while len(self.verified) > VERIFIED_CACHE_SIZE:
+                self.verified.popitem(last=False)
+        return results
+
+    def shutdown(self):
+        """Stops the worker processes.
+        """
+
+        if self.pool:
+            self.pool.shutdown()